@@ -0,0 +1,127 @@
+#
+# Central subsumption arbiter.
+# Owns the priority order of the behaviors and decides, once per change of
+# the state keys they watch, which one is in control. Control is handed
+# over atomically: the winner only starts once the previous holder has
+# returned from its action, and the previous holder sees it was preempted
+# through Behaviour.interrupted().
+#
+
+import threading
+
+from utils import telemetry
+from utils.config import ARBITER_HANDOFF_BUDGET
+from utils.metrics import metrics
+from utils.state import StateManager
+
+# State key naming the behavior that may run now (the holder while one runs)
+ACTIVE_KEY = "active_behavior"
+
+
+class Arbiter:
+    """
+    Grants control to the first behavior, in ``behaviours`` order (highest
+    priority first), whose take_control() holds; the behavior running its
+    action keeps control until a higher-priority one wants it. Behaviours (threaded or
+    coroutine) ask ``begin()`` before their action and call ``end()`` after
+    it. The time from a decision to the winner's start is recorded in the
+    ``arbiter.handoff`` histogram and checked against ``budget`` seconds.
+    """
+
+    def __init__(
+        self,
+        params: StateManager,
+        behaviours: list,
+        budget: float = ARBITER_HANDOFF_BUDGET,
+    ):
+        self.params = params
+        self.clock = params.clock
+        self.behaviours = list(behaviours)
+        self.budget = budget
+        self._lock = threading.RLock()
+        self._winner = None  # Behaviour that should be in control
+        self._holder = None  # Behaviour inside its action
+        self._decided_at: float | None = None  # Clock time the winner was chosen
+        for behaviour in self.behaviours:
+            behaviour.arbiter = self
+        watched = set()
+        for behaviour in self.behaviours:
+            if behaviour.watched_keys is None:
+                watched = None
+                break
+            watched.update(behaviour.watched_keys)
+        if watched is None:
+            params.subscribe(None, self._on_change)
+        else:
+            for key in sorted(watched | {"stop"}):
+                params.subscribe(key, self._on_change)
+        self.evaluate()
+
+    def holds(self, behaviour) -> bool:
+        """True when ``behaviour`` is the winner and may run (or is running)."""
+        with self._lock:
+            return self._winner is behaviour and self._holder in (None, behaviour)
+
+    def preempted(self, behaviour) -> bool:
+        """True when ``behaviour`` is running but no longer the winner."""
+        with self._lock:
+            return self._holder is behaviour and self._winner is not behaviour
+
+    def begin(self, behaviour) -> bool:
+        """Take control for ``behaviour`` if it is the winner and nobody else runs."""
+        with self._lock:
+            if not self.holds(behaviour):
+                return False
+            self._holder = behaviour
+            if self._decided_at is not None:
+                self._record_handoff(behaviour, self.clock.now() - self._decided_at)
+                self._decided_at = None
+            return True
+
+    def end(self, behaviour):
+        """``behaviour`` returned from its action; hand control to the winner."""
+        with self._lock:
+            if self._holder is behaviour:
+                self._holder = None
+            self.evaluate()
+
+    def evaluate(self):
+        """Recompute the winner from the behaviors' take_control()."""
+        with self._lock:
+            winner = None
+            if not self.params.get("stop", False):
+                # The holder keeps control unless a higher-priority behavior wants it
+                for behaviour in self.behaviours:
+                    if behaviour is self._holder or behaviour.take_control():
+                        winner = behaviour
+                        break
+            if winner is not self._winner:
+                previous = self._winner
+                self._winner = winner
+                self._decided_at = self.clock.now() if winner is not None else None
+                metrics.counter("arbiter.decisions").inc()
+                telemetry.record(
+                    "arbitration",
+                    winner=winner.name if winner is not None else None,
+                    previous=previous.name if previous is not None else None,
+                    holder=self._holder.name if self._holder is not None else None,
+                )
+            self._publish()
+
+    def _publish(self):
+        # Must be called with the lock held. Names the holder while one runs,
+        # so the value changes (and wakes the winner) when it returns.
+        active = self._holder or self._winner
+        self.params.set(ACTIVE_KEY, active.name if active is not None else None)
+
+    def _record_handoff(self, behaviour, latency: float):
+        metrics.histogram("arbiter.handoff").observe(latency)
+        if latency > self.budget:
+            metrics.counter("arbiter.handoff_overruns").inc()
+            telemetry.warning(
+                f"[Arbiter] {behaviour.name} got control {latency:.2f}s after being"
+                f" chosen (budget {self.budget:.2f}s)"
+            )
+
+    def _on_change(self, key, old, new):
+        self.evaluate()
@@ -2,28 +2,58 @@
 # Class that inherits from Thread and manages the threads for behaviors.
 # It ensures the architecture operates correctly.
 #
+# AsyncBehaviour and BehaviourRuntime are the coroutine alternative: every
+# AsyncBehaviour runs on one asyncio event loop instead of a thread of its
+# own, awaiting the clock, the sensor frames and the robot calls. The
+# mission behaviors (ScanSpots, FindQR, Navigate and Parking) all run on it.
+#
 
+import asyncio
+import contextlib
+import heapq
+import itertools
+import traceback
+from collections import deque
 from threading import Thread
-import time
 from robobopy.Robobo import Robobo
 
-from utils.config import LOOP_DELAY
+from behaviors.arbiter import ACTIVE_KEY
+from utils import telemetry
+from utils.clock import Clock
+from utils.config import SENSOR_SAMPLE_RATE, STATE_WAIT_TIMEOUT
+from utils.metrics import metrics
+from utils.sensors import CHANNELS, SensorHub, SensorSnapshot, read_snapshot
 from utils.state import StateManager
 
 
 class Behaviour(Thread):
+    # State keys read by take_control(). The thread sleeps until one of them
+    # (or "stop") changes instead of polling. None means any key.
+    watched_keys: tuple[str, ...] | None = None
+    # Snapshot fields action() reads; the hub samples them while it runs.
+    # A property when they depend on the action (see Parking)
+    sensor_channels: tuple[str, ...] = CHANNELS
+
     def __init__(
         self,
         robot: Robobo,
         supress_list: list["Behaviour"],
         params: StateManager,
+        clock: Clock | None = None,
+        sensors: SensorHub | None = None,
         **kwargs
     ):
+        kwargs.setdefault("name", type(self).__name__)
         super().__init__(**kwargs)
         self.robot = robot  # Reference to the robot object
         self.__supress = False  # Internal flag for suppression
         self.supress_list = supress_list  # List of behaviors this one can suppress
         self.params = params  # Shared parameters (e.g., mission control)
+        self.clock = clock or params.clock  # Time source for every wait
+        self.sensors = sensors  # Shared sensor sampler (None reads the robot directly)
+        self._last_seq = 0  # Sequence number of the last snapshot consumed
+        self._in_control = False  # Last take_control() result, for telemetry
+        self.arbiter = None  # Set by an Arbiter, which then grants control
 
     # Method to determine if the behavior should take control
     # This should be implemented in subclasses
@@ -36,20 +66,70 @@ class Behaviour(Thread):
         pass
 
     # Main thread execution method
-    # Continuously checks if the mission is complete or if the behavior
-    # should take control, and performs the associated actions
+    # Checks if the behavior should take control (or, under an Arbiter, was
+    # granted it) and performs the associated actions, blocking on state
+    # changes in between until the mission ends
     def run(self):
-        while not self.params.get(
-            "stop", False
-        ):  # Loop until the mission is marked as complete
-            # Wait until this behavior takes control or the mission ends
-            while not self.take_control() and not self.params.get("stop", False):
-                time.sleep(LOOP_DELAY)  # Small delay to reduce CPU usage
-            if not self.params.get(
-                "stop", False
-            ):  # Perform the action if the mission is still ongoing
-                self.action()
-            time.sleep(LOOP_DELAY)  # Small delay before the next check
+        keys = None if self.watched_keys is None else ("stop",) + self.watched_keys
+        if self.arbiter is not None and keys is not None:
+            keys += (ACTIVE_KEY,)
+        evaluations = metrics.counter(f"behavior.{self.name}.take_control")
+        control_time = metrics.histogram(f"behavior.{self.name}.control_time")
+        try:
+            while not self.stopped():  # Loop until the mission is marked as complete
+                # Take the version before evaluating so no change can be missed
+                version = self.params.version(keys)
+                if self.arbiter is not None:
+                    in_control = self.arbiter.begin(self)
+                else:
+                    in_control = bool(self.take_control())
+                evaluations.inc()
+                if in_control != self._in_control:
+                    self._in_control = in_control
+                    telemetry.record("control", behavior=self.name, active=in_control)
+                if in_control:
+                    started = self.clock.now()
+                    try:
+                        with _sampling(self):
+                            self.action()
+                    finally:
+                        if self.arbiter is not None:
+                            self.arbiter.end(self)
+                    control_time.observe(self.clock.now() - started)
+                else:
+                    # Sleep until a relevant key changes (or the safety timeout)
+                    self.params.wait_for_change(keys, version, STATE_WAIT_TIMEOUT)
+        finally:
+            self.clock.unregister(self)
+
+    def start(self):
+        # Join the clock before running so virtual time waits for this thread
+        self.clock.register(self)
+        super().start()
+
+    def snapshot(self) -> SensorSnapshot:
+        """Latest sensor frame, read directly from the robot if the hub has none."""
+        snapshot = self.sensors.latest() if self.sensors is not None else None
+        if snapshot is None or not snapshot.covers(self.sensor_channels):
+            snapshot = read_snapshot(self.robot, self.clock, channels=self.sensor_channels)
+        self._last_seq = snapshot.seq
+        return snapshot
+
+    def next_snapshot(self) -> SensorSnapshot:
+        """
+        Block until a frame newer than the last one this behavior consumed
+        is available. Without a hub, waits one sample period and reads.
+        """
+        if self.sensors is None:
+            self.clock.sleep(1.0 / SENSOR_SAMPLE_RATE)
+            return self.snapshot()
+        snapshot = self.sensors.wait_next(
+            self._last_seq, STATE_WAIT_TIMEOUT, self.sensor_channels
+        )
+        if snapshot is None or not snapshot.covers(self.sensor_channels):
+            return self.snapshot()
+        self._last_seq = snapshot.seq
+        return snapshot
 
     # Property to get the suppression state
     @property
@@ -69,6 +149,12 @@ class Behaviour(Thread):
     def stopped(self):
         return self.params.get("stop", False)
 
+    def interrupted(self) -> bool:
+        """True when the mission stopped or the arbiter gave control to another behavior."""
+        return self.stopped() or (
+            self.arbiter is not None and self.arbiter.preempted(self)
+        )
+
     def suppress_others(self) -> None:
         """Suppress all behaviors in the suppress list."""
         for behavior in self.supress_list:
@@ -78,3 +164,440 @@ class Behaviour(Thread):
         """Release suppression on all behaviors in the suppress list."""
         for behavior in self.supress_list:
             behavior.supress = False
+
+
+def _sampling(behaviour):
+    # Keeps the hub sampling what ``behaviour`` reads while its action runs
+    if behaviour.sensors is None:
+        return contextlib.nullcontext()
+    return behaviour.sensors.sampling(behaviour.sensor_channels)
+
+
+def _fresh(behaviour, snapshot: SensorSnapshot | None) -> bool:
+    # A frame ``behaviour`` has not consumed yet, with the fields it reads
+    return (
+        snapshot is not None
+        and snapshot.seq > behaviour._last_seq
+        and snapshot.covers(behaviour.sensor_channels)
+    )
+
+
+class AsyncBehaviour:
+    """
+    Coroutine counterpart of Behaviour, run by a BehaviourRuntime. ``action``
+    is a coroutine that waits only through ``sleep``, ``snapshot``,
+    ``next_snapshot`` and ``io`` (never on the clock or the robot
+    directly), so one event loop can interleave any number of behaviors.
+    """
+
+    # State keys read by take_control(); it is evaluated again only when one
+    # of them (or "stop", or the suppression flag) changes. None means any key.
+    watched_keys: tuple[str, ...] | None = None
+    # Snapshot fields action() reads; the hub samples them while it runs.
+    # A property when they depend on the action (see Parking)
+    sensor_channels: tuple[str, ...] = CHANNELS
+
+    def __init__(
+        self,
+        robot: Robobo,
+        supress_list: list,
+        params: StateManager,
+        clock: Clock | None = None,
+        sensors: SensorHub | None = None,
+        name: str | None = None,
+    ):
+        self.name = name or type(self).__name__
+        self.robot = robot
+        self.__supress = False
+        self.supress_list = supress_list  # Behaviours (of either kind) this one can suppress
+        self.params = params
+        self.clock = clock or params.clock
+        self.sensors = sensors
+        self.runtime: "BehaviourRuntime | None" = None  # Set by BehaviourRuntime.add
+        self.arbiter = None  # Set by an Arbiter, which then grants control
+        self._last_seq = 0
+
+    def take_control(self) -> bool:
+        return False
+
+    async def action(self):
+        pass
+
+    async def snapshot(self) -> SensorSnapshot:
+        """Latest sensor frame, read from the robot through io() if the hub has none."""
+        snapshot = self.sensors.latest() if self.sensors is not None else None
+        if snapshot is None or not snapshot.covers(self.sensor_channels):
+            snapshot = await self.io(
+                read_snapshot, self.robot, self.clock, channels=self.sensor_channels
+            )
+        self._last_seq = snapshot.seq
+        return snapshot
+
+    async def next_snapshot(self) -> SensorSnapshot:
+        """A frame newer than the last one this behavior consumed."""
+        return await self.runtime.next_snapshot(self)
+
+    async def sleep(self, seconds: float):
+        await self.runtime.sleep(seconds)
+
+    async def io(self, function, *args, **kwargs):
+        """Call a blocking robot method without blocking the event loop."""
+        return await self.runtime.io(self.robot, function, *args, **kwargs)
+
+    @property
+    def supress(self):
+        return self.__supress
+
+    @supress.setter
+    def supress(self, state):
+        self.__supress = state
+        if self.runtime is not None:
+            self.runtime.poke(self)  # take_control() may change its answer
+
+    def set_stop(self):
+        self.params.set("stop", True)
+
+    def stopped(self):
+        return self.params.get("stop", False)
+
+    def interrupted(self) -> bool:
+        return self.stopped() or (
+            self.arbiter is not None and self.arbiter.preempted(self)
+        )
+
+    def suppress_others(self) -> None:
+        for behavior in self.supress_list:
+            behavior.supress = True
+
+    def release_others(self) -> None:
+        for behavior in self.supress_list:
+            behavior.supress = False
+
+
+class BehaviourRuntime(Thread):
+    """
+    Runs AsyncBehaviours as tasks of a single asyncio event loop.
+
+    take_control() is evaluated once per change of a behavior's watched
+    keys (state subscriptions, no polling), in the order the behaviors
+    were added, and action() runs as a task when it returns True. Behaviors
+    may use different StateManagers, so several behavior sets (the robots
+    of a fleet) run in one process, and a set may be added while the loop
+    runs. A set leaves the loop once it is stopped and idle; after close()
+    the runtime ends when no set is left.
+
+    The loop only blocks through the clock. Robot calls awaited with io()
+    run one at a time per robot, on a helper thread of that robot
+    registered with the clock, so virtual time never moves while a
+    behavior still has work to do, and a blocking move of one robot does
+    not hold up the others.
+    """
+
+    def __init__(self, clock: Clock, name: str = "BehaviourRuntime"):
+        super().__init__(name=name)
+        self.clock = clock
+        self._wake = clock.condition()  # Guards everything posted by other threads
+        self._added: list[AsyncBehaviour] = []  # Not picked up by the loop yet
+        self._added_count = 0
+        self._settled = 0  # Behaviors picked up and evaluated once
+        self._live: dict[int, int] = {}  # id() of a StateManager -> its behaviors
+        self._states: list[StateManager] = []
+        self._hubs: list[SensorHub] = []
+        self._changed: set[int] = set()  # id() of the StateManagers that changed
+        self._poked: set[AsyncBehaviour] = set()
+        self._io_jobs: dict[int, deque] = {}  # id() of a robot -> its pending calls
+        self._io_done: deque = deque()
+        self._frame_posted = False
+        self._running = True
+        self._closed = False
+        # Loop-thread only
+        self._behaviours: list[AsyncBehaviour] = []
+        self._picked = 0
+        self._versions: dict[AsyncBehaviour, int] = {}
+        self._active: dict[AsyncBehaviour, bool] = {}
+        self._tasks: dict[AsyncBehaviour, asyncio.Task] = {}
+        self._timers: list = []  # Heap of (deadline, order, future)
+        self._frame_waiters: list = []  # (behaviour, future)
+        self._order = itertools.count()
+        self._waiting = 0  # Tasks blocked on a runtime future
+
+    def add(self, behaviour: AsyncBehaviour):
+        """Run ``behaviour`` on this loop, before or after start() (thread-safe)."""
+        behaviour.runtime = self
+        params, hub = behaviour.params, behaviour.sensors
+        with self._wake:
+            self._added.append(behaviour)
+            self._added_count += 1
+            self._live[id(params)] = self._live.get(id(params), 0) + 1
+            new_state = all(state is not params for state in self._states)
+            if new_state:
+                self._states.append(params)
+            new_hub = hub is not None and all(known is not hub for known in self._hubs)
+            if new_hub:
+                self._hubs.append(hub)
+            self._wake.notify_all()
+        if new_state:
+            params.subscribe(None, self._state_listener(params))
+        if new_hub:
+            hub.add_listener(self._on_frame)
+
+    def start(self):
+        """Start the loop, then settle() the behaviors added so far."""
+        # Join the clock before running so virtual time waits for the loop
+        self.clock.register(self)
+        super().start()
+        self.settle()
+
+    def settle(self):
+        """
+        Block until the loop has picked up every behavior added so far and
+        started the actions that want control now, so the caller cannot
+        change the state under them first (as with one thread per behavior).
+        """
+        with self._wake:
+            target = self._added_count
+            self._wake.wait_for(lambda: self._settled >= target or not self._running)
+
+    def wait_stopped(self, params: StateManager):
+        """Block until the behaviors bound to ``params`` are stopped and idle."""
+        with self._wake:
+            self._wake.wait_for(
+                lambda: not self._live.get(id(params)) or not self._running
+            )
+
+    def close(self):
+        """No more behaviors will be added: end once every set has left."""
+        with self._wake:
+            self._closed = True
+            self._wake.notify_all()
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        finally:
+            with self._wake:
+                self._running = False
+                self._live.clear()
+                self._wake.notify_all()
+            self.clock.unregister(self)
+
+    # ------------------------------------------------------------------
+    # Awaitables for the behaviors
+    # ------------------------------------------------------------------
+
+    async def sleep(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = self._blocking_future()
+        heapq.heappush(
+            self._timers, (self.clock.now() + seconds, next(self._order), future)
+        )
+        await future
+
+    async def next_snapshot(self, behaviour: AsyncBehaviour) -> SensorSnapshot:
+        if behaviour.sensors is None:
+            await self.sleep(1.0 / SENSOR_SAMPLE_RATE)
+            return await behaviour.snapshot()
+        latest = behaviour.sensors.latest()
+        if not _fresh(behaviour, latest):
+            future = self._blocking_future()
+            self._frame_waiters.append((behaviour, future))
+            latest = await future
+        behaviour._last_seq = latest.seq
+        return latest
+
+    async def io(self, robot, function, *args, **kwargs):
+        """Call ``function`` on the helper thread of ``robot``, after its earlier calls."""
+        future = self._blocking_future()
+        with self._wake:
+            jobs = self._io_jobs.get(id(robot))
+            new_lane = jobs is None
+            if new_lane:
+                jobs = self._io_jobs[id(robot)] = deque()
+            jobs.append((function, args, kwargs, future))
+            self._wake.notify_all()
+        if new_lane:
+            worker = Thread(
+                target=self._io_worker,
+                args=(jobs,),
+                name=f"{self.name}-io-{len(self._io_jobs)}",
+                daemon=True,
+            )
+            self.clock.register(worker)
+            worker.start()
+        return await future
+
+    def poke(self, behaviour: AsyncBehaviour):
+        """Evaluate ``behaviour``'s take_control() again (thread-safe)."""
+        with self._wake:
+            self._poked.add(behaviour)
+            self._wake.notify_all()
+
+    # ------------------------------------------------------------------
+    # Event loop
+    # ------------------------------------------------------------------
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._dispatch(loop)
+            # Let every task run until it waits on the runtime again
+            while self._waiting < len(self._tasks):
+                await asyncio.sleep(0)
+            with self._wake:
+                if self._settled < self._picked:
+                    self._settled = self._picked
+                    self._wake.notify_all()
+                done = self._closed and not self._added
+            if done and not self._behaviours and not self._tasks:
+                break
+            self._idle()
+
+    def _blocking_future(self) -> asyncio.Future:
+        self._waiting += 1
+        return asyncio.get_running_loop().create_future()
+
+    def _resolve(self, future: asyncio.Future, result=None, error=None):
+        self._waiting -= 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _dispatch(self, loop):
+        with self._wake:
+            added, self._added = self._added, []
+            changed, self._changed = self._changed, set()
+            poked, self._poked = self._poked, set()
+            done = list(self._io_done)
+            self._io_done.clear()
+            self._frame_posted = False
+        self._behaviours.extend(added)
+        self._picked += len(added)
+        poked.update(added)
+
+        for future, result, error in done:
+            self._resolve(future, result, error)
+
+        now = self.clock.now()
+        while self._timers and self._timers[0][0] <= now:
+            self._resolve(heapq.heappop(self._timers)[2])
+
+        waiting = []
+        for behaviour, future in self._frame_waiters:
+            latest = behaviour.sensors.latest()
+            if _fresh(behaviour, latest):
+                self._resolve(future, latest)
+            else:
+                waiting.append((behaviour, future))
+        self._frame_waiters = waiting
+
+        for behaviour in list(self._behaviours):
+            if behaviour in self._tasks:
+                continue
+            if behaviour.params.get("stop", False):
+                self._leave(behaviour)  # Its mission is over
+                continue
+            keys = behaviour.watched_keys
+            keys = None if keys is None else ("stop",) + keys
+            if behaviour.arbiter is not None and keys is not None:
+                keys += (ACTIVE_KEY,)
+            version = behaviour.params.version(keys)
+            if behaviour not in poked and (
+                id(behaviour.params) not in changed
+                or self._versions.get(behaviour) == version
+            ):
+                continue
+            self._versions[behaviour] = version
+            self._evaluate(behaviour, loop)
+
+    def _evaluate(self, behaviour: AsyncBehaviour, loop):
+        if behaviour.arbiter is not None:
+            in_control = behaviour.arbiter.begin(behaviour)
+        else:
+            in_control = bool(behaviour.take_control())
+        metrics.counter(f"behavior.{behaviour.name}.take_control").inc()
+        if in_control != self._active.get(behaviour, False):
+            self._active[behaviour] = in_control
+            telemetry.record("control", behavior=behaviour.name, active=in_control)
+        if in_control:
+            self._tasks[behaviour] = loop.create_task(self._run_action(behaviour))
+
+    def _leave(self, behaviour: AsyncBehaviour):
+        # Drop ``behaviour`` from the loop and wake wait_stopped() once its
+        # set is gone
+        self._behaviours.remove(behaviour)
+        self._versions.pop(behaviour, None)
+        self._active.pop(behaviour, None)
+        with self._wake:
+            self._live[id(behaviour.params)] -= 1
+            self._wake.notify_all()
+
+    async def _run_action(self, behaviour: AsyncBehaviour):
+        started = self.clock.now()
+        try:
+            with _sampling(behaviour):
+                await behaviour.action()
+        except Exception:
+            # Like a thread dying: report it and drop the behavior
+            traceback.print_exc()
+            self._leave(behaviour)
+        finally:
+            if behaviour.arbiter is not None:
+                behaviour.arbiter.end(behaviour)
+            metrics.histogram(f"behavior.{behaviour.name}.control_time").observe(
+                self.clock.now() - started
+            )
+            del self._tasks[behaviour]
+            with self._wake:
+                self._poked.add(behaviour)  # Re-evaluate right away, as Behaviour.run does
+
+    def _idle(self):
+        # Block (through the clock) until something is posted or a timer is due
+        with self._wake:
+            if self._io_done or self._poked or self._changed or self._added:
+                return
+            if self._frame_posted and self._frame_waiters:
+                return
+            if self._closed and not self._behaviours:
+                return
+            timeout = None
+            if self._timers:
+                timeout = self._timers[0][0] - self.clock.now()
+                if timeout <= 0:
+                    return
+            self._wake.wait(timeout)
+
+    def _state_listener(self, params: StateManager):
+        def on_change(key, old, new):
+            with self._wake:
+                self._changed.add(id(params))
+                self._wake.notify_all()
+
+        return on_change
+
+    def _on_frame(self, snapshot: SensorSnapshot):
+        with self._wake:
+            self._frame_posted = True
+            self._wake.notify_all()
+
+    def _io_worker(self, jobs: deque):
+        try:
+            while True:
+                with self._wake:
+                    while not jobs and self._running:
+                        self._wake.wait()
+                    if not jobs:
+                        return
+                    function, args, kwargs, future = jobs.popleft()
+                result = error = None
+                try:
+                    result = function(*args, **kwargs)
+                except Exception as exc:
+                    error = exc
+                with self._wake:
+                    self._io_done.append((future, result, error))
+                    self._wake.notify_all()
+        finally:
+            self.clock.unregister()
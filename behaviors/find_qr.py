@@ -1,27 +1,39 @@
-from behaviors.behaviors import Behaviour
+from behaviors.behaviors import AsyncBehaviour
 from utils.state import StateManager
-import time
+from utils import telemetry
+from utils.command_channel import wait_all
 from utils.config import (
     FAST_WHEEL_SPEED,
     SLOW_WHEEL_SPEED,
     TURNING_TIME,
     SPEED_SLOW,
+    PAN_CENTER,
     PAN_LEFT,
     PAN_RIGHT,
     PAN_MOVEMENT_SPEED,
     TARGET_DISTANCE_TO_PILLAR,
     QR_CENTER_TOLERANCE,
+    QR_DISTANCE_SCALE,
     SPEECH_WAIT_TIME,
+    WHEEL_CM_PER_SPEED,
 )
 
+ROTONDA_TURN_DISTANCE = TARGET_DISTANCE_TO_PILLAR - 50  # Sign reading at which to turn
+GLANCE_TIMEOUT = 1.5  # Seconds before a forward glance is given up
+MIN_GLANCE_INTERVAL = 0.5  # Seconds between glances when the sign is about to be close
+PAN_TOLERANCE = 10  # Degrees from the commanded pan at which a frame counts
 
-class FindQR(Behaviour):
+
+class FindQR(AsyncBehaviour):
     """
     Behavior for the robot to find, aproach, center, and stop at a QRcode.
     """
 
-    def __init__(self, robot, supress_list, params: StateManager):
-        super().__init__(robot, supress_list, params)
+    watched_keys = ("current_action",)
+    sensor_channels = ("qr", "pan")
+
+    def __init__(self, robot, supress_list, params: StateManager, **kwargs):
+        super().__init__(robot, supress_list, params, **kwargs)
         self.rotonda_check_interval = 3
         self.speed = SPEED_SLOW
         self._is_moving = False
@@ -33,8 +45,8 @@ class FindQR(Behaviour):
 
         return False
 
-    def action(self):
-        print("----> control: FindQR")
+    async def action(self):
+        telemetry.debug("----> control: FindQR")
         self.supress = False
         self.suppress_others()
         self._is_moving = False
@@ -53,170 +65,246 @@ class FindQR(Behaviour):
         elif global_target_id is not None:
             target_spot_id = str(global_target_id)
         else:
-            print("[FindQR] ERROR: No target_spot_id specified.")
+            telemetry.error("[FindQR] No target_spot_id specified.")
             self.params.set("current_action_status", "failed")
             return
 
-        print(f"[FindQR] Looking for target spot QR id={target_spot_id}")
+        telemetry.info(f"[FindQR] Looking for target spot QR id={target_spot_id}")
 
-        self.robot.sayText("Approaching parking spot")
-        time.sleep(SPEECH_WAIT_TIME)
-
-        # 2) Determine side and orient camera
+        # 2) Determine side and orient camera while speaking
         target_spot_info = self.params.get_target_spot_info()
         if target_spot_info is not None:
             side_of_parking = target_spot_info.side  # 'left' or 'right'
         else:
             side_of_parking = "left"
-            print(
-                "[FindQR] Warning: Target spot info not found, defaulting to left side."
+            telemetry.warning(
+                "[FindQR] Target spot info not found, defaulting to left side."
             )
-        self._is_moving = True
-        self.robot.moveWheels(self.speed, self.speed)
-
         pan_angle = PAN_LEFT if side_of_parking == "left" else PAN_RIGHT
-        self.robot.movePanTo(pan_angle, PAN_MOVEMENT_SPEED, True)
+        panning = await self.io(
+            self.robot.submit, "movePanTo", pan_angle, PAN_MOVEMENT_SPEED, True
+        )
+        await self.io(self.robot.sayText, "Approaching parking spot")
+        await self.sleep(SPEECH_WAIT_TIME)
+        await self.io(panning.result)
 
-        # 3) Main loop
-        rotonda_detected = self.params.get("rotonda_detected", False)
-        self.robot.startQrTracking()
-        last_rotonda_check = time.time()
+        self._is_moving = True
+        await self.io(self.robot.moveWheels, self.speed, self.speed)
 
-        while not self.stopped():
-            if (
-                not rotonda_detected
-                and (time.time() - last_rotonda_check) >= self.rotonda_check_interval
-            ):
-                print("[FindQR] Performing periodic rotonda check...")
-                self._is_moving = False
-                self.robot.stopMotors()
-                detected = self._rotonda_check()
-                if detected:
-                    rotonda_detected = True
-                last_rotonda_check = time.time()
+        # 3) Main loop (a planned route already faces the right way).
+        # The rotonda sign is looked for without stopping: it is read from
+        # any frame, and the camera glances ahead between side frames.
+        rotonda_detected = self.params.get("rotonda_detected", False)
+        check_rotonda = action_params.get("rotonda_check", True)
+        await self.io(self.robot.startQrTracking)
+        glance = None  # Clock time the current forward glance started
+        rotonda_eta = None  # Seconds to the turn, from a sighting in this glance
+        next_glance = self.clock.now() + self.rotonda_check_interval
 
+        while not self.interrupted():
             if not self._is_moving:
                 self._is_moving = True
-                self.robot.moveWheels(self.speed, self.speed)
+                await self.io(self.robot.moveWheels, self.speed, self.speed)
+
+            watch_rotonda = check_rotonda and not rotonda_detected
+            if watch_rotonda and glance is None and self.clock.now() >= next_glance:
+                glance = self.clock.now()
+                rotonda_eta = None
+                await self.io(
+                    self.robot.movePanTo, PAN_CENTER, PAN_MOVEMENT_SPEED, False
+                )
+
+            snapshot = await self.next_snapshot()
+            qr = snapshot.qr
+            valid = qr and qr.id is not None and qr.distance is not None and qr.distance > 0
+            if valid and watch_rotonda and "rotonda" in qr.id:
+                telemetry.debug(
+                    "[FindQR] Detected 'rotonda' QR at distance: %.2f", qr.distance
+                )
+                if qr.distance >= ROTONDA_TURN_DISTANCE:
+                    telemetry.info(
+                        "[FindQR] Close enough! Performing 180-degree turn..."
+                    )
+                    await self.io(self.robot.stopMotors)
+                    self._is_moving = False
+                    # The spot ends up on the other side: speak and turn the
+                    # camera there during the turn
+                    pan_angle = PAN_RIGHT if self._get_side() == "left" else PAN_LEFT
+                    speaking = await self.io(
+                        self.robot.submit,
+                        "sayText",
+                        "Rotonda detected, turning around",
+                        True,
+                    )
+                    panning = await self.io(
+                        self.robot.submit,
+                        "movePanTo",
+                        pan_angle,
+                        PAN_MOVEMENT_SPEED,
+                        True,
+                    )
+                    await self._perform_180_turn()
+                    await self.io(wait_all, speaking, panning)
+                    self.params.set("rotonda_detected", True)
+                    rotonda_detected = True
+                    glance = None
+                    continue
+                rotonda_eta = self._time_to_rotonda(qr.distance)
+                if glance is None:
+                    next_glance = min(next_glance, self.clock.now() + rotonda_eta)
+
+            if glance is not None and (
+                abs(snapshot.pan - PAN_CENTER) <= PAN_TOLERANCE
+                or self.clock.now() - glance > GLANCE_TIMEOUT
+            ):
+                # One frame ahead is enough: back to the side, and glance
+                # again when the sign should be close or after the interval
+                glance = None
+                await self.io(
+                    self.robot.movePanTo, pan_angle, PAN_MOVEMENT_SPEED, False
+                )
+                next_glance = self.clock.now() + (
+                    rotonda_eta
+                    if rotonda_eta is not None
+                    else self.rotonda_check_interval
+                )
 
-            qr = self.robot.readQR()
-            if qr and qr.id is not None and qr.distance is not None and qr.distance > 0:
+            facing_side = abs(snapshot.pan - pan_angle) <= PAN_TOLERANCE
+            if valid and facing_side:
                 distance = qr.distance  # cm
                 # --- Target QR detection ---
-                print(f"[FindQR] Detected QR: {qr.id} at distance {distance:.2f} cm")
+                telemetry.debug(
+                    "[FindQR] Detected QR: %s at distance %.2f cm", qr.id, distance
+                )
                 if qr.id == target_spot_id:
-                    print(
+                    telemetry.info(
                         f"[FindQR] Detected target QR: {qr.id} at distance {distance:.2f} cm"
                     )
-                    self.robot.stopMotors()
+                    await self.io(self.robot.stopMotors)
                     self._is_moving = False
-                    self._getCloserToPillarAndCentered(
+                    await self._getCloserToPillarAndCentered(
                         target_distance=TARGET_DISTANCE_TO_PILLAR
                     )
+                    if self.interrupted():
+                        break  # Stopped while closing in: not found
 
                     # Mark success and EXIT
                     self.params.set("found_qr", qr)
-                    print("[FindQR] Target QR approach and centering completed.")
+                    telemetry.info(
+                        "[FindQR] Target QR approach and centering completed."
+                    )
                     self.params.set("current_action_status", "completed")
-                    print("[FindQR] DEBUG: set current_action_status='completed'")
-                    self.robot.stopMotors()
+                    telemetry.debug("[FindQR] Set current_action_status='completed'")
+                    await self.io(self.robot.stopMotors)
                     self.supress = True
                     return
 
-            self.robot.wait(0.1)
-
         # 4) exit the while without success
-        print("[FindQR] Target QR not found during approach or behavior stopped.")
+        telemetry.warning(
+            "[FindQR] Target QR not found during approach or behavior stopped."
+        )
         self.params.set("current_action_status", "failed")
-        self.robot.stopQrTracking()
-        self.robot.stopMotors()
+        await self.io(self.robot.stopQrTracking)
+        await self.io(self.robot.stopMotors)
 
-    def _perform_180_turn(self):
-        print("[FindQR] Starting 180-degree turn...")
+    async def _perform_180_turn(self):
+        telemetry.info("[FindQR] Starting 180-degree turn...")
 
         # Rotate left wheel backward, right wheel forward to turn left
         turn_speed = self.speed
-        self.robot.moveWheelsByTime(-turn_speed, turn_speed, TURNING_TIME, True)
+        await self.io(
+            self.robot.moveWheelsByTime, -turn_speed, turn_speed, TURNING_TIME, True
+        )
         self.params.invert_sides()
-        print("[FindQR] 180-degree turn completed")
+        telemetry.info("[FindQR] 180-degree turn completed")
 
-    def _getCloserToPillarAndCentered(self, target_distance=TARGET_DISTANCE_TO_PILLAR):
-        centered = self._qrIsCentered()
+    async def _getCloserToPillarAndCentered(self, target_distance=TARGET_DISTANCE_TO_PILLAR):
         side = self._get_side()
 
         mult = 1 if side == "left" else -1
-        self.robot.moveWheels(self.speed, self.speed)
+        await self.io(self.robot.moveWheels, self.speed, self.speed)
         self._is_moving = True
 
-        while True:
-            qr = self.robot.readQR()
+        while not self.interrupted():
+            qr = (await self.next_snapshot()).qr
 
             # Check distance and centering
             if qr and qr.distance > 0:
-                print(f"Current distance to pillar: {qr.distance} cm")
+                telemetry.debug("Current distance to pillar: %s cm", qr.distance)
                 if qr.distance >= target_distance:
-                    if self._qrIsCentered(QR_CENTER_TOLERANCE):
-                        print("Reached target distance to pillar.")
+                    if self._qrIsCentered(QR_CENTER_TOLERANCE, qr):
+                        telemetry.info("Reached target distance to pillar.")
                         self._is_moving = False
-                        self.robot.stopMotors()
+                        await self.io(self.robot.stopMotors)
                         break
                     else:
-                        print("QR not centered, adjusting...")
+                        telemetry.debug("QR not centered, adjusting...")
                         if not self._is_moving:
-                            self.robot.moveWheels(self.speed, self.speed)
+                            await self.io(self.robot.moveWheels, self.speed, self.speed)
                             self._is_moving = True
-                        self.robot.wait(0.1)
                         continue
 
             # if not centered, perform S-curve to center
-            print("Performing S-curve maneuver to get closer to pillar...")
+            telemetry.info("Performing S-curve maneuver to get closer to pillar...")
             self._is_moving = False
             if side == "left":
-                self.robot.moveWheelsByTime(
-                    (-FAST_WHEEL_SPEED), (-SLOW_WHEEL_SPEED), 2, True
+                await self.io(
+                    self.robot.moveWheelsByTime,
+                    (-FAST_WHEEL_SPEED),
+                    (-SLOW_WHEEL_SPEED),
+                    2,
+                    True,
                 )
-                self.robot.moveWheelsByTime(
-                    (-SLOW_WHEEL_SPEED), (-FAST_WHEEL_SPEED), 2, True
+                await self.io(
+                    self.robot.moveWheelsByTime,
+                    (-SLOW_WHEEL_SPEED),
+                    (-FAST_WHEEL_SPEED),
+                    2,
+                    True,
                 )
-                self.robot.wait(0.5)
+                await self.sleep(0.5)
             else:
-                self.robot.moveWheelsByTime(
-                    (-SLOW_WHEEL_SPEED), (-FAST_WHEEL_SPEED), 2, True
+                await self.io(
+                    self.robot.moveWheelsByTime,
+                    (-SLOW_WHEEL_SPEED),
+                    (-FAST_WHEEL_SPEED),
+                    2,
+                    True,
                 )
-                self.robot.moveWheelsByTime(
-                    (-FAST_WHEEL_SPEED), (-SLOW_WHEEL_SPEED), 2, True
+                await self.io(
+                    self.robot.moveWheelsByTime,
+                    (-FAST_WHEEL_SPEED),
+                    (-SLOW_WHEEL_SPEED),
+                    2,
+                    True,
                 )
-                self.robot.wait(0.5)
-            print("Moving forward until centered...")
+                await self.sleep(0.5)
+            telemetry.info("Moving forward until centered...")
 
             # Move forward until centered
             if not self._is_moving:
-                self.robot.moveWheels(self.speed, self.speed)
+                await self.io(self.robot.moveWheels, self.speed, self.speed)
                 self._is_moving = True
-            while True:
-                qr = self.robot.readQR()
+            while not self.interrupted():
+                qr = (await self.next_snapshot()).qr
                 if qr and qr.distance > 0:
-                    print(f"QR x position during centering: {qr.x} cm")
-                    if self._qrIsCentered(QR_CENTER_TOLERANCE):
-                        print("QR is now centered.")
+                    telemetry.debug("QR x position during centering: %s cm", qr.x)
+                    if self._qrIsCentered(QR_CENTER_TOLERANCE, qr):
+                        telemetry.info("QR is now centered.")
                         self._is_moving = False
-                        self.robot.stopMotors()
+                        await self.io(self.robot.stopMotors)
                         break
-                self.robot.wait(0.1)
 
             if qr and qr.distance >= target_distance:
-                print("Reached target distance to pillar after adjustments.")
-                self.robot.stopMotors()
+                telemetry.info("Reached target distance to pillar after adjustments.")
+                await self.io(self.robot.stopMotors)
                 break
 
-            self.robot.wait(0.1)
-
-    def _qrIsCentered(self, tolerance=QR_CENTER_TOLERANCE):
-        """Check if the QR code is centered within a tolerance"""
+    def _qrIsCentered(self, tolerance=QR_CENTER_TOLERANCE, qr=None):
+        """Check if the QR code of a frame is centered within a tolerance"""
         center = 200  # Assuming 600px width
-        qr = self.robot.readQR()
         if qr and qr.distance > 0:
-            print(f"QR X position: {qr.x} cm")
+            telemetry.debug("QR X position: %s cm", qr.x)
             return abs(qr.x - center) <= tolerance
         return False
 
@@ -228,41 +316,15 @@ class FindQR(Behaviour):
         if target_spot_info is not None:
             return target_spot_info.side  # 'left' or 'right'
         else:
-            print(
-                "[Parking] Warning: Target spot info not found, defaulting to left side."
+            telemetry.warning(
+                "[FindQR] Target spot info not found, defaulting to left side."
             )
             return "left"  # Default to left if not found
 
-    def _rotonda_check(self):
-        """Periodic check for 'rotonda' QR code - checks continuously for 1 second"""
-        self.robot.movePanTo(0, PAN_MOVEMENT_SPEED, True)
-
-        rotonda = False
-        check_duration = 1.0  # seconds to keep checking
-        check_interval = 0.1  # time between checks
-        start_time = time.time()
-
-        while (time.time() - start_time) < check_duration:
-            qr = self.robot.readQR()
-            if qr and qr.id is not None and qr.distance is not None and qr.distance > 0:
-                distance = qr.distance
-
-                if "rotonda" in qr.id:
-                    print(
-                        f"[FindQR] Detected 'rotonda' QR at distance: {distance:.2f} cm during rotonda check"
-                    )
-                    if distance >= TARGET_DISTANCE_TO_PILLAR - 50:
-                        print("[FindQR] Close enough! Performing 180-degree turn...")
-                        self.robot.sayText("Rotonda detected, turning around", True)
-                        self._perform_180_turn()
-                        self.params.set("rotonda_detected", True)
-                        rotonda = True
-                        time.sleep(SPEECH_WAIT_TIME)
-                        break  # Exit loop once rotonda is detected and handled
-            self.robot.wait(check_interval)
-
-        # Reorient camera to side
-        side_of_parking = self._get_side()
-        pan_angle = PAN_LEFT if side_of_parking == "left" else PAN_RIGHT
-        self.robot.movePanTo(pan_angle, PAN_MOVEMENT_SPEED, True)
-        return rotonda
+    def _time_to_rotonda(self, distance: float) -> float:
+        """
+        Seconds of driving until a rotonda sign read at ``distance`` gets
+        close enough to turn around.
+        """
+        remaining = QR_DISTANCE_SCALE / distance - QR_DISTANCE_SCALE / ROTONDA_TURN_DISTANCE
+        return max(remaining / (self.speed * WHEEL_CM_PER_SPEED), MIN_GLANCE_INTERVAL)
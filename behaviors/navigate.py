@@ -0,0 +1,115 @@
+import math
+
+from behaviors.behaviors import AsyncBehaviour
+from robobopy.Robobo import Robobo
+from utils import telemetry
+from utils.config import (
+    NAV_DRIVE_SPEED,
+    NAV_SLOWDOWN_CM,
+    NAV_SLOWDOWN_DEG,
+    NAV_TURN_SPEED,
+    SPEED_SLOW,
+    WHEEL_BASE_CM,
+)
+from utils.odometry import wheel_travel_cm
+from utils.state import StateManager
+
+# Wheel speed correction per cm of difference between the wheels while driving
+HEADING_GAIN = 1.0
+
+
+class Navigate(AsyncBehaviour):
+    """
+    Behavior that executes the drive/turn steps of a planned route, closing
+    the loop on the wheel encoders of the sensor snapshots. Runs on the
+    BehaviourRuntime event loop.
+    """
+
+    watched_keys = ("current_action", "current_action_status")
+    sensor_channels = ("wheels",)
+
+    def __init__(self, robot: Robobo, supress_list, params: StateManager, **kwargs):
+        super().__init__(robot, supress_list, params, **kwargs)
+        self._wheel_speeds = None  # Last (right, left) speeds sent
+
+    def take_control(self) -> bool:
+        if self.supress:
+            return False
+        return self.params.get("current_action") in (
+            "drive",
+            "turn",
+        ) and self.params.get("current_action_status") not in ("completed", "failed")
+
+    async def action(self):
+        self.suppress_others()
+        action = self.params.get("current_action")
+        action_params = self.params.get("current_action_params") or {}
+        try:
+            if action == "drive":
+                await self._drive(
+                    action_params["distance"],
+                    action_params.get("speed", NAV_DRIVE_SPEED),
+                )
+            else:
+                await self._turn(
+                    action_params["angle"], action_params.get("speed", NAV_TURN_SPEED)
+                )
+        finally:
+            await self.io(self.robot.stopMotors)
+            self._wheel_speeds = None
+            self.release_others()
+        if self.interrupted():
+            self.params.set("current_action_status", "failed")
+        else:
+            self.params.set("current_action_status", "completed")
+
+    async def _move(self, right: float, left: float):
+        # Only talk to the robot when the speeds change
+        speeds = (round(right), round(left))
+        if speeds != self._wheel_speeds:
+            self._wheel_speeds = speeds
+            await self.io(self.robot.moveWheels, *speeds)
+
+    async def _travel(self, start: tuple) -> tuple:
+        """Distance (cm) rolled by the (right, left) wheels since ``start``."""
+        wheels = (await self.snapshot()).wheels
+        return (
+            wheel_travel_cm(wheels[0] - start[0]),
+            wheel_travel_cm(wheels[1] - start[1]),
+        )
+
+    async def _drive(self, distance: float, speed: int):
+        """Drive ``distance`` cm straight ahead (backwards if negative)."""
+        telemetry.info(f"[Navigate] Driving {distance:.0f} cm")
+        direction = 1 if distance >= 0 else -1
+        start = (await self.snapshot()).wheels
+        while not self.interrupted():
+            right, left = await self._travel(start)
+            remaining = abs(distance) - abs(right + left) / 2
+            if remaining <= 0:
+                break
+            wheel_speed = speed if remaining > NAV_SLOWDOWN_CM else SPEED_SLOW
+            # Keep the heading: slow down the wheel that got ahead
+            correction = HEADING_GAIN * (right - left) * direction
+            await self._move(
+                direction * (wheel_speed - correction),
+                direction * (wheel_speed + correction),
+            )
+            await self.next_snapshot()
+            telemetry.debug("[Navigate] %.1f cm to go", remaining)
+
+    async def _turn(self, angle: float, speed: int):
+        """Turn in place by ``angle`` degrees, positive to the left."""
+        telemetry.info(f"[Navigate] Turning {angle:.0f} degrees")
+        direction = 1 if angle >= 0 else -1
+        start = (await self.snapshot()).wheels
+        while not self.interrupted():
+            right, left = await self._travel(start)
+            turned = math.degrees((right - left) / WHEEL_BASE_CM)
+            remaining = abs(angle) - turned * direction
+            if remaining <= 0:
+                break
+            wheel_speed = speed if remaining > NAV_SLOWDOWN_DEG else SPEED_SLOW
+            await self._move(direction * wheel_speed, -direction * wheel_speed)
+            await self.next_snapshot()
+            telemetry.debug("[Navigate] %.1f degrees to go", remaining)
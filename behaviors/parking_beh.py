@@ -1,20 +1,52 @@
+import math
+
 from robobopy.utils.IR import IR
-from behaviors.behaviors import Behaviour
+from behaviors.behaviors import AsyncBehaviour
 from robobopy.Robobo import Robobo
+from utils import telemetry
 from utils.config import (
     DEFAULT_SIDE,
     FAST_WHEEL_SPEED,
+    PARKING_ENTRY,
+    PARKING_HEADING_TOLERANCE_DEG,
+    PARKING_IR_STOP,
+    PARKING_MAX_WHEEL_SPEED,
+    PARKING_POSITION_TOLERANCE_CM,
+    PARKING_SLOWDOWN_CM,
+    PARKING_SPEED,
+    QR_DISTANCE_SCALE,
     REVERSE_DURATION,
+    ROUTE_QR_STANDOFF_CM,
     SLOW_WHEEL_SPEED,
     SPEECH_WAIT_TIME,
+    SPEED_SLOW,
+    STRAIGHT_DURATION,
+    STRAIGHT_SPEED,
 )
-import time
+from utils.odometry import Odometry, wrap_angle
+from utils.parking_control import align_speeds, entry_path, pursuit_speeds
+from utils.sensors import read_snapshot
 from utils.state import StateManager
 
 
-class Parking(Behaviour):
-    def __init__(self, robot: Robobo, supress_list, params: StateManager):
-        super().__init__(robot, supress_list, params)
+class Parking(AsyncBehaviour):
+    watched_keys = ("target_spot", "current_action", "current_action_status")
+
+    @property
+    def sensor_channels(self) -> tuple[str, ...]:
+        # Only what the current action reads: the closed-loop entry follows
+        # the wheel encoders and stops on the IRs, the timed entry reads
+        # nothing while moveWheelsByTime blocks, the final adjustment
+        # creeps until the IRs see the wall
+        action = self.params.get("current_action")
+        if action == "reverse_entry" and PARKING_ENTRY == "closed_loop":
+            return ("irs", "wheels")
+        if action == "final_adjustment":
+            return ("irs",)
+        return ()
+
+    def __init__(self, robot: Robobo, supress_list, params: StateManager, **kwargs):
+        super().__init__(robot, supress_list, params, **kwargs)
         self._is_executing = False  # Track if we're currently executing
 
     def take_control(self) -> bool:
@@ -28,7 +60,7 @@ class Parking(Behaviour):
             return current_action in ["reverse_entry", "final_adjustment", "straighten"]
         return False
 
-    def action(self):
+    async def action(self):
         self.supress = False
         self.suppress_others()
         self._is_executing = True
@@ -36,29 +68,35 @@ class Parking(Behaviour):
             "forward" if self.params.get("rotonda_detected") else "reverse"
         )
         try:
-            print("----> control: Parking")
+            telemetry.debug("----> control: Parking")
             current_action = self.params.get("current_action")
 
             self.params.set("current_action_status", "executing")
 
             if current_action == "reverse_entry":
-                self.robot.sayText("Parking now", True)
-                if parking_maneuver == "forward":
-                    self._forward_entry()
+                await self.io(self.robot.sayText, "Parking now", True)
+                if PARKING_ENTRY == "closed_loop":
+                    await self._closed_loop_entry(parking_maneuver)
+                elif parking_maneuver == "forward":
+                    await self._forward_entry()
                 else:
-                    self._reverse_entry()
+                    await self._reverse_entry()
             elif current_action == "straighten":
                 self._straighten()
             elif current_action == "final_adjustment":
-                if parking_maneuver == "forward":
-                    self._final_adjust_back()
+                if PARKING_ENTRY == "closed_loop":
+                    # The closed-loop entry already ends aligned in the stall
+                    telemetry.info("[Parking] No final adjustment needed")
+                    self.params.set("current_action_status", "completed")
+                elif parking_maneuver == "forward":
+                    await self._final_adjust_back()
                 else:
-                    self.final_adjust_front()
+                    await self.final_adjust_front()
             else:
-                print(f"[Parking] Unknown action: {current_action}")
+                telemetry.error(f"[Parking] Unknown action: {current_action}")
                 self.params.set("current_action_status", "failed")
                 return
-            self.robot.wait(0.5)
+            await self.sleep(0.5)
         finally:
             self._is_executing = False
 
@@ -67,97 +105,231 @@ class Parking(Behaviour):
         if target_spot_info is not None:
             return target_spot_info.side  # 'left' or 'right'
         else:
-            print(
-                "[Parking] Warning: Target spot info not found, defaulting to left side."
+            telemetry.warning(
+                "[Parking] Target spot info not found, defaulting to left side."
             )
             return "left"  # Default to left if not found
 
-    def _reverse_entry(self):
-        self.robot.sayText("Reversing into the spot", True)
-        print("[Parking] Reversing into the spot")
+    async def _standoff(self) -> float:
+        """Lateral distance (cm) to the QR FindQR centered on, from its reading."""
+        # Read once, so the hub does not sample the QR through the entry
+        snapshot = await self.io(read_snapshot, self.robot, self.clock, channels=("qr",))
+        qr = snapshot.qr
+        if qr is None or qr.id != self.params.get("target_spot"):
+            qr = self.params.get("found_qr")
+        if qr is not None and qr.distance and qr.distance > 0:
+            return min(max(QR_DISTANCE_SCALE / qr.distance, 20.0), 80.0)
+        return ROUTE_QR_STANDOFF_CM
+
+    async def _closed_loop_entry(self, maneuver: str):
+        """
+        Follow the entry path into the stall on the wheel odometry, one
+        control step per sensor hub frame, then turn back parallel to the
+        lane. The IR sensor facing the direction of travel stops the entry
+        early.
+        """
+        reverse = maneuver == "reverse"
+        await self.io(
+            self.robot.sayText,
+            "Reversing into the spot" if reverse else "Moving forward into the spot",
+            True,
+        )
+        side = self._get_side()
+        path = entry_path(side, maneuver, await self._standoff())
+        telemetry.info(
+            f"[Parking] Closed-loop {maneuver} entry ({side}):"
+            f" {path.along:.0f} cm along, {path.lateral:.0f} cm across"
+        )
+        guard = IR.BackC if reverse else IR.FrontC
+        odometry = Odometry()  # Frame of the pose abeam the QR
+        odometry.update((await self.snapshot()).wheels)
+        speeds = None
+
+        async def move(right, left):
+            nonlocal speeds
+            command = (round(right), round(left))
+            if command != speeds:
+                speeds = command
+                await self.io(self.robot.moveWheels, *command)
+
+        while not self.interrupted():
+            snapshot = await self.next_snapshot()
+            odometry.update(snapshot.wheels)
+            x, y, heading = odometry.pose()
+            remaining = path.remaining(x)
+            if remaining <= PARKING_POSITION_TOLERANCE_CM:
+                break
+            if snapshot.irs[guard] >= PARKING_IR_STOP:
+                telemetry.info(
+                    f"[Parking] {guard.name} IR stop, {remaining:.0f} cm short"
+                )
+                break
+            speed = PARKING_SPEED if remaining > PARKING_SLOWDOWN_CM else SPEED_SLOW
+            await move(*pursuit_speeds((x, y, heading), path, speed))
+            telemetry.debug(
+                "[Parking] pose (%.1f, %.1f, %.0f), %.1f cm to go",
+                x,
+                y,
+                math.degrees(heading),
+                remaining,
+            )
+
+        # Parallel to the lane again, as the entry started
+        while not self.interrupted():
+            odometry.update((await self.next_snapshot()).wheels)
+            error = wrap_angle(-odometry.pose()[2])
+            if abs(math.degrees(error)) <= PARKING_HEADING_TOLERANCE_DEG:
+                break
+            await move(*align_speeds(error, PARKING_MAX_WHEEL_SPEED / 2))
+        await self.io(self.robot.stopMotors)
+
+        x, y, heading = odometry.pose()
+        telemetry.info(
+            f"[Parking] Entry done: {x - path.along:+.1f} cm along,"
+            f" {y - path.lateral:+.1f} cm across, {math.degrees(heading):+.1f} deg"
+        )
+        self.params.set("current_action_status", "completed")
+
+    async def _reverse_entry(self):
+        await self.io(self.robot.sayText, "Reversing into the spot", True)
+        telemetry.info("[Parking] Reversing into the spot")
         side = self._get_side()
 
         # self.robot.moveWheelsByTime(5, 5, 0.5)
         # Start reversing depending on side
         if side == DEFAULT_SIDE:
-            self.robot.moveWheelsByTime(
-                -FAST_WHEEL_SPEED, -SLOW_WHEEL_SPEED, REVERSE_DURATION, True
+            await self.io(
+                self.robot.moveWheelsByTime,
+                -FAST_WHEEL_SPEED,
+                -SLOW_WHEEL_SPEED,
+                REVERSE_DURATION,
+                True,
+            )
+            await self.io(
+                self.robot.moveWheelsByTime,
+                -STRAIGHT_SPEED,
+                -STRAIGHT_SPEED,
+                STRAIGHT_DURATION,
+                True,
             )
-            self.robot.moveWheelsByTime(-10, -10, 0.8, True)
-            self.robot.moveWheelsByTime(
-                -SLOW_WHEEL_SPEED, -FAST_WHEEL_SPEED, REVERSE_DURATION, True
+            await self.io(
+                self.robot.moveWheelsByTime,
+                -SLOW_WHEEL_SPEED,
+                -FAST_WHEEL_SPEED,
+                REVERSE_DURATION,
+                True,
             )
         else:
-            self.robot.moveWheelsByTime(
-                -SLOW_WHEEL_SPEED, -FAST_WHEEL_SPEED, REVERSE_DURATION, True
+            await self.io(
+                self.robot.moveWheelsByTime,
+                -SLOW_WHEEL_SPEED,
+                -FAST_WHEEL_SPEED,
+                REVERSE_DURATION,
+                True,
+            )
+            await self.io(
+                self.robot.moveWheelsByTime,
+                -STRAIGHT_SPEED,
+                -STRAIGHT_SPEED,
+                STRAIGHT_DURATION,
+                True,
             )
-            self.robot.moveWheelsByTime(-10, -10, 0.8, True)
-            self.robot.moveWheelsByTime(
-                -FAST_WHEEL_SPEED, -SLOW_WHEEL_SPEED, REVERSE_DURATION, True
+            await self.io(
+                self.robot.moveWheelsByTime,
+                -FAST_WHEEL_SPEED,
+                -SLOW_WHEEL_SPEED,
+                REVERSE_DURATION,
+                True,
             )
         self.params.set("current_action_status", "completed")
 
-    def _forward_entry(self):
-        self.robot.sayText("Moving forward into the spot", True)
-        print("[Parking] Moving forward into the spot")
-        self.robot.wait(SPEECH_WAIT_TIME)
+    async def _forward_entry(self):
+        await self.io(self.robot.sayText, "Moving forward into the spot", True)
+        telemetry.info("[Parking] Moving forward into the spot")
+        await self.sleep(SPEECH_WAIT_TIME)
         side = self._get_side()
 
         # Start moving forward depending on side
         if side == DEFAULT_SIDE:
-            self.robot.moveWheelsByTime(
-                FAST_WHEEL_SPEED, SLOW_WHEEL_SPEED, REVERSE_DURATION, True
+            await self.io(
+                self.robot.moveWheelsByTime,
+                FAST_WHEEL_SPEED,
+                SLOW_WHEEL_SPEED,
+                REVERSE_DURATION,
+                True,
             )
-            self.robot.moveWheelsByTime(10, 10, 0.8, True)
-            self.robot.moveWheelsByTime(
-                SLOW_WHEEL_SPEED, FAST_WHEEL_SPEED, REVERSE_DURATION, True
+            await self.io(
+                self.robot.moveWheelsByTime,
+                STRAIGHT_SPEED,
+                STRAIGHT_SPEED,
+                STRAIGHT_DURATION,
+                True,
+            )
+            await self.io(
+                self.robot.moveWheelsByTime,
+                SLOW_WHEEL_SPEED,
+                FAST_WHEEL_SPEED,
+                REVERSE_DURATION,
+                True,
             )
         else:
-            self.robot.moveWheelsByTime(
-                SLOW_WHEEL_SPEED, FAST_WHEEL_SPEED, REVERSE_DURATION, True
+            await self.io(
+                self.robot.moveWheelsByTime,
+                SLOW_WHEEL_SPEED,
+                FAST_WHEEL_SPEED,
+                REVERSE_DURATION,
+                True,
+            )
+            await self.io(
+                self.robot.moveWheelsByTime,
+                STRAIGHT_SPEED,
+                STRAIGHT_SPEED,
+                STRAIGHT_DURATION,
+                True,
             )
-            self.robot.moveWheelsByTime(10, 10, 0.8, True)
-            self.robot.moveWheelsByTime(
-                FAST_WHEEL_SPEED, SLOW_WHEEL_SPEED, REVERSE_DURATION, True
+            await self.io(
+                self.robot.moveWheelsByTime,
+                FAST_WHEEL_SPEED,
+                SLOW_WHEEL_SPEED,
+                REVERSE_DURATION,
+                True,
             )
         self.params.set("current_action_status", "completed")
 
     def _straighten(self):
         """Currently doees nothing"""
         # self.robot.sayText("Straightening the robot", True)
-        print("[Parking] Straightening the robot")
+        telemetry.info("[Parking] Straightening the robot")
 
         self.params.set("current_action_status", "completed")
 
-    def _final_adjust_back(self):
-        self.robot.sayText("Final adjustment backward", True)
-        print("[Parking] Performing final adjustment backward")
+    async def _final_adjust_back(self):
+        await self.io(self.robot.sayText, "Final adjustment backward", True)
+        telemetry.info("[Parking] Performing final adjustment backward")
 
         side = self._get_side()
 
         # Small forward movement to adjust position
-        self.robot.moveWheels(-5, -5)
-        while self.robot.readIRSensor(IR.BackC) < 80:
-            self.robot.wait(0.2)
-            if self.stopped():
+        await self.io(self.robot.moveWheels, -5, -5)
+        while (await self.next_snapshot()).irs[IR.BackC] < 80:
+            if self.interrupted():
                 break
-        self.robot.stopMotors()
+        await self.io(self.robot.stopMotors)
 
         self.params.set("current_action_status", "completed")
 
-    def final_adjust_front(self):
-        self.robot.sayText("Final adjustment backward", True)
-        print("[Parking] Performing final adjustment forward")
+    async def final_adjust_front(self):
+        await self.io(self.robot.sayText, "Final adjustment backward", True)
+        telemetry.info("[Parking] Performing final adjustment forward")
 
         side = self._get_side()
 
         # Small forward movement to adjust position
-        self.robot.moveWheels(5, 5)
-        while self.robot.readIRSensor(IR.FrontC) < 80:
-            self.robot.wait(0.2)
-            if self.stopped():
+        await self.io(self.robot.moveWheels, 5, 5)
+        while (await self.next_snapshot()).irs[IR.FrontC] < 80:
+            if self.interrupted():
                 break
-        self.robot.stopMotors()
+        await self.io(self.robot.stopMotors)
 
         self.params.set("current_action_status", "completed")
-        time.sleep(0.5)
+        await self.sleep(0.5)
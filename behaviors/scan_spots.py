@@ -1,24 +1,60 @@
+from collections import deque
+from dataclasses import dataclass, replace
+
 from utils.state import Spot, StateManager
-import time
 from robobopy.utils.IR import IR
 from robobopy.utils.QRCode import QRCode
-from behaviors.behaviors import Behaviour
+from behaviors.behaviors import AsyncBehaviour
 from robobopy.Robobo import Robobo
+from utils import telemetry
+from utils.command_channel import wait_all
+from utils.map_prior import ExpectedSpot, ScanSchedule
+from utils.odometry import wheel_travel_cm
+from utils.pan_scheduler import SIDE_ANGLES, PanScheduler, faces_side, side_of_pan
 from utils.config import (
+    OCCUPANCY_CHECK_ATTEMPTS,
+    OCCUPANCY_LOOK_ANGLE,
+    OCCUPANCY_LOOK_TIME,
+    OCCUPANCY_PAN_TOLERANCE,
+    OCCUPIED_LABELS,
     SPEED_MEDIUM,
     SPEED_SLOW,
     TILT_CENTER,
     PAN_CENTER,
     PAN_MOVEMENT_SPEED,
     SPEECH_WAIT_TIME,
+    WHEEL_CM_PER_SPEED,
 )
 
+# Timestamp of a spot whose stall could not be looked at: older than any
+# observation, so the fleet registry prefers any real reading of it
+UNKNOWN_OCCUPANCY_TIME = 0.0
+
+
+class ScanSpots(AsyncBehaviour):
+    watched_keys = ("current_action", "parking_state", "scanning_complete")
+    sensor_channels = ("qr", "pan", "detected_object", "wheels")
+
+    def __init__(
+        self,
+        robot: Robobo,
+        supress_list,
+        params: StateManager,
+        expected_spots: list[ExpectedSpot] | None = None,
+        **kwargs,
+    ):
+        super().__init__(robot, supress_list, params, **kwargs)
 
-class ScanSpots(Behaviour):
-    def __init__(self, robot: Robobo, supress_list, params: StateManager):
-        super().__init__(robot, supress_list, params)
+        self.max_spots = 4  # Maximum number of parking spots to scan blind
+        # Spots the map says the robot will pass (None scans blind); the
+        # scan then ends when all of them are seen or behind the robot
+        self.expected_spots = expected_spots
 
-        self.max_spots = 4  # Maximum number of parking spots to scan
+    def needs_scan(self) -> bool:
+        """False when the spots already in the state cover what a scan would find."""
+        if self.expected_spots is not None:
+            return any(not self.params.has_spot(spot.id) for spot in self.expected_spots)
+        return self.params.spot_count() < self.max_spots
 
     def take_control(self) -> bool:
         current_action = self.params.get("current_action")
@@ -34,104 +70,222 @@ class ScanSpots(Behaviour):
         return False
 
     # Method that defines what the behavior does
-    def action(self):
-        print("----> control: ScanSpots")
+    async def action(self):
+        telemetry.debug("----> control: ScanSpots")
 
         self.params.set("current_action_status", "executing")
 
-        self.robot.sayText("I am scanning spots", True)
-
-        self.robot.moveTiltTo(TILT_CENTER, PAN_MOVEMENT_SPEED, True)
+        speaking = await self.io(
+            self.robot.submit, "sayText", "I am scanning spots", True
+        )
+        tilting = await self.io(
+            self.robot.submit, "moveTiltTo", TILT_CENTER, PAN_MOVEMENT_SPEED, True
+        )
+        await self.io(wait_all, speaking, tilting)
 
         speed = SPEED_SLOW
-        self.robot.moveWheels(speed, speed)
-        self.robot.startQrTracking()
-        pan_positions = [90, -90]
-        current_pan_index = 0
-        self.robot.movePanTo(
-            pan_positions[current_pan_index], PAN_MOVEMENT_SPEED, False
-        )
+        await self.io(self.robot.moveWheels, speed, speed)
+        driving = True
+        await self.io(self.robot.startQrTracking)
+        # Recognition stays on so stalls are checked without stopping
+        await self.io(self.robot.startObjectRecognition)
+        scheduler = PanScheduler(self.clock)
+        pan_angle = None  # Last commanded pan
 
-        current_time_pan_move = time.time()
+        pending: deque[OccupancyCheck] = deque()  # Seen, waiting for the camera
+        check: OccupancyCheck | None = None  # Stall the camera is looking at
+
+        schedule = None
+        if self.expected_spots is not None:
+            schedule = ScanSchedule(self.expected_spots)
+            for spot_id in self.params.get_detected_spot_ids():
+                schedule.mark_seen(spot_id)  # Known from the spot cache
+        start_wheels = (await self.snapshot()).wheels
+        travelled = 0.0  # cm along the lane, from the wheel encoders
 
         iteration = 0
-        while (
-            not self.stopped()
-            and len(self.params.get_detected_spots()) < self.max_spots
-            and self.params.get("current_action") == "scan_spots"
-        ):
-            # pan_angle = pan_positions[current_pan_index]
-            # current_angle = self.robot.readPanPosition()
-            # print(f"Current pan angle: {current_angle}, Target pan angle: {pan_angle}")
-            # if abs(current_angle - pan_angle) > 2:
-            #     pass
-            # else:
-            #     current_pan_index = (current_pan_index + 1) % len(pan_positions)
-            #     pan_angle = pan_positions[current_pan_index]
-            #     self.robot.movePanTo(pan_angle, PAN_MOVEMENT_SPEED, False)
-
-            # Every 2 seconds, move Pan to opposite side
-            if time.time() - current_time_pan_move > 4:
-                current_pan_index = (current_pan_index + 1) % len(pan_positions)
-                pan_angle = pan_positions[current_pan_index]
-                self.robot.movePanTo(pan_angle, PAN_MOVEMENT_SPEED, False)
-                current_time_pan_move = time.time()
-
-            qr = self.robot.readQR()
-            print(
-                f"QR read: id={qr.id if qr else None}, distance={qr.distance if qr else None}, data={qr.p1}, {qr.p2}, {qr.p3}"
-            )  # Debug
+        while not self.interrupted() and self.params.get("current_action") == "scan_spots":
+            in_progress = len(pending) + (check is not None)
+            if schedule is not None:
+                all_seen = schedule.done(travelled)
+            else:
+                all_seen = self.params.spot_count() + in_progress >= self.max_spots
+            if all_seen:
+                if not in_progress:
+                    break
+                if driving:
+                    # Every spot is seen; stay put while the last ones are checked
+                    await self.io(self.robot.stopMotors)
+                    driving = False
+            elif schedule is not None:
+                # Cross stretches without spots faster
+                wanted = SPEED_MEDIUM if schedule.in_gap(travelled) else SPEED_SLOW
+                if wanted != speed:
+                    speed = wanted
+                    await self.io(self.robot.moveWheels, speed, speed)
+
+            ground_speed = speed * WHEEL_CM_PER_SPEED if driving else 0.0  # cm/s
+            if check is None and pending:
+                # Borrow the camera to look back at the oldest unchecked stall
+                check = pending.popleft()
+                check.started = self.clock.now()
+                pan_angle = check.look_angle
+                await self.io(
+                    self.robot.movePanTo, pan_angle, PAN_MOVEMENT_SPEED, False
+                )
+            elif check is None:
+                expected = schedule.expected_sides(travelled) if schedule else None
+                target = SIDE_ANGLES[scheduler.choose(ground_speed, expected)]
+                if target != pan_angle:
+                    pan_angle = target
+                    await self.io(
+                        self.robot.movePanTo, pan_angle, PAN_MOVEMENT_SPEED, False
+                    )
+
+            snapshot = await self.next_snapshot()
+            travelled = lane_travel_cm(start_wheels, snapshot.wheels)
+            scheduler.observe(snapshot.pan, ground_speed)
+            if check is not None and self._observe(check, snapshot):
+                if check.unknown and check.attempts < OCCUPANCY_CHECK_ATTEMPTS:
+                    # Try again once the other stalls have been looked at
+                    pending.append(check.retry())
+                else:
+                    self._resolve(check)
+                check = None  # The scheduler takes the camera back next frame
+
+            qr = snapshot.qr
+            telemetry.debug(
+                "QR read: id=%s, distance=%s, data=%s, %s, %s",
+                qr.id if qr else None,
+                qr.distance if qr else None,
+                qr.p1,
+                qr.p2,
+                qr.p3,
+            )
 
             if qr and qr.distance > 0:
                 spot_id = qr.id
                 # Check if spot is already recorded
                 if spot_id == "rotonda":
                     continue
-                if spot_id not in self.params.get_detected_spot_ids():
-                    spot_taken = self.is_ocuppied(spot_id, 1 if pan_angle < 0 else -1)
-                    spot = Spot(
-                        id=spot_id,
-                        position=(qr.x, qr.y),
-                        timestamp=time.time(),
-                        occupied=spot_taken,
-                        side="left" if pan_angle < 0 else "right",
+                queued = {c.spot_id for c in pending}
+                if check is not None:
+                    queued.add(check.spot_id)
+                if schedule is not None:
+                    schedule.mark_seen(spot_id)
+                if not self.params.has_spot(spot_id) and spot_id not in queued:
+                    if schedule is None and not faces_side(snapshot.pan):
+                        # Read ahead with the pan still near the centre: the
+                        # side is unknown, so wait for a frame from the side
+                        continue
+                    # The side the camera actually faced in this frame, not
+                    # the commanded one: the pan may still be on its way
+                    side = (schedule and schedule.side_of(spot_id)) or side_of_pan(
+                        snapshot.pan
+                    )
+                    scheduler.record_detection(side_of_pan(snapshot.pan))
+                    pending.append(
+                        OccupancyCheck(
+                            spot_id=spot_id,
+                            position=(qr.x, qr.y),
+                            side=side,
+                            look_angle=(
+                                -OCCUPANCY_LOOK_ANGLE
+                                if side == "left"
+                                else OCCUPANCY_LOOK_ANGLE
+                            ),
+                        )
+                    )
+                    await self.io(
+                        self.robot.sayText, f"Found parking spot {spot_id}", False
+                    )
+                    telemetry.info(
+                        f"Found spot {spot_id} on the {side}, checking occupancy"
                     )
-                    self.params.add_detected_spot(spot)
-
-                    print(f"Found spot {spot_id}: {spot}")
-
-                    self.robot.moveWheels(speed, speed)  # Continue moving forward
                 else:
-                    print(f"Spot {spot_id} already recorded.")
+                    telemetry.debug("Spot %s already recorded.", spot_id)
 
-            print(f"Scan iteration {iteration} complete.")
+            telemetry.debug("Scan iteration %d complete.", iteration)
             iteration += 1
-            # Add a stop condition if needed
-            self.robot.wait(0.1)
 
-        self.robot.stopMotors()
-        self.robot.movePanTo(PAN_CENTER, PAN_MOVEMENT_SPEED, True)
+        if schedule is not None and schedule.missed(travelled):
+            telemetry.info(
+                f"[ScanSpots] Expected spots not seen: {schedule.missed(travelled)}"
+            )
+        scheduler.report()
+        await self.io(self.robot.stopMotors)
+        await self.io(self.robot.stopObjectRecognition)
+        await self.io(self.robot.movePanTo, PAN_CENTER, PAN_MOVEMENT_SPEED, True)
+        self.params.set("lane_position", travelled)  # For the spot allocation
         self.params.set("scanning_complete", True)
         self.params.set("parking_state", "waiting_for_input")
         self.params.set("current_action_status", "completed")
-        time.sleep(SPEECH_WAIT_TIME)  # Wait for the message to be spoken
-        self.robot.stopQrTracking()
+        await self.sleep(SPEECH_WAIT_TIME)  # Wait for the message to be spoken
+        await self.io(self.robot.stopQrTracking)
         self.supress = True
 
-    def is_ocuppied(self, spot_id: str, direction: int) -> bool:
-        self.robot.startObjectRecognition()
-        self.robot.stopMotors()
-        self.robot.sayText(f"Found parking spot {spot_id}", True)
-        self.robot.movePanTo(direction * -120, PAN_MOVEMENT_SPEED)
-        time.sleep(1)  # Allow time for the pan movement to complete
-        obj = self.robot.readDetectedObject()
-
-        self.robot.movePanTo(direction * 90, PAN_MOVEMENT_SPEED, True)
-
-        self.robot.stopObjectRecognition()
-        print(f"Detected object: {obj.label}")
-        spot_taken = False
-        print(f"Detected object: {obj.label} with confidence {obj.confidence}")
-        if obj.label == "robobo" or obj.label == "person":
-            spot_taken = True
-        return spot_taken
+    def _observe(self, check: "OccupancyCheck", snapshot) -> bool:
+        """Feed one frame to an occupancy check. Returns True once it is decided."""
+        now = self.clock.now()
+        if check.reached is None:
+            if abs(snapshot.pan - check.look_angle) <= OCCUPANCY_PAN_TOLERANCE:
+                check.reached = now
+            elif now - check.started > 3 * OCCUPANCY_LOOK_TIME:
+                check.unknown = True  # The pan never got there
+                return True
+            return False
+        obj = snapshot.detected_object
+        if obj is not None and obj.label in OCCUPIED_LABELS:
+            telemetry.info(
+                f"Detected object: {obj.label} with confidence {obj.confidence}"
+            )
+            check.occupied = True
+            return True
+        return now - check.reached >= OCCUPANCY_LOOK_TIME
+
+    def _resolve(self, check: "OccupancyCheck"):
+        if check.unknown:
+            # Never offer a stall nobody looked at. It is not a reading, so
+            # it stays out of the spot cache and the next scan checks it
+            telemetry.info(
+                f"[ScanSpots] Spot {check.spot_id} not checked, occupancy unknown"
+            )
+        spot = Spot(
+            id=check.spot_id,
+            position=check.position,
+            timestamp=UNKNOWN_OCCUPANCY_TIME if check.unknown else self.clock.now(),
+            occupied=check.occupied or check.unknown,
+            side=check.side,
+        )
+        self.params.add_detected_spot(spot)
+        if not check.unknown:
+            self.params.set("observed_spot", spot)  # Saved to the spot cache
+        telemetry.info(f"Found spot {check.spot_id}: {spot}")
+
+
+def lane_travel_cm(start: tuple, wheels: tuple) -> float:
+    """Mean distance (cm) rolled by the (right, left) wheels since ``start``."""
+    return (
+        wheel_travel_cm(wheels[0] - start[0]) + wheel_travel_cm(wheels[1] - start[1])
+    ) / 2
+
+
+@dataclass
+class OccupancyCheck:
+    """A spot seen during the scan whose stall still has to be looked at."""
+
+    spot_id: str
+    position: tuple
+    side: str
+    look_angle: int  # Pan angle that faces the stall
+    started: float | None = None  # Clock time the camera was given to this check
+    reached: float | None = None  # Clock time the pan reached look_angle
+    occupied: bool = False
+    unknown: bool = False  # The pan never reached look_angle
+    attempts: int = 1
+
+    def retry(self) -> "OccupancyCheck":
+        """The same check, queued again for another look."""
+        return replace(
+            self, started=None, reached=None, unknown=False, attempts=self.attempts + 1
+        )
@@ -0,0 +1,291 @@
+"""
+End-to-end mission benchmark.
+Runs main.py's state machine against the headless simulator for a matrix
+of target spots, and reports per Plan step timing, remote call counts and
+CPU time. Results can be stored as a baseline and compared against later.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import time
+from collections import Counter
+
+from main import main
+from utils import telemetry
+from utils.clock import VirtualClock
+from utils.config import MAP_FILE, ROUTE_MODE
+from utils.metrics import metrics
+from utils.sim_robot import SimRobobo
+from utils.state import StateManager
+
+DEFAULT_SPOTS = ["1", "2", "7", "8"]  # Spots the scan detects on map.json
+BASELINE_FILE = "benchmarks/baseline.json"
+REGRESSION_THRESHOLD = 0.10  # Relative slowdown reported as a regression
+
+
+class StepTimer:
+    """Times each executed Plan step in wall and simulated seconds."""
+
+    def __init__(self, params: StateManager):
+        self.params = params
+        self.steps = []  # {"action", "wall", "sim", "status"}
+        self._current = None
+        # A step starts when its action is published (the behavior may have
+        # set the status to "executing" first) and ends on completed/failed
+        params.subscribe("current_action", self._on_action)
+        params.subscribe("current_action_status", self._on_status)
+
+    def _on_action(self, key, old, new):
+        if new is not None:
+            self._current = (new, time.perf_counter(), self.params.clock.now())
+
+    def _on_status(self, key, old, new):
+        if new in ("completed", "failed") and self._current is not None:
+            action, wall_start, sim_start = self._current
+            self._current = None
+            self.steps.append(
+                {
+                    "action": action,
+                    "wall": time.perf_counter() - wall_start,
+                    "sim": self.params.clock.now() - sim_start,
+                    "status": new,
+                }
+            )
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile (p in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def run_mission(
+    spot: str,
+    map_path: str = MAP_FILE,
+    scan_mode: str = "blind",
+    route_mode: str = ROUTE_MODE,
+) -> dict:
+    """Run one headless mission parking in ``spot`` and collect its metrics."""
+    clock = VirtualClock()
+    robot = SimRobobo(map_path, clock=clock)
+    params = StateManager(clock)
+    timer = StepTimer(params)
+
+    sim_start = clock.now()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        main(
+            robot,
+            spot_choice=spot,
+            clock=clock,
+            record=False,
+            params=params,
+            scan_mode=scan_mode,
+            map_path=map_path,
+            spot_cache=None,
+            route_mode=route_mode,
+        )
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    target = params.get_spot(spot)
+    # main() times every robot call into a robot.<method> histogram
+    calls = {
+        name.removeprefix("robot."): histogram["count"]
+        for name, histogram in metrics.stats()["histograms"].items()
+        if name.startswith("robot.")
+    }
+    return {
+        "spot": spot,
+        "side": target.side if target else None,
+        "success": params.get("parking_state") == "done",
+        "wall": wall,
+        "sim": clock.now() - sim_start,
+        "cpu": cpu,
+        "calls": calls,
+        "steps": timer.steps,
+    }
+
+
+def summarize(runs: list[dict]) -> dict:
+    """Aggregate runs into p50/p95 per step, per side and call counts."""
+    by_action = {}
+    for run in runs:
+        for step in run["steps"]:
+            by_action.setdefault(step["action"], []).append(step)
+
+    steps = {
+        action: {
+            "count": len(items),
+            "wall_p50": percentile([s["wall"] for s in items], 50),
+            "wall_p95": percentile([s["wall"] for s in items], 95),
+            "sim_p50": percentile([s["sim"] for s in items], 50),
+            "sim_p95": percentile([s["sim"] for s in items], 95),
+        }
+        for action, items in by_action.items()
+    }
+
+    missions = {}
+    for run in runs:
+        key = f"spot {run['spot']} ({run['side'] or '?'})"
+        missions.setdefault(key, []).append(run)
+    missions = {
+        key: {
+            "success": sum(r["success"] for r in items) / len(items),
+            "wall_p50": percentile([r["wall"] for r in items], 50),
+            "sim_p50": percentile([r["sim"] for r in items], 50),
+            "cpu_p50": percentile([r["cpu"] for r in items], 50),
+        }
+        for key, items in missions.items()
+    }
+
+    calls = Counter()
+    for run in runs:
+        calls.update(run["calls"])
+    calls_per_run = {
+        method: count / len(runs) for method, count in sorted(calls.items())
+    }
+
+    return {
+        "runs": len(runs),
+        "spots": sorted({run["spot"] for run in runs}),
+        "wall_p50": percentile([r["wall"] for r in runs], 50),
+        "wall_p95": percentile([r["wall"] for r in runs], 95),
+        "cpu_p50": percentile([r["cpu"] for r in runs], 50),
+        "cpu_p95": percentile([r["cpu"] for r in runs], 95),
+        "calls_per_run": sum(calls_per_run.values()),
+        "calls_by_method": calls_per_run,
+        "steps": steps,
+        "missions": missions,
+    }
+
+
+def print_summary(summary: dict):
+    print("\n" + "=" * 72)
+    print(f"  MISSION BENCHMARK ({summary['runs']} runs)")
+    print("=" * 72)
+    print(
+        f"{'Step':<18} {'n':>4} {'wall p50':>10} {'wall p95':>10}"
+        f" {'sim p50':>9} {'sim p95':>9}"
+    )
+    for action, step in summary["steps"].items():
+        print(
+            f"{action:<18} {step['count']:>4} {step['wall_p50'] * 1000:>8.1f}ms"
+            f" {step['wall_p95'] * 1000:>8.1f}ms {step['sim_p50']:>8.1f}s"
+            f" {step['sim_p95']:>8.1f}s"
+        )
+    print("-" * 72)
+    print(f"{'Mission':<18} {'ok':>4} {'wall p50':>10} {'cpu p50':>10} {'sim p50':>9}")
+    for key, mission in summary["missions"].items():
+        print(
+            f"{key:<18} {mission['success']:>4.0%} {mission['wall_p50'] * 1000:>8.1f}ms"
+            f" {mission['cpu_p50'] * 1000:>8.1f}ms {mission['sim_p50']:>8.1f}s"
+        )
+    print("-" * 72)
+    print(
+        f"Wall p50/p95: {summary['wall_p50'] * 1000:.1f}/{summary['wall_p95'] * 1000:.1f} ms"
+        f"  CPU p50/p95: {summary['cpu_p50'] * 1000:.1f}/{summary['cpu_p95'] * 1000:.1f} ms"
+    )
+    print(f"Remote calls per run: {summary['calls_per_run']:.0f}")
+    for method, count in summary["calls_by_method"].items():
+        print(f"  {method:<24} {count:>8.1f}")
+    print("=" * 72 + "\n")
+
+
+def compare(
+    summary: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD
+) -> list[str]:
+    """Print the change against ``baseline`` and return the regressions."""
+    metrics = [
+        ("mission wall p50", summary["wall_p50"], baseline.get("wall_p50")),
+        ("mission wall p95", summary["wall_p95"], baseline.get("wall_p95")),
+        ("mission cpu p50", summary["cpu_p50"], baseline.get("cpu_p50")),
+        ("remote calls/run", summary["calls_per_run"], baseline.get("calls_per_run")),
+    ]
+    for action, step in summary["steps"].items():
+        old = baseline.get("steps", {}).get(action, {})
+        metrics.append((f"{action} wall p50", step["wall_p50"], old.get("wall_p50")))
+        metrics.append((f"{action} sim p50", step["sim_p50"], old.get("sim_p50")))
+
+    regressions = []
+    print("Comparison with baseline:")
+    if baseline.get("spots") != summary["spots"]:
+        print(f"  (baseline ran spots {baseline.get('spots')}, this run {summary['spots']})")
+    for name, new, old in metrics:
+        if not old:
+            print(f"  {name:<28} {new:>10.4f}  (no baseline)")
+            continue
+        change = (new - old) / old
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<28} {old:>10.4f} -> {new:>10.4f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Headless mission benchmark")
+    parser.add_argument(
+        "--spots",
+        default=",".join(DEFAULT_SPOTS),
+        help="comma-separated target spots",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="repetitions per spot")
+    parser.add_argument("--map", default=MAP_FILE, help="map file")
+    parser.add_argument(
+        "--scan-mode", choices=["blind", "map"], default="blind", help="scan mode"
+    )
+    parser.add_argument(
+        "--route-mode", choices=["search", "grid"], default=ROUTE_MODE, help="route mode"
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store this run as the new baseline",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    telemetry.set_log_level("WARNING")
+
+    runs = []
+    for spot in args.spots.split(","):
+        for i in range(args.runs):
+            run = run_mission(
+                spot.strip(), args.map, args.scan_mode, args.route_mode
+            )
+            print(
+                f"[Benchmark] spot {run['spot']} run {i + 1}:"
+                f" {'parked' if run['success'] else 'failed'}"
+                f" in {run['sim']:.1f}s sim, {run['wall'] * 1000:.0f}ms wall"
+            )
+            runs.append(run)
+
+    summary = summarize(runs)
+    print_summary(summary)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f))
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"[Benchmark] Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"[Benchmark] {len(regressions)} regressions above {REGRESSION_THRESHOLD:.0%}")
+        raise SystemExit(1)
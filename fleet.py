@@ -0,0 +1,188 @@
+"""
+Fleet runner.
+Runs one mission per robot in a single process: each robot gets its own
+StateManager, executor and behaviors, all on one shared clock, and the
+spots they find are shared through a SpotRegistry. The behaviors of
+every robot run on one shared BehaviourRuntime. Reports the fleet
+throughput in parked cars per hour.
+
+    python fleet.py --robots 192.168.1.48 192.168.1.49 --spots 2 7
+    python fleet.py --sim 3 --spots 1 2 7
+    python fleet.py --sim 3 --allocation auto   # spots allocated by travel cost
+"""
+
+import argparse
+from threading import Thread
+
+from behaviors.behaviors import BehaviourRuntime
+from main import main
+from utils.clock import Clock, RealClock, VirtualClock
+from utils.config import (
+    FLEET_START_INTERVAL,
+    MAP_FILE,
+    METRICS_ENABLED,
+    ROUTE_MODE,
+    SCAN_MODE,
+    SPOT_ALLOCATION,
+    SPOT_CACHE_FILE,
+)
+from utils.metrics import metrics
+from utils.spot_registry import SpotRegistry
+
+
+def run_fleet(
+    robots: dict,
+    clock: Clock,
+    spot_choices: dict | None = None,
+    start_interval: float = FLEET_START_INTERVAL,
+    **mission_args,
+) -> dict:
+    """
+    Run a mission for each of ``robots`` (name -> Robobo or SimRobobo on
+    ``clock``), the n-th one starting ``n * start_interval`` seconds after
+    the first. ``spot_choices`` answers the spot prompt per robot name;
+    the other robots get their spot from the allocation. ``mission_args``
+    go to main(). Returns the fleet summary.
+    """
+    spot_choices = spot_choices or {}
+    registry = SpotRegistry(clock)
+    results = {}
+    metrics.reset(clock)
+    start = clock.now()
+    # One event loop for the behaviors of every robot
+    runtime = BehaviourRuntime(clock, name="FleetRuntime")
+    runtime.start()
+
+    def run(index: int, name: str, robot):
+        clock.sleep(index * start_interval)
+        began = clock.now()
+        try:
+            params = main(
+                robot,
+                spot_choice=spot_choices.get(name),
+                clock=clock,
+                record=False,
+                registry=registry,
+                name=name,
+                standalone=False,
+                runtime=runtime,
+                **mission_args,
+            )
+            parked = params.get("parking_state") == "done"
+            spot = params.get("target_spot") if parked else None
+        finally:
+            clock.unregister()
+        results[name] = {"spot": spot, "time": clock.now() - began}
+
+    threads = []
+    for index, (name, robot) in enumerate(robots.items()):
+        thread = Thread(target=run, args=(index, name, robot), name=f"Fleet-{name}")
+        # Join the clock before running so time waits for every robot
+        clock.register(thread)
+        threads.append(thread)
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    runtime.close()
+    runtime.join()
+
+    elapsed = clock.now() - start
+    parked = len(registry.parked)
+    summary = {
+        "robots": results,
+        "parked": parked,
+        "elapsed": elapsed,
+        "cars_per_hour": 3600 * parked / elapsed if elapsed > 0 else 0.0,
+    }
+    if METRICS_ENABLED:
+        metrics.dump()
+    return summary
+
+
+def print_summary(summary: dict):
+    print("\n" + "=" * 60)
+    print("  FLEET SUMMARY")
+    print("=" * 60)
+    for name, result in summary["robots"].items():
+        outcome = f"parked in {result['spot']}" if result["spot"] else "did not park"
+        print(f"{name:<20} {outcome:<16} after {result['time']:.1f}s")
+    print("-" * 60)
+    print(
+        f"{summary['parked']} cars parked in {summary['elapsed']:.1f}s:"
+        f" {summary['cars_per_hour']:.1f} cars/hour"
+    )
+    print("=" * 60 + "\n")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run several Robobos in one process")
+    robots = parser.add_mutually_exclusive_group(required=True)
+    robots.add_argument("--robots", nargs="+", metavar="IP", help="robot endpoints")
+    robots.add_argument(
+        "--sim",
+        type=int,
+        metavar="N",
+        help="run N headless robots, each in its own copy of --map",
+    )
+    parser.add_argument("--map", default=MAP_FILE, help="map file")
+    parser.add_argument(
+        "--spots",
+        nargs="+",
+        default=[],
+        help="spot for each robot, in order, instead of prompting",
+    )
+    parser.add_argument(
+        "--start-interval",
+        type=float,
+        default=FLEET_START_INTERVAL,
+        help="seconds between robot starts",
+    )
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="run --sim in wall-clock time instead of virtual time",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="ignore the spot cache and scan the whole lot",
+    )
+    parser.add_argument("--scan-mode", choices=["blind", "map"], default=SCAN_MODE)
+    parser.add_argument("--route-mode", choices=["search", "grid"], default=ROUTE_MODE)
+    parser.add_argument(
+        "--allocation", choices=["auto", "interactive"], default=SPOT_ALLOCATION
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    clock = RealClock()
+    if args.sim:
+        from utils.sim_robot import SimRobobo
+
+        if not args.realtime:
+            clock = VirtualClock()
+        robots = {
+            f"sim-{i + 1}": SimRobobo(args.map, clock=clock) for i in range(args.sim)
+        }
+        lot = f"sim:{args.map}"
+    else:
+        from robobopy.Robobo import Robobo
+
+        robots = {ip: Robobo(ip) for ip in args.robots}
+        lot = "robot"
+    summary = run_fleet(
+        robots,
+        clock,
+        spot_choices=dict(zip(robots, args.spots)),
+        start_interval=args.start_interval,
+        scan_mode=args.scan_mode,
+        route_mode=args.route_mode,
+        map_path=args.map,
+        spot_cache=None if args.no_cache else SPOT_CACHE_FILE,
+        lot=lot,
+        allocation=args.allocation,
+    )
+    print_summary(summary)
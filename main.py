@@ -1,44 +1,184 @@
 from robobopy.Robobo import Robobo
 
+from behaviors.arbiter import Arbiter
+from behaviors.behaviors import BehaviourRuntime
 from behaviors.find_qr import FindQR
+from behaviors.navigate import Navigate
 from behaviors.parking_beh import Parking
 from behaviors.scan_spots import ScanSpots
 
 from utils.planner import ParkingPlanner
 from utils.executor import Executor
-from utils.state import StateManager
+from utils.state import Spot, StateManager
+from utils.sensors import SensorHub
 from utils.feedback import (
     announce_parking_spots,
     display_parking_spots,
     prompt_for_parking_spot,
     display_plan_progress,
 )
-import time
-
+from utils import telemetry
+from utils.clock import Clock, RealClock, VirtualClock
+from utils.command_channel import CommandChannel
+from utils.config import (
+    MAP_FILE,
+    METRICS_ENABLED,
+    ROUTE_MODE,
+    SCAN_MODE,
+    SPOT_ALLOCATION,
+    SPOT_CACHE_FILE,
+    STATE_WAIT_TIMEOUT,
+    TELEMETRY_ENABLED,
+)
+from utils.grid_cache import load_grid
+from utils.grid_planner import plan_route_to_spot
+from utils.map_layout import MapLayout, rotation_to_heading
+from utils.map_prior import expected_spots
+from utils.metrics import InstrumentedRobot, metrics
+from utils.odometry import Odometry
+from utils.spot_allocator import SpotAllocator, choose_spot
+from utils.spot_registry import SpotRegistry
+from utils.spot_store import SpotStore
+import argparse
+
+# State keys that drive the main loop's state machine
+MAIN_WATCHED_KEYS = ("stop", "parking_state", "target_spot")
+
+
+def main(
+    robobo: Robobo | None = None,
+    spot_choice: str | None = None,
+    clock: Clock | None = None,
+    record: bool = TELEMETRY_ENABLED,
+    params: StateManager | None = None,
+    scan_mode: str = SCAN_MODE,
+    map_path: str = MAP_FILE,
+    spot_cache: str | None = SPOT_CACHE_FILE,
+    lot: str = "default",
+    route_mode: str = ROUTE_MODE,
+    registry: SpotRegistry | None = None,
+    name: str = "robot",
+    standalone: bool = True,
+    allocation: str = SPOT_ALLOCATION,
+    cached_spots: list[Spot] | None = None,
+    skip_scan: bool | None = None,
+    runtime: BehaviourRuntime | None = None,
+) -> StateManager:
+    """
+    Run a full mission. ``robobo`` defaults to the real robot; pass a
+    SimRobobo (and the VirtualClock it runs on) to run headless.
+    ``spot_choice`` answers the spot prompt once (a rejected choice ends
+    the mission) for unattended runs. ``record`` writes the mission
+    telemetry. ``params`` lets the caller observe the mission state from
+    the start (it must use the same clock). ``scan_mode`` "map" scans
+    for the spots listed in ``map_path`` instead of scanning blind.
+    Spots of earlier missions in ``lot`` are reused from ``spot_cache``
+    (None disables the cache). ``route_mode`` "grid" drives an A* route
+    over the ``map_path`` walls to the chosen spot instead of searching
+    for its QR. ``registry`` shares the spots with the other robots of a
+    fleet, this one being ``name``. A ``standalone`` mission owns the
+    process-wide metrics (it resets them and prints them at the end);
+    fleet.py does that once for all its robots. ``allocation`` "auto"
+    picks the free spot with the least estimated travel instead of
+    prompting for one ("interactive"); robots of a fleet asking together
+    share one assignment. A replay passes the ``cached_spots`` and the
+    ``skip_scan`` decision of the recorded mission instead of a cache.
+    The behaviors run on ``runtime`` when it is given (the loop fleet.py
+    shares between its robots), otherwise on a runtime of their own.
+    """
+    clock = clock or RealClock()
+    clock.register()
 
-def main():
     # Create a Robobo object and connect to the robot
-    robobo = Robobo("192.168.1.48")
+    if robobo is None:
+        robobo = Robobo("192.168.1.48")
+    if standalone:
+        metrics.reset(clock)
+    if METRICS_ENABLED:
+        robobo = InstrumentedRobot(robobo)
+    if record:
+        telemetry.start_recording(clock)
+        robobo = telemetry.RecordingRobot(robobo)
+    # Outermost, so only the commands that reach the robot are recorded
+    robobo = CommandChannel(robobo, clock)
+    robobo.start()
     robobo.connect()
 
     # Dictionary to share parameters between behaviors
     # The "stop" flag will indicate when the task is complete
-    params = StateManager()
+    params = params or StateManager(clock)
+    if record:
+        telemetry.watch_state(params)
+    if registry is not None:
+        registry.join(name, params)
     planner = ParkingPlanner()
     executor = Executor(robobo, params)
 
-    # Create behavior instances
-    # Each behavior is a thread with specific logic
-    scan_spots_behaviour = ScanSpots(robobo, [], params)
-    find_qr = FindQR(robobo, [scan_spots_behaviour], params)
-    # Rotonda detection is now integrated into FindQR behavior
-    parking_behaviour = Parking(robobo, [scan_spots_behaviour, find_qr], params)
+    layout = None
+    if scan_mode == "map" or route_mode == "grid" or allocation == "auto":
+        layout = MapLayout.load(map_path)
 
-    threads = [find_qr, parking_behaviour, scan_spots_behaviour]
+    # Grid routes start from the wheel odometry, placed on the map spawner
+    odometry = grid = None
+    if route_mode == "grid":
+        odometry = Odometry.from_spawner(layout.spawners[0])
+        grid = load_grid(map_path)
+    allocator = SpotAllocator(layout, grid) if allocation == "auto" else None
 
-    # Start all behaviors (threads)
-    for thread in threads:
-        thread.start()
+    # Single sampling thread shared by every behavior
+    sensors = SensorHub(robobo, clock, odometry=odometry)
+    sensors.start()
+
+    # Create behavior instances
+    # Each behavior is a coroutine with specific logic
+    scan_prior = None
+    if scan_mode == "map":
+        scan_prior = expected_spots(layout)
+        telemetry.info(f"[Main] Map prior: {[spot.id for spot in scan_prior]}")
+    scan_spots_behaviour = ScanSpots(
+        robobo, [], params, expected_spots=scan_prior, sensors=sensors
+    )
+    # Rotonda detection is now integrated into FindQR behavior
+    find_qr = FindQR(robobo, [], params, sensors=sensors)
+    parking_behaviour = Parking(robobo, [], params, sensors=sensors)
+    navigate = Navigate(robobo, [], params, sensors=sensors)
+
+    # The arbiter owns the priority order (highest first) instead of the
+    # behaviors suppressing each other
+    arbiter = Arbiter(params, [parking_behaviour, find_qr, navigate, scan_spots_behaviour])
+
+    # The behaviors share one event loop thread (with the rest of the fleet)
+    own_runtime = runtime is None
+    if own_runtime:
+        runtime = BehaviourRuntime(clock)
+
+    # Spots of previous missions: recent ones are reused as they are, the
+    # others are found again by the scan so their occupancy is rechecked
+    store = SpotStore(spot_cache) if spot_cache else None
+    if store is not None:
+        fresh, stale = store.load_fresh(lot, clock.now())
+        telemetry.info(f"[Main] Spot cache: {len(fresh)} fresh, {len(stale)} stale")
+        cached_spots = fresh
+    for spot in cached_spots or []:
+        params.add_detected_spot(spot)
+    if store is not None:
+        store.follow(lot, params)
+    if skip_scan is None:
+        # Spots from the cache or from the rest of the fleet may cover the scan
+        skip_scan = params.spot_count() > 0 and not scan_spots_behaviour.needs_scan()
+    # What the mission starts from besides the robot, for the replay
+    telemetry.record("mission", cached_spots=cached_spots or [], skip_scan=skip_scan)
+    if skip_scan:
+        telemetry.info("[Main] Known spots cover the lot, skipping the scan")
+        params.set("scanning_complete", True)
+
+    # Start all behaviors
+    for behaviour in (parking_behaviour, find_qr, navigate, scan_spots_behaviour):
+        runtime.add(behaviour)
+    if own_runtime:
+        runtime.start()
+    else:
+        runtime.settle()
 
     current_plan = None
 
@@ -46,6 +186,8 @@ def main():
         params.set("parking_state", "scanning")
 
         while not params.get("stop", False):
+            # Take the version before reading so no change can be missed
+            version = params.version(MAIN_WATCHED_KEYS)
             parking_state = params.get("parking_state", "scanning")
 
             # if executor.should_replan(current_plan):
@@ -65,15 +207,15 @@ def main():
 
             if current_plan is None:
                 if parking_state == "scanning":
-                    current_plan = planner.create_scan_plan()
-                    print("[Main] Created scan plan.")
+                    current_plan = planner.create_scan_plan(scan=not skip_scan)
+                    telemetry.info("[Main] Created scan plan.")
                     params.set("parking_state", "scanning")
                     params.set("current_plan", current_plan)
                     params.set("current_step_index", 0)
 
             # Handle user input after scanning
             if parking_state == "waiting_for_input" or ():
-                print("[Main] Waiting for user to select parking spot...")
+                telemetry.info("[Main] Waiting for user to select parking spot...")
                 spots = params.get_detected_spots()
 
                 if current_plan and params.get("current_action") != "wait_user_input":
@@ -86,13 +228,26 @@ def main():
                         for i, step in enumerate(current_plan.steps):
                             if step.get("action") == "wait_user_input":
                                 current_plan.steps[i]["status"] = "in_progress"
-                    print(
-                        f"[Main] About to prompt user. parking_state={parking_state}, current_action={params.get('current_action')}, current_action_status={params.get('current_action_status')}"
+                    telemetry.debug(
+                        "[Main] About to prompt user. parking_state=%s,"
+                        " current_action=%s, current_action_status=%s",
+                        parking_state,
+                        params.get("current_action"),
+                        params.get("current_action_status"),
                     )
-                    user_choice = prompt_for_parking_spot(robobo, spots)
+                    if spot_choice is not None:
+                        # Scripted choices are tried once, then we quit
+                        user_choice, spot_choice = spot_choice, "q"
+                    elif allocator is not None:
+                        user_choice = allocate_spot(
+                            allocator, params, spots, odometry, registry, name
+                        )
+                    else:
+                        user_choice = prompt_for_parking_spot(robobo, spots)
+                    telemetry.record("spot_choice", choice=user_choice)
 
                     if user_choice and user_choice.lower() == "q":
-                        print("[Main] User opted to quit.")
+                        telemetry.info("[Main] User opted to quit.")
                         params.set("stop", True)
                         break
 
@@ -100,52 +255,64 @@ def main():
                         try:
                             spot_id = user_choice.strip()
 
-                            selected_spot = next(
-                                (
-                                    spot
-                                    for spot in spots
-                                    if spot.id == spot_id and not spot.occupied
-                                ),
-                                None,
-                            )
+                            selected_spot = params.get_spot(spot_id)
 
-                            if selected_spot:
+                            if (
+                                selected_spot
+                                and not selected_spot.occupied
+                                and (registry is None or registry.claim(name, spot_id))
+                            ):
                                 params.set("target_spot", spot_id)
                                 params.set("current_action_status", "completed")
                                 params.set("parking_state", "planning")
                                 params.set("current_action", None)
                                 params.set("current_action_params", None)
                                 params.set("parking_state", "planning")
-                                print(
+                                telemetry.info(
                                     f"[Main] User selected spot {spot_id} for parking."
                                 )
                             else:
                                 robobo.sayText(
                                     "Invalid selection or spot is occupied. Please try again."
                                 )
-                                time.sleep(2)
+                                clock.sleep(2)
                                 continue
                         except Exception as e:
-                            print(f"[Main] Error processing user input: {e}")
+                            telemetry.error(f"[Main] Error processing user input: {e}")
                             robobo.sayText(
                                 "Error processing your selection. Please try again."
                             )
-                            time.sleep(2)
+                            clock.sleep(2)
                             continue
 
             # Create parking plan after user input
             if params.get("target_spot") and parking_state == "planning":
                 target_spot_id = params.get("target_spot")
-                current_plan = planner.create_parking_plan(target_spot_id)
+                route = None
+                if grid is not None:
+                    route = plan_route_to_spot(
+                        grid,
+                        layout,
+                        odometry.pose(),
+                        target_spot_id,
+                        rotation_to_heading(layout.spawners[0].rotation),
+                    )
+                    if route is None:
+                        telemetry.warning(
+                            f"[Main] No route to spot {target_spot_id}, searching for it instead."
+                        )
+                current_plan = planner.create_parking_plan(target_spot_id, route)
                 params.set("current_plan", current_plan)
                 params.set("current_step_index", 0)
                 params.set("parking_state", "executing")
                 params.set("current_action", None)
                 params.set("current_action_params", None)
-                print(f"[Main] Created parking plan for spot {target_spot_id}.")
+                telemetry.info(
+                    f"[Main] Created parking plan for spot {target_spot_id}."
+                )
                 if current_plan is not None:
-                    print(
-                        "[Main] Parking plan steps: ",
+                    telemetry.debug(
+                        "[Main] Parking plan steps: %s",
                         [step["action"] for step in current_plan.steps],
                     )
 
@@ -164,10 +331,10 @@ def main():
                 )
                 if not success:
                     if params.get("replan_needed"):
-                        print("[Main] Plan execution failed, replanning...")
+                        telemetry.info("[Main] Plan execution failed, replanning...")
                         continue
                     else:
-                        print(
+                        telemetry.warning(
                             "[Main] Plan execution failed, but no replanning requested."
                         )
                         params.set("stop", True)
@@ -179,43 +346,179 @@ def main():
                 target_spot = params.get("target_spot")
                 if "wait_user_input" in plan_actions:
                     if not target_spot:
-                        print(
+                        telemetry.info(
                             "[Main] Scanning complete, returning to waiting for user input."
                         )
                         params.set("parking_state", "waiting_for_input")
                         params.set("current_action", "wait_user_input")
                     else:
-                        print(
+                        telemetry.info(
                             "[Main] Scanning complete and spot selected, parking now."
                         )
                         params.set("parking_state", "planning")
                 else:
                     if target_spot:
-                        print("[Main] Parking maneuver complete.")
+                        telemetry.info("[Main] Parking maneuver complete.")
+                        if store is not None:
+                            store.mark_occupied(lot, target_spot, clock.now())
+                        if registry is not None:
+                            registry.mark_parked(name, target_spot, clock.now())
                         params.set("parking_state", "done")
                         params.set("stop", True)
                 current_plan = None
-            time.sleep(0.5)
+
+            # Sleep until the state machine has something new to react to
+            params.wait_for_change(MAIN_WATCHED_KEYS, version, STATE_WAIT_TIMEOUT)
 
     except KeyboardInterrupt:
-        print("KeyboardInterrupt detected, stopping all behaviors...")
+        telemetry.info("KeyboardInterrupt detected, stopping all behaviors...")
         params.set("stop", True)
 
     finally:
-        print("Stopping all behaviors...")
+        telemetry.info("Stopping all behaviors...")
         params.set("stop", True)
+        if registry is not None:
+            registry.release(name)  # A spot we did not park in is free again
         robobo.movePanTo(0, 20, False)
         robobo.stopMotors()
-        # Wait for all threads to finish
+        # Leave the clock so virtual time keeps running while we wait
+        clock.unregister()
+        # Wait for the behaviors to finish
         # This ensures that all behaviors complete their cleanup before exiting
-        for thread in threads:
-            thread.join()
+        runtime.wait_stopped(params)
+        if own_runtime:
+            runtime.close()
+            runtime.join()
+        sensors.stop()
+        sensors.join()
 
     robobo.sayText("Mission complete")
-    time.sleep(2)  # Wait for the message to be spoken
+    clock.sleep(2)  # Wait for the message to be spoken
     # Disconnect the robot once the mission is complete
     robobo.disconnect()
+    if METRICS_ENABLED and standalone:
+        metrics.dump()
+        telemetry.record("metrics", stats=metrics.stats())
+    telemetry.stop_recording()
+    return params
+
+
+def allocate_spot(
+    allocator: SpotAllocator,
+    params: StateManager,
+    spots: list,
+    odometry: Odometry | None,
+    registry: SpotRegistry | None,
+    name: str,
+) -> str:
+    """Pick (and in a fleet, claim) the spot to park in; "q" when none is left."""
+    costs = allocator.costs(
+        spots,
+        lane_position=params.get("lane_position", 0.0),
+        pose=odometry.pose() if odometry is not None else None,
+        now=params.clock.now(),
+    )
+    if registry is not None:
+        spot_id = registry.allocate(name, costs)
+    else:
+        spot_id = choose_spot(costs)
+    if spot_id is None:
+        telemetry.warning("[Main] No reachable free spot to allocate.")
+        return "q"
+    telemetry.info(
+        f"[Main] Allocated spot {spot_id} (about {costs[spot_id]:.0f}s away)."
+    )
+    return spot_id
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Robobo autonomous parking")
+    parser.add_argument(
+        "--sim",
+        action="store_true",
+        help="run against the headless map.json simulator instead of a robot",
+    )
+    parser.add_argument("--map", default=MAP_FILE, help="map file for --sim")
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="run --sim in wall-clock time instead of virtual time",
+    )
+    parser.add_argument("--spot", help="park in this spot instead of prompting")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="ignore the spot cache and scan the whole lot",
+    )
+    parser.add_argument(
+        "--scan-mode",
+        choices=["blind", "map"],
+        default=SCAN_MODE,
+        help="'map' scans for the spots listed in --map instead of scanning blind",
+    )
+    parser.add_argument(
+        "--route-mode",
+        choices=["search", "grid"],
+        default=ROUTE_MODE,
+        help="'grid' drives an A* route over the --map walls to the chosen spot",
+    )
+    parser.add_argument(
+        "--allocation",
+        choices=["auto", "interactive"],
+        default=SPOT_ALLOCATION,
+        help="'auto' picks the free spot with the least travel over --map instead of asking",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="TELEMETRY",
+        help="replay a recorded mission and check the commands match",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="console verbosity (DEBUG prints every loop iteration)",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.log_level:
+        telemetry.set_log_level(args.log_level)
+    robot = None
+    clock = RealClock()
+    if args.replay:
+        from utils.replay_robot import ReplayRobobo
+
+        robot = ReplayRobobo(args.replay)
+        main(
+            robot,
+            args.spot or robot.spot_choice,
+            robot.clock,
+            record=False,
+            scan_mode=args.scan_mode,
+            map_path=args.map,
+            spot_cache=None,
+            route_mode=args.route_mode,
+            cached_spots=robot.cached_spots,
+            skip_scan=robot.skip_scan,
+        )
+        robot.verify()
+    else:
+        if args.sim:
+            from utils.sim_robot import SimRobobo
+
+            if not args.realtime:
+                clock = VirtualClock()
+            robot = SimRobobo(args.map, clock=clock)
+        main(
+            robot,
+            spot_choice=args.spot,
+            clock=clock,
+            scan_mode=args.scan_mode,
+            map_path=args.map,
+            spot_cache=None if args.no_cache else SPOT_CACHE_FILE,
+            lot=f"sim:{args.map}" if args.sim else "robot",
+            route_mode=args.route_mode,
+            allocation=args.allocation,
+        )
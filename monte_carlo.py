@@ -0,0 +1,339 @@
+"""
+Monte Carlo mission runner.
+Runs many headless missions across a process pool, each with its own seed,
+clock, simulator, StateManager and behaviors, and with noise in the QR
+distance readings, the wheel speeds and the start pose. Reports the
+success rate, the mission time distribution, why missions failed and
+which Plan steps failed on the way.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from functools import partial
+
+from benchmark import percentile
+from main import main
+from utils import telemetry
+from utils.clock import VirtualClock
+from utils.config import (
+    MAP_FILE,
+    MC_CHUNK_SIZE,
+    MC_MISSION_TIME_LIMIT,
+    MC_QR_DISTANCE_NOISE,
+    MC_RUNS,
+    MC_START_HEADING_NOISE,
+    MC_START_POSITION_NOISE,
+    MC_WHEEL_SLIP,
+    ROUTE_MODE,
+)
+from utils.sim_robot import SimNoise, SimRobobo
+from utils.state import StateManager
+
+HISTOGRAM_BINS = 10
+HISTOGRAM_WIDTH = 40  # Characters of the longest histogram bar
+
+
+def run_trial(
+    seed: int,
+    noise: SimNoise,
+    spots: list[str] | None = None,
+    map_path: str = MAP_FILE,
+    scan_mode: str = "blind",
+    route_mode: str = ROUTE_MODE,
+    time_limit: float = MC_MISSION_TIME_LIMIT,
+) -> dict:
+    """
+    Run one headless mission with the simulator noise drawn from ``seed``.
+    Without ``spots`` the robot allocates its own spot; otherwise it parks
+    in ``spots[seed % len(spots)]``. Missions still running after
+    ``time_limit`` simulated seconds are stopped and count as failed.
+    A failed mission has one ``cause``; ``failures`` lists every failed
+    step, including the ones a retry got past.
+    """
+    clock = VirtualClock()
+    robot = SimRobobo(map_path, clock=clock, noise=noise, seed=seed)
+    params = StateManager(clock)
+    plans = []  # Every plan the mission ran, in order
+
+    def on_plan(key, old, plan):
+        if plan is not None and all(plan is not p for p in plans):
+            plans.append(plan)
+
+    params.subscribe("current_plan", on_plan)
+
+    # A safety net: the executor gives up on a step after STEP_RETRIES
+    timed_out = []
+
+    def watchdog():
+        try:
+            if not params.wait_for("stop", bool, time_limit):
+                timed_out.append(clock.now())
+                params.set("stop", True)
+        finally:
+            clock.unregister(guard)
+
+    guard = threading.Thread(target=watchdog, name="MonteCarloWatchdog", daemon=True)
+    # main() runs on this thread; join the clock first so time waits for it
+    clock.register()
+    clock.register(guard)
+    guard.start()
+
+    cause = None  # (action, reason) that ended a failed mission
+    sim_start = clock.now()
+    wall_start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main(
+                robot,
+                spot_choice=spots[seed % len(spots)] if spots else None,
+                clock=clock,
+                record=False,
+                params=params,
+                scan_mode=scan_mode,
+                map_path=map_path,
+                spot_cache=None,
+                route_mode=route_mode,
+                allocation="auto",
+            )
+    except Exception as e:
+        cause = ("mission", f"{type(e).__name__}: {e}")
+    wall = time.perf_counter() - wall_start
+    guard.join()
+
+    success = params.get("parking_state") == "done"
+    failures = []  # (action, failure_reason) of each failed step
+    given_up = None  # The last step left failed, which ended its plan
+    for plan in plans:
+        for step in plan.steps:
+            # A retried step is back in progress but keeps its failure reason
+            if step.get("status") == "failed" or "failure_reason" in step:
+                failures.append((step["action"], step.get("failure_reason", "")))
+            if step.get("status") == "failed":
+                given_up = (step["action"], step.get("failure_reason", ""))
+    if success:
+        cause = None
+    elif cause is None:
+        if timed_out:
+            cause = ("mission", f"stopped after {time_limit:.0f}s")
+        elif given_up is not None:
+            cause = given_up
+        else:
+            # The mission ended between steps, e.g. when no spot was left
+            target = params.get("target_spot")
+            cause = (
+                "mission",
+                "no spot chosen" if target is None else "ended before parking",
+            )
+    return {
+        "seed": seed,
+        "spot": params.get("target_spot"),
+        "success": success,
+        "sim": clock.now() - sim_start,
+        "wall": wall,
+        "cause": cause,
+        "failures": failures,
+    }
+
+
+def run_study(
+    runs: int,
+    noise: SimNoise,
+    workers: int | None = None,
+    seed: int = 0,
+    chunk_size: int = MC_CHUNK_SIZE,
+    **trial_args,
+):
+    """Yield the result of ``runs`` trials (seeds ``seed`` on) as they complete."""
+    trial = partial(run_trial, noise=noise, **trial_args)
+    seeds = range(seed, seed + runs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        yield from pool.map(trial, seeds, chunksize=chunk_size)
+
+
+def _init_worker():
+    # Only warnings from the behaviors; the mission logs go nowhere anyway
+    telemetry.set_log_level("WARNING")
+
+
+def summarize(results: list[dict], wall: float) -> dict:
+    """
+    Success rate, mission time distribution, the cause of each failed
+    mission and the failed steps (retried or not) by reason.
+    """
+    parked = [r["sim"] for r in results if r["success"]]
+    causes, failures = {}, {}
+    for result in results:
+        if result["cause"] is not None:
+            action, reason = result["cause"]
+            causes.setdefault(action, Counter())[reason or "unknown"] += 1
+        for action, reason in result["failures"]:
+            failures.setdefault(action, Counter())[reason or "unknown"] += 1
+    return {
+        "runs": len(results),
+        "success_rate": len(parked) / len(results) if results else 0.0,
+        "sim_p5": percentile(parked, 5),
+        "sim_p50": percentile(parked, 50),
+        "sim_p95": percentile(parked, 95),
+        "sim_max": max(parked, default=0.0),
+        "histogram": histogram(parked),
+        "causes": {
+            action: dict(reasons.most_common()) for action, reasons in causes.items()
+        },
+        "failures": {
+            action: dict(reasons.most_common()) for action, reasons in failures.items()
+        },
+        "spots": dict(Counter(r["spot"] or "none" for r in results).most_common()),
+        "wall": wall,
+        "missions_per_second": len(results) / wall if wall > 0 else 0.0,
+    }
+
+
+def histogram(values: list[float], bins: int = HISTOGRAM_BINS) -> list[tuple]:
+    """(low, high, count) for ``bins`` equal-width bins over ``values``."""
+    if not values:
+        return []
+    low, high = min(values), max(values)
+    width = (high - low) / bins or 1.0
+    counts = [0] * bins
+    for value in values:
+        counts[min(int((value - low) / width), bins - 1)] += 1
+    return [(low + i * width, low + (i + 1) * width, n) for i, n in enumerate(counts)]
+
+
+def print_summary(summary: dict, noise: SimNoise):
+    print("\n" + "=" * 72)
+    print(f"  MONTE CARLO ({summary['runs']} missions)")
+    print("=" * 72)
+    print(
+        f"Noise: QR distance {noise.qr_distance:.0%}, wheel slip {noise.wheel_slip:.0%},"
+        f" start {noise.start_position:.1f}cm / {noise.start_heading:.1f}deg"
+    )
+    print(f"Success rate: {summary['success_rate']:.1%}")
+    print(
+        f"Mission time (parked) p5/p50/p95/max: {summary['sim_p5']:.1f}"
+        f" / {summary['sim_p50']:.1f} / {summary['sim_p95']:.1f}"
+        f" / {summary['sim_max']:.1f} s"
+    )
+    peak = max((n for _, _, n in summary["histogram"]), default=0)
+    for low, high, n in summary["histogram"]:
+        bar = "#" * round(n / peak * HISTOGRAM_WIDTH) if peak else ""
+        print(f"  {low:>6.1f} - {high:>6.1f}s {n:>6} {bar}")
+    print_counts("Failed mission", summary["causes"])
+    print_counts("Failed step", summary["failures"])
+    print("-" * 72)
+    print("Spots: " + ", ".join(f"{s}: {n}" for s, n in summary["spots"].items()))
+    print(
+        f"Wall {summary['wall']:.1f}s, {summary['missions_per_second']:.1f} missions/s"
+    )
+    print("=" * 72 + "\n")
+
+
+def print_counts(title: str, counts: dict):
+    print("-" * 72)
+    print(f"{title:<20} {'Reason':<40} {'n':>8}")
+    for action, reasons in counts.items():
+        for reason, n in reasons.items():
+            print(f"{action:<20} {reason[:40]:<40} {n:>8}")
+    if not counts:
+        print("  (none)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Monte Carlo mission runner")
+    parser.add_argument("--runs", type=int, default=MC_RUNS, help="missions to run")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="worker processes (default: all cores)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first mission")
+    parser.add_argument(
+        "--spots",
+        default=None,
+        help="comma-separated spots to cycle through (default: allocate)",
+    )
+    parser.add_argument("--map", default=MAP_FILE, help="map file")
+    parser.add_argument(
+        "--scan-mode", choices=["blind", "map"], default="blind", help="scan mode"
+    )
+    parser.add_argument(
+        "--route-mode", choices=["search", "grid"], default=ROUTE_MODE, help="route mode"
+    )
+    parser.add_argument(
+        "--qr-noise",
+        type=float,
+        default=MC_QR_DISTANCE_NOISE,
+        help="relative std of the QR distance",
+    )
+    parser.add_argument(
+        "--wheel-slip", type=float, default=MC_WHEEL_SLIP, help="std of the wheel slip"
+    )
+    parser.add_argument(
+        "--start-position",
+        type=float,
+        default=MC_START_POSITION_NOISE,
+        help="std of the start position (cm)",
+    )
+    parser.add_argument(
+        "--start-heading",
+        type=float,
+        default=MC_START_HEADING_NOISE,
+        help="std of the start heading (deg)",
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=MC_MISSION_TIME_LIMIT,
+        help="simulated seconds before a mission is stopped",
+    )
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    noise = SimNoise(
+        qr_distance=args.qr_noise,
+        wheel_slip=args.wheel_slip,
+        start_position=args.start_position,
+        start_heading=args.start_heading,
+    )
+    spots = [s.strip() for s in args.spots.split(",")] if args.spots else None
+    workers = args.workers or os.cpu_count()
+    print(f"[MonteCarlo] {args.runs} missions on {workers} workers")
+
+    results = []
+    wall_start = time.perf_counter()
+    for result in run_study(
+        args.runs,
+        noise,
+        workers=workers,
+        seed=args.seed,
+        spots=spots,
+        map_path=args.map,
+        scan_mode=args.scan_mode,
+        route_mode=args.route_mode,
+        time_limit=args.time_limit,
+    ):
+        results.append(result)
+        if not result["success"]:
+            action, reason = result["cause"]
+            print(f"[MonteCarlo] seed {result['seed']} failed: {action} ({reason})")
+        if len(results) % 100 == 0:
+            print(f"[MonteCarlo] {len(results)}/{args.runs} missions done")
+
+    summary = summarize(results, time.perf_counter() - wall_start)
+    print_summary(summary, noise)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(
+                {"noise": asdict(noise), "summary": summary, "runs": results}, f, indent=2
+            )
+        print(f"[MonteCarlo] Results saved to {args.output}")
@@ -2,13 +2,29 @@
 Test script for tuning parking maneuvers.
 Allows direct testing of reverse_entry, straighten, and final_adjustment
 without running the full behavior system.
+
+    python parking_tester.py                  # interactive trials on the robot
+    python parking_tester.py sweep --spot 8   # screen entry parameters offline
 """
 
 from robobopy.Robobo import Robobo
 from utils.state import StateManager, Spot
-from utils.config import DEFAULT_SIDE, REVERSE_DURATION, SPEED_SLOW, SPEED_FAST
+from utils.config import (
+    DEFAULT_SIDE,
+    MAP_FILE,
+    REVERSE_DURATION,
+    SPEED_SLOW,
+    SPEED_FAST,
+    SWEEP_SIM_TOLERANCE_CM,
+    TURNING_TIME,
+    WHEEL_BASE_CM,
+    WHEEL_CM_PER_SPEED,
+)
+import argparse
 import time
 
+import numpy as np
+
 
 class ParkingTester:
     def __init__(self, robot: Robobo, side: str = "right"):
@@ -131,6 +147,101 @@ class ParkingTester:
         print("=" * 60 + "\n")
 
 
+def sweep(
+    spot_id: str = "8",
+    maneuver: str = "reverse",
+    map_path: str = MAP_FILE,
+    top: int = 10,
+    fast=range(4, 31, 2),
+    slow=range(0, 15),
+    duration=np.arange(0.5, 5.01, 0.25),
+    straight=np.arange(0.0, 2.01, 0.2),
+):
+    """
+    Evaluate every combination of entry parameters in the simulator's
+    kinematics and print the best ones for ``spot_id``.
+    """
+    from utils.grid_cache import load_grid
+    from utils.map_layout import MapLayout, rotation_to_heading
+    from utils.maneuver_sim import (
+        Candidates,
+        evaluate,
+        rank,
+        side_of,
+        sim_gap,
+        spot_poses,
+        turning_time,
+    )
+
+    layout = MapLayout.load(map_path)
+    marker = layout.find_qr(spot_id)
+    if marker is None:
+        print(f"[Sweep] Spot {spot_id} has no QR on {map_path}")
+        return
+    grid = load_grid(map_path)
+    lane_heading = rotation_to_heading(layout.spawners[0].rotation)
+    start, target = spot_poses(marker, lane_heading, maneuver)
+    side = side_of(start, marker)
+
+    started = time.perf_counter()
+    candidates = Candidates.grid(fast, slow, duration, straight)
+    results = evaluate(candidates, grid, start, target, side, maneuver)
+    order = rank(results)
+    elapsed = time.perf_counter() - started
+    current = evaluate(Candidates.current(), grid, start, target, side, maneuver)
+
+    print("\n" + "=" * 78)
+    print(
+        f"SWEEP spot {spot_id} ({side}, {maneuver} entry):"
+        f" {len(candidates)} candidates in {elapsed * 1000:.0f} ms"
+    )
+    print(
+        f"Kinematics of SimRobobo (WHEEL_CM_PER_SPEED {WHEEL_CM_PER_SPEED},"
+        f" WHEEL_BASE_CM {WHEEL_BASE_CM}), not measured on the robot"
+    )
+    # The ranking only means something if the model ends where the simulator does
+    gap = max(
+        sim_gap(Candidates.current(), 0, start, side, maneuver, map_path),
+        sim_gap(candidates, order[0], start, side, maneuver, map_path),
+    )
+    print(f"Model vs SimRobobo run: {gap:.1f} cm apart")
+    print("=" * 78)
+    if gap > SWEEP_SIM_TOLERANCE_CM:
+        print(
+            f"[Sweep] The model is more than {SWEEP_SIM_TOLERANCE_CM} cm off the"
+            " simulator; not ranking"
+        )
+        return
+    print(
+        f"{'#':>3} {'fast':>5} {'slow':>5} {'phase s':>8} {'straight s':>10}"
+        f" {'pos err':>8} {'head err':>9} {'clear':>6} {'score':>6}"
+    )
+
+    def row(label, values, results, i):
+        flag = "  collides" if results["collides"][i] else ""
+        print(
+            f"{label:>3} {values.fast[i]:>5.0f} {values.slow[i]:>5.0f}"
+            f" {values.duration[i]:>8.2f} {values.straight[i]:>10.2f}"
+            f" {results['position_error'][i]:>6.1f}cm"
+            f" {results['heading_error'][i]:>7.1f}deg"
+            f" {results['clearance'][i]:>6.1f} {results['score'][i]:>6.1f}{flag}"
+        )
+
+    for rank_index, i in enumerate(order[:top], start=1):
+        row(str(rank_index), candidates, results, i)
+    print("-" * 78)
+    row("now", Candidates.current(), current, 0)
+    print("=" * 78)
+    print(
+        "The configured values were tuned on the robot; in these kinematics"
+        f" they end {current['position_error'][0]:.1f} cm from the stall."
+    )
+    print(
+        f"TURNING_TIME for a 180 degree turn at speed {SPEED_SLOW}:"
+        f" {turning_time(SPEED_SLOW):.2f}s (configured {TURNING_TIME}s)\n"
+    )
+
+
 def interactive_menu(tester: ParkingTester):
     """Interactive menu for testing different maneuvers."""
     while True:
@@ -205,6 +316,11 @@ def interactive_menu(tester: ParkingTester):
 
 
 def main():
+    args = parse_args()
+    if args.command == "sweep":
+        sweep(args.spot, args.maneuver, args.map, args.top)
+        return
+
     print("=" * 60)
     print("PARKING MANEUVER TEST SCRIPT")
     print("Target Spot: 8 (right side)")
@@ -234,5 +350,23 @@ def main():
         print("Disconnected from robot")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parking maneuver tuning")
+    commands = parser.add_subparsers(dest="command")
+    sweep_parser = commands.add_parser(
+        "sweep", help="rank entry parameters offline against the map geometry"
+    )
+    sweep_parser.add_argument("--spot", default="8", help="target spot")
+    sweep_parser.add_argument(
+        "--maneuver",
+        choices=["reverse", "forward"],
+        default="reverse",
+        help="'forward' is the entry used after the rotonda turn",
+    )
+    sweep_parser.add_argument("--map", default=MAP_FILE, help="map file")
+    sweep_parser.add_argument("--top", type=int, default=10, help="rows to print")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,92 @@
+import pytest
+
+from behaviors.behaviors import AsyncBehaviour, BehaviourRuntime
+from utils.clock import RealClock, VirtualClock
+from utils.state import StateManager
+
+
+class TimedRobot:
+    """moveWheelsByTime blocks for its duration in clock time."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.calls = []
+
+    def moveWheelsByTime(self, rSpeed, lSpeed, duration, wait=True):
+        self.calls.append(("moveWheelsByTime", (rSpeed, lSpeed, duration)))
+        self.clock.sleep(duration)
+
+
+class Mover(AsyncBehaviour):
+    """Drives once, waits, then ends the mission."""
+
+    watched_keys = ("done",)
+    sensor_channels = ()
+
+    def take_control(self) -> bool:
+        return not self.params.get("done", False)
+
+    async def action(self):
+        self.params.set("status", "executing")
+        await self.io(self.robot.moveWheelsByTime, 5, 5, 0.05, True)
+        await self.sleep(0.02)
+        self.params.set("done", True)
+        self.params.set("stop", True)
+
+
+@pytest.mark.parametrize("clock_type", [VirtualClock, RealClock])
+def test_blocking_calls_run_off_the_loop(clock_type):
+    clock = VirtualClock(start=0.0) if clock_type is VirtualClock else RealClock()
+    params = StateManager(clock)
+    robot = TimedRobot(clock)
+    runtime = BehaviourRuntime(clock)
+    runtime.add(Mover(robot, [], params))
+    started = clock.now()
+    runtime.start()
+    # start() returns with the action already running, as Thread.start does
+    assert params.get("status") == "executing"
+    runtime.close()
+    runtime.join(timeout=5.0)
+    assert not runtime.is_alive()
+    assert robot.calls == [("moveWheelsByTime", (5, 5, 0.05))]
+    assert params.get("done")
+    elapsed = clock.now() - started
+    if clock_type is VirtualClock:
+        assert elapsed == pytest.approx(0.07)
+    else:
+        assert elapsed >= 0.07
+
+
+class Parker(Mover):
+    """Drives for ``duration`` and records when it is done."""
+
+    def __init__(self, robot, params, duration):
+        super().__init__(robot, [], params)
+        self.duration = duration
+
+    async def action(self):
+        await self.io(self.robot.moveWheelsByTime, 5, 5, self.duration, True)
+        self.params.set("finished_at", self.clock.now())
+        self.params.set("done", True)
+        self.params.set("stop", True)
+
+
+def test_robots_share_the_loop_but_not_their_io():
+    clock = VirtualClock(start=0.0)
+    first, second = StateManager(clock), StateManager(clock)
+    runtime = BehaviourRuntime(clock)
+    runtime.add(Parker(TimedRobot(clock), first, 2.0))
+    # Stay registered so time waits until the second robot is added
+    clock.register()
+    runtime.start()
+    runtime.add(Parker(TimedRobot(clock), second, 0.5))
+    runtime.settle()
+    clock.unregister()
+    runtime.wait_stopped(second)
+    runtime.wait_stopped(first)
+    runtime.close()
+    runtime.join(timeout=5.0)
+    assert not runtime.is_alive()
+    # The first robot's two-second move does not hold up the second one
+    assert second.get("finished_at") == pytest.approx(0.5)
+    assert first.get("finished_at") == pytest.approx(2.0)
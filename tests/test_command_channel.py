@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from utils.clock import RealClock, VirtualClock
+from utils.command_channel import CommandChannel
+
+
+class FlakyRobot:
+    """Records every call; the calls numbered in ``failures`` raise."""
+
+    def __init__(self, failures=()):
+        self.failures = set(failures)
+        self.calls = []
+
+    def moveWheels(self, rSpeed, lSpeed):
+        self._call("moveWheels", rSpeed, lSpeed)
+
+    def startQrTracking(self):
+        self._call("startQrTracking")
+
+    def movePanTo(self, degrees, speed, wait=True):
+        self._call("movePanTo", degrees, speed, wait)
+        if wait:
+            time.sleep(0.05)  # The pan turning
+
+    def _call(self, method, *args):
+        self.calls.append((method, args))
+        if len(self.calls) in self.failures:
+            raise ConnectionError("robot unreachable")
+
+
+def test_sender_survives_a_failed_command_and_resends_it():
+    clock = VirtualClock(start=0.0)
+    robot = FlakyRobot(failures={1})
+    channel = CommandChannel(robot, clock)
+    channel.start()
+    try:
+        channel.moveWheels(7, 7)
+        clock.sleep(1.0)  # The sender tries it and the robot fails
+        # The wheels' state is unknown, so the retry is not a repeat
+        channel.moveWheels(7, 7)
+        clock.sleep(1.0)
+        channel.moveWheels(7, 7)  # This one is a repeat
+        clock.sleep(1.0)
+    finally:
+        channel.close()
+    assert robot.calls == [("moveWheels", (7, 7)), ("moveWheels", (7, 7))]
+    assert not channel._queue
+
+
+class SlowRobot(FlakyRobot):
+    """stopMotors takes a second of clock time to return."""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def stopMotors(self):
+        self._call("stopMotors")
+        self.clock.sleep(1.0)
+
+
+def test_repeat_queued_while_the_command_is_in_flight_is_dropped():
+    clock = VirtualClock(start=0.0)
+    robot = SlowRobot(clock)
+    channel = CommandChannel(robot, clock)
+    channel.start()
+    try:
+        channel.stopMotors()
+        clock.sleep(0.5)  # The first stopMotors is still at the robot
+        channel.stopMotors()
+        clock.sleep(2.0)
+    finally:
+        channel.close()
+    assert robot.calls == [("stopMotors", ())]
+
+
+def test_failed_direct_command_raises_and_is_not_recorded():
+    clock = VirtualClock(start=0.0)
+    robot = FlakyRobot(failures={1})
+    channel = CommandChannel(robot, clock)
+    channel.start()
+    try:
+        with pytest.raises(ConnectionError):
+            channel.startQrTracking()
+        channel.startQrTracking()
+        channel.startQrTracking()  # Tracking is on now: dropped
+    finally:
+        channel.close()
+    assert robot.calls == [("startQrTracking", ())] * 2
+
+
+def test_direct_command_behind_a_submitted_one_on_a_real_clock():
+    # The real clock's condition is not reentrant: the direct command must
+    # not wait for the submitted one while holding it
+    robot = FlakyRobot()
+    channel = CommandChannel(robot, RealClock())
+    channel.start()
+    try:
+        future = channel.submit("movePanTo", 90, 50, True)
+        direct = threading.Thread(target=channel.movePanTo, args=(0, 50, False))
+        direct.start()
+        direct.join(timeout=5.0)
+        assert not direct.is_alive()
+        future.result(timeout=5.0)
+    finally:
+        channel.close()
+    assert robot.calls == [("movePanTo", (90, 50, True)), ("movePanTo", (0, 50, False))]
@@ -0,0 +1,42 @@
+import random
+from itertools import permutations
+
+from utils.spot_allocator import UNREACHABLE, _hungarian, assign
+
+
+def brute_force(matrix):
+    # Cheapest total over every way of giving each row its own column
+    cols = len(matrix[0])
+    return min(
+        sum(row[j] for row, j in zip(matrix, columns))
+        for columns in permutations(range(cols), len(matrix))
+    )
+
+
+def test_hungarian_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(200):
+        rows = rng.randint(1, 4)
+        cols = rng.randint(rows, 6)
+        # Repeated costs give ties, which the solver must handle too
+        matrix = [
+            [rng.choice([rng.uniform(0, 100), 5.0]) for _ in range(cols)]
+            for _ in range(rows)
+        ]
+        assignment = _hungarian(matrix)
+        assert len(set(assignment)) == rows
+        total = sum(matrix[i][j] for i, j in enumerate(assignment))
+        assert abs(total - brute_force(matrix)) < 1e-9
+
+
+def test_assign_gives_different_spots_and_skips_unreachable():
+    requests = {
+        "a": {"1": 10.0, "2": 12.0},
+        "b": {"1": 11.0, "2": 30.0},
+        "c": {"1": 5.0, "2": UNREACHABLE},
+    }
+    # Two spots for three robots: 12 + 5 beats 12 + 11 and 10 + 30, and
+    # "c" cannot take spot 2
+    assert assign(requests) == {"a": "2", "b": None, "c": "1"}
+    assert assign({"a": {"1": UNREACHABLE}}) == {"a": None}
+    assert assign({}) == {}
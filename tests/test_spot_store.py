@@ -0,0 +1,84 @@
+from behaviors.scan_spots import OccupancyCheck, ScanSpots
+from utils.clock import VirtualClock
+from utils.spot_registry import SpotRegistry
+from utils.spot_store import SpotStore
+from utils.state import Spot, StateManager
+
+LOT = "test"
+
+
+def observe(params: StateManager, spot: Spot):
+    # What ScanSpots does once a stall has been checked
+    params.add_detected_spot(spot)
+    params.set("observed_spot", spot)
+
+
+def spot(spot_id: str, side: str, timestamp: float, occupied: bool = False) -> Spot:
+    return Spot(
+        id=spot_id, position=(0.0, 0.0), timestamp=timestamp, occupied=occupied, side=side
+    )
+
+
+def test_spots_round_trip_in_the_scan_frame(tmp_path):
+    store = SpotStore(str(tmp_path / "spots.sqlite"))
+    params = StateManager(VirtualClock(start=0.0))
+    store.follow(LOT, params)
+
+    observe(params, spot("1", "left", 10.0))
+    # FindQR at the rotonda: the sides of the known spots flip
+    params.set("rotonda_detected", True)
+    params.invert_sides()
+    assert params.get_spot("1").side == "right"
+    # Seen after the turn, in the turned frame
+    observe(params, spot("2", "right", 20.0))
+
+    saved = {s.id: s for s in store.load(LOT)}
+    assert {s.id: s.side for s in saved.values()} == {"1": "left", "2": "left"}
+    assert saved["1"].timestamp == 10.0
+
+    # The next mission starts in the scan frame again
+    restored = StateManager(VirtualClock(start=30.0))
+    fresh, stale = store.load_fresh(LOT, 30.0)
+    assert not stale
+    for cached in fresh:
+        restored.add_detected_spot(cached)
+    assert [(s.id, s.side, s.occupied) for s in restored.get_detected_spots()] == [
+        ("1", "left", False),
+        ("2", "left", False),
+    ]
+
+
+def test_registry_views_are_not_saved(tmp_path):
+    clock = VirtualClock(start=0.0)
+    store = SpotStore(str(tmp_path / "spots.sqlite"))
+    registry = SpotRegistry(clock)
+    first, second = StateManager(clock), StateManager(clock)
+    registry.join("first", first)
+    registry.join("second", second)
+    store.follow(LOT, first)
+
+    observe(first, spot("1", "left", 10.0))
+    # The other robot claims the spot: the first one sees it as occupied
+    assert registry.claim("second", "1")
+    assert first.get_spot("1").occupied
+    # A spot found by the other robot shows up in the first one's state
+    observe(second, spot("7", "right", 12.0))
+    assert first.has_spot("7")
+
+    assert [(s.id, s.occupied) for s in store.load(LOT)] == [("1", False)]
+
+
+def test_unchecked_stalls_are_not_cached(tmp_path):
+    store = SpotStore(str(tmp_path / "spots.sqlite"))
+    params = StateManager(VirtualClock(start=50.0))
+    store.follow(LOT, params)
+    scan = ScanSpots(None, [], params)
+
+    scan._resolve(OccupancyCheck("1", (0.0, 0.0), "left", 90))
+    scan._resolve(OccupancyCheck("2", (0.0, 0.0), "left", 90, unknown=True))
+
+    # Not offered in this mission, but no reading to trust in the next one
+    assert params.get_spot("2").occupied
+    assert [(s.id, s.occupied, s.timestamp) for s in store.load(LOT)] == [
+        ("1", False, 50.0)
+    ]
@@ -0,0 +1,184 @@
+#
+# Clock services used for every timing decision (now, sleep and blocking
+# waits), so behaviors and the executor can run in real time against the
+# robot or in discrete virtual time against the simulator.
+#
+
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+
+class Clock:
+    """
+    Interface shared by the clock implementations.
+
+    Threads that take part in a mission call ``register()`` when they start
+    and ``unregister()`` when they finish. Real clocks ignore this; the
+    virtual clock uses it to know when every participant is blocked.
+    """
+
+    def now(self) -> float:
+        """Current time in seconds."""
+        raise NotImplementedError
+
+    def sleep(self, seconds: float):
+        """Block the calling thread for ``seconds`` of clock time."""
+        raise NotImplementedError
+
+    def condition(self):
+        """Return a Condition whose timed waits follow this clock."""
+        raise NotImplementedError
+
+    def register(self, thread: Optional[threading.Thread] = None):
+        """
+        Declare ``thread`` (default: the calling thread) as a participant of
+        the mission. Registering a Thread before start() avoids a window in
+        which the clock could move before the new thread runs.
+        """
+
+    def unregister(self, thread: Optional[threading.Thread] = None):
+        """Remove ``thread`` (default: the calling thread) from the participants."""
+
+
+class RealClock(Clock):
+    """Wall-clock time, for the real robot and RoboboSIM."""
+
+    def now(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def condition(self):
+        return threading.Condition(threading.Lock())
+
+
+class _Waiter:
+    def __init__(self, condition: threading.Condition, deadline: float):
+        self.condition = condition
+        self.deadline = deadline
+        self.woken = False  # Set by a notify or when the deadline is reached
+        self.notified = False  # True if woken by a notify rather than a timeout
+
+
+class VirtualCondition:
+    """Condition variable whose timeouts are measured on a VirtualClock."""
+
+    def __init__(self, clock: "VirtualClock"):
+        self._clock = clock
+        self._condition = threading.Condition(clock._lock)
+
+    def __enter__(self):
+        return self._condition.__enter__()
+
+    def __exit__(self, *args):
+        return self._condition.__exit__(*args)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._clock._wait(self._condition, timeout)
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: Optional[float] = None):
+        # Same contract as threading.Condition.wait_for, in virtual time
+        end_time = None if timeout is None else self._clock.now() + timeout
+        result = predicate()
+        while not result:
+            wait_time = None
+            if end_time is not None:
+                wait_time = end_time - self._clock.now()
+                if wait_time <= 0:
+                    break
+            self.wait(wait_time)
+            result = predicate()
+        return result
+
+    def notify(self, n: int = 1):
+        self.notify_all()
+
+    def notify_all(self):
+        self._clock._notify(self._condition)
+
+
+class VirtualClock(Clock):
+    """
+    Discrete virtual time. The clock only moves forward when every
+    registered thread is blocked in ``sleep`` or in a wait on one of the
+    clock's conditions; it then jumps to the earliest deadline. A mission
+    therefore runs as fast as the CPU allows, in a reproducible order.
+
+    Registered threads must block only through the clock (sleep, clock
+    conditions, or a StateManager built on this clock), otherwise time stops.
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        self._now = time.time() if start is None else start
+        self._lock = threading.RLock()
+        self._sleeping = threading.Condition(self._lock)
+        self._registered: set[threading.Thread] = set()
+        self._waiters: dict[threading.Thread, _Waiter] = {}
+
+    def now(self) -> float:
+        with self._lock:
+            return self._now
+
+    def sleep(self, seconds: float):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._wait(self._sleeping, seconds)
+
+    def condition(self) -> VirtualCondition:
+        return VirtualCondition(self)
+
+    def register(self, thread: Optional[threading.Thread] = None):
+        with self._lock:
+            self._registered.add(thread or threading.current_thread())
+
+    def unregister(self, thread: Optional[threading.Thread] = None):
+        with self._lock:
+            self._registered.discard(thread or threading.current_thread())
+            self._advance()
+
+    def _wait(self, condition: threading.Condition, timeout: Optional[float]) -> bool:
+        # Must be called with the lock held
+        if timeout is not None and timeout <= 0:
+            return False
+        deadline = math.inf if timeout is None else self._now + timeout
+        waiter = _Waiter(condition, deadline)
+        thread = threading.current_thread()
+        self._waiters[thread] = waiter
+        try:
+            self._advance()
+            while not waiter.woken:
+                condition.wait()
+        finally:
+            del self._waiters[thread]
+        return waiter.notified
+
+    def _notify(self, condition: threading.Condition):
+        # Must be called with the lock held. Waiters count as running from
+        # here on, so time cannot move before they get to react.
+        for waiter in self._waiters.values():
+            if waiter.condition is condition and not waiter.woken:
+                waiter.woken = waiter.notified = True
+        condition.notify_all()
+
+    def _advance(self):
+        # Must be called with the lock held
+        blocked = {
+            thread: waiter
+            for thread, waiter in self._waiters.items()
+            if not waiter.woken
+        }
+        if not blocked or not self._registered.issubset(blocked):
+            return  # Someone is still running
+        next_deadline = min(waiter.deadline for waiter in blocked.values())
+        if next_deadline == math.inf:
+            return  # Everyone waits for an event that will never come
+        self._now = max(self._now, next_deadline)
+        for waiter in blocked.values():
+            if waiter.deadline <= self._now:
+                waiter.woken = True
+                waiter.condition.notify_all()
@@ -0,0 +1,401 @@
+#
+# Command layer between the behaviors and the robot.
+# Every actuator command used to be a round trip to the phone, even when it
+# repeated the last one (moveWheels at the speeds the wheels already have,
+# movePanTo to where the pan already goes). CommandChannel keeps the last
+# commanded state of the wheels, pan, tilt and camera detectors, drops the
+# commands that would not change it, lets a newer non-blocking command
+# replace a queued one for the same actuator, and sends at most
+# COMMAND_RATE_LIMIT commands per second.
+# Blocking commands can also be submitted without waiting: submit() returns
+# a CommandFuture, and commands for different actuators (wheels, pan, tilt,
+# speech) then run at the same time.
+#
+
+import math
+import threading
+from collections import deque
+from threading import Thread
+
+from utils import telemetry
+from utils.clock import Clock
+from utils.config import COMMAND_RATE_LIMIT
+from utils.metrics import metrics
+
+# Non-blocking commands that set an actuator, by the actuator they set
+_ACTUATORS = {
+    "moveWheels": "wheels",
+    "stopMotors": "wheels",
+    "movePanTo": "pan",
+    "moveTiltTo": "tilt",
+}
+# Detector switches: (state, value)
+_TOGGLES = {
+    "startQrTracking": ("qr_tracking", True),
+    "stopQrTracking": ("qr_tracking", False),
+    "startObjectRecognition": ("object_recognition", True),
+    "stopObjectRecognition": ("object_recognition", False),
+}
+# Commands after which the wheels' commanded state is unknown
+_WHEEL_RESETS = ("moveWheelsByTime", "moveWheelsByDegrees")
+# Commands that occupy an actuator, by the actuator (the lane they run on).
+# Commands on one lane run one at a time, in order; other commands share
+# the "control" lane.
+_LANES = {
+    **_ACTUATORS,
+    "moveWheelsByTime": "wheels",
+    "moveWheelsByDegrees": "wheels",
+    "movePanByDegrees": "pan",
+    "moveTiltByDegrees": "tilt",
+    "sayText": "speech",
+}
+LANES = ("wheels", "pan", "tilt", "speech", "control")
+
+
+def _target(method: str, args: tuple, kwargs: dict):
+    """State an actuator command leaves the actuator in."""
+    if method == "stopMotors":
+        return (0, 0)
+    if method == "moveWheels":
+        return (
+            args[0] if len(args) > 0 else kwargs["rSpeed"],
+            args[1] if len(args) > 1 else kwargs["lSpeed"],
+        )
+    return args[0] if args else kwargs["degrees"]  # Pan/tilt target
+
+
+def _waits(method: str, args: tuple, kwargs: dict) -> bool:
+    """True for a pan/tilt move that blocks until the target is reached."""
+    if method not in ("movePanTo", "moveTiltTo"):
+        return False
+    return bool(args[2] if len(args) > 2 else kwargs.get("wait", True))
+
+
+class CommandFuture:
+    """
+    Result of a submitted command. Waits follow the clock, so a behavior
+    can block on it in virtual time.
+    """
+
+    def __init__(self, clock: Clock, method: str):
+        self.method = method
+        self._cond = clock.condition()
+        self._done = False
+        self._result = None
+        self._error: BaseException | None = None
+
+    def done(self) -> bool:
+        with self._cond:
+            return self._done
+
+    def result(self, timeout: float | None = None):
+        """Wait for the command to return and return its result (or raise its error)."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._done, timeout):
+                raise TimeoutError(f"{self.method} still running after {timeout}s")
+            if self._error is not None:
+                raise self._error
+            return self._result
+
+    def _set(self, result=None, error: BaseException | None = None):
+        with self._cond:
+            self._result = result
+            self._error = error
+            self._done = True
+            self._cond.notify_all()
+
+
+def wait_all(*futures: CommandFuture) -> list:
+    """
+    Wait for every future and return their results in order. The first
+    error is raised once all of them are done, so no actuator is left
+    moving unnoticed.
+    """
+    results, error = [], None
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(None)
+            error = error or e
+    if error is not None:
+        raise error
+    return results
+
+
+class CommandChannel:
+    """
+    Robot proxy that coalesces and rate-limits commands. Reads go straight
+    to the robot. Non-blocking actuator commands are queued and sent by a
+    sender thread, one per 1 / ``rate`` seconds; any other command (blocking
+    moves, speech, ...) is sent by the caller once the queue ahead of it
+    has been sent, so the order of the commands is kept.
+
+    ``submit()`` hands any command to the worker thread of its lane and
+    returns at once: a blocking pan move and a wheel move submitted
+    together take the time of the longer one. Commands on the same lane,
+    submitted or called directly, keep their order.
+    """
+
+    def __init__(self, robot, clock: Clock, rate: float = COMMAND_RATE_LIMIT):
+        self._robot = robot
+        self.clock = clock
+        self.period = 1.0 / rate
+        self._cond = clock.condition()
+        self._state: dict = {}  # Actuator -> last value sent
+        self._queue: dict = {}  # Actuator -> (call, args, kwargs, value), oldest first
+        self._busy = False  # A command is waiting for its rate-limit slot
+        self._in_flight: set[str] = set()  # Lanes with a call at the robot
+        self._lanes = {lane: deque() for lane in LANES}  # Submitted, oldest first
+        self._next_slot = -math.inf  # Clock time the next command may leave
+        self._running = False  # Commands are sent synchronously until start()
+        self._sender = Thread(target=self._send_loop, name="CommandChannel", daemon=True)
+        self._workers = {
+            lane: Thread(
+                target=self._lane_loop,
+                args=(lane,),
+                name=f"CommandChannel-{lane}",
+                daemon=True,
+            )
+            for lane in LANES
+        }
+        self._sent = metrics.counter("commands.sent")
+        self._dropped = metrics.counter("commands.dropped")
+        self._merged = metrics.counter("commands.merged")
+        self._failed = metrics.counter("commands.failed")
+
+    def start(self):
+        # Join the clock before running so virtual time waits for sending
+        self._running = True
+        for thread in (self._sender, *self._workers.values()):
+            self.clock.register(thread)
+            thread.start()
+
+    def close(self):
+        """Run what is still submitted or queued and stop the threads."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in (*self._workers.values(), self._sender):
+            if thread.is_alive():
+                thread.join()
+
+    def submit(self, method: str, *args, **kwargs) -> CommandFuture:
+        """
+        Run ``method(*args, **kwargs)`` on its actuator's lane without
+        waiting for it. Non-blocking commands are done once queued.
+        """
+        call = getattr(self, method)
+        future = CommandFuture(self.clock, method)
+        if not self._running:
+            try:
+                future._set(call(*args, **kwargs))
+            except Exception as e:
+                future._set(error=e)
+            return future
+        with self._cond:
+            self._lanes[_LANES.get(method, "control")].append(
+                (future, call, args, kwargs)
+            )
+            self._cond.notify_all()
+        return future
+
+    def disconnect(self):
+        self.close()
+        self._robot.disconnect()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._robot, name)
+        if not callable(attribute) or name.startswith("read"):
+            return attribute
+
+        if name in _ACTUATORS:
+
+            def call(*args, **kwargs):
+                return self._actuate(name, attribute, args, kwargs)
+
+        else:
+
+            def call(*args, **kwargs):
+                return self._send(name, attribute, args, kwargs)
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+    def _actuate(self, method: str, call, args: tuple, kwargs: dict):
+        actuator = _ACTUATORS[method]
+        value = _target(method, args, kwargs)
+        if self._running and not _waits(method, args, kwargs):
+            with self._cond:
+                queued = self._enqueue(actuator, call, args, kwargs, value)
+            if queued:
+                return None
+            # Behind submitted commands: send it directly once they are
+            # done, after releasing the lock, which _send takes itself
+        return self._send(method, call, args, kwargs, actuator, value)
+
+    def _enqueue(self, actuator: str, call, args: tuple, kwargs: dict, value) -> bool:
+        # Must be called with the lock held. Queues (or merges, or drops)
+        # the command for the sender; False when submitted commands are
+        # ahead of it on its lane and it has to be sent directly instead.
+        if self._submitted_ahead(actuator):
+            return False
+        if actuator in self._queue:
+            self._merged.inc()
+            if value == self._state.get(actuator):
+                del self._queue[actuator]  # Back to what was sent: cancel
+            else:
+                # Replaces the queued command, keeping its place
+                self._queue[actuator] = (call, args, kwargs, value)
+        elif value == self._state.get(actuator):
+            self._dropped.inc()
+        else:
+            self._queue[actuator] = (call, args, kwargs, value)
+            self._cond.notify_all()
+        return True
+
+    def _send(
+        self,
+        method: str,
+        call,
+        args: tuple,
+        kwargs: dict,
+        actuator: str | None = None,
+        value=None,
+    ):
+        lane = _LANES.get(method, "control")
+        if method in _TOGGLES:
+            actuator, value = _TOGGLES[method]
+        with self._cond:
+            if method in _TOGGLES and self._state.get(actuator) == value:
+                self._dropped.inc()
+                return None
+            # Everything queued or submitted before this command leaves first
+            while (
+                lane in self._in_flight
+                or lane in self._queue
+                or self._submitted_ahead(lane)
+            ):
+                self._cond.wait()
+            self._take_slot(lane)
+        try:
+            result = call(*args, **kwargs)
+        except Exception:
+            with self._cond:
+                self._failed_call("wheels" if method in _WHEEL_RESETS else actuator)
+                self._done(lane)
+            raise
+        with self._cond:
+            if actuator is not None:
+                self._state[actuator] = value
+            if method in _WHEEL_RESETS:
+                self._state.pop("wheels", None)
+            self._done(lane)
+        return result
+
+    def _submitted_ahead(self, lane: str) -> bool:
+        # Must be called with the lock held. The lane's worker runs the
+        # oldest submitted command itself, so it does not wait for it.
+        if threading.current_thread() is self._workers[lane]:
+            return len(self._lanes[lane]) > 1
+        return bool(self._lanes[lane])
+
+    def _take_slot(self, lane: str):
+        # Must be called with the lock held. Waits for the rate limit,
+        # claiming the channel first so nobody else takes the slot, and
+        # marks the lane as busy at the robot.
+        while self._busy:
+            self._cond.wait()
+        self._busy = True
+        while (delay := self._next_slot - self.clock.now()) > 0:
+            self._cond.wait(delay)
+        self._next_slot = self.clock.now() + self.period
+        self._busy = False
+        self._in_flight.add(lane)
+        self._cond.notify_all()
+
+    def _done(self, lane: str):
+        # Must be called with the lock held
+        self._in_flight.discard(lane)
+        self._sent.inc()
+        self._cond.notify_all()
+
+    def _failed_call(self, actuator: str | None):
+        # Must be called with the lock held. The robot may or may not have
+        # applied the command, so the actuator's state is unknown and the
+        # next command for it is sent, never dropped as a repeat.
+        self._failed.inc()
+        if actuator is not None:
+            self._state.pop(actuator, None)
+
+    def _ready(self) -> str | None:
+        # Must be called with the lock held. Oldest queued actuator whose
+        # lane is free.
+        for actuator in self._queue:
+            if actuator not in self._in_flight:
+                return actuator
+        return None
+
+    def _send_loop(self):
+        try:
+            while True:
+                with self._cond:
+                    while (actuator := self._ready()) is None and (
+                        self._running or self._queue
+                    ):
+                        self._cond.wait()
+                    if actuator is None:
+                        return  # Closed and flushed
+                    self._take_slot(actuator)
+                    if actuator not in self._queue:
+                        # Cancelled while waiting for the slot
+                        self._in_flight.discard(actuator)
+                        self._cond.notify_all()
+                        continue
+                    call, args, kwargs, value = self._queue.pop(actuator)
+                    if value == self._state.get(actuator):
+                        # Queued while the same command was still at the
+                        # robot: a repeat now that it has completed
+                        self._dropped.inc()
+                        self._in_flight.discard(actuator)
+                        self._cond.notify_all()
+                        continue
+                try:
+                    call(*args, **kwargs)
+                except Exception as e:
+                    # Nobody waits on a queued command; report it and keep sending
+                    telemetry.error(
+                        f"[CommandChannel] {getattr(call, '__name__', actuator)}{args}"
+                        f" failed: {e!r}"
+                    )
+                    with self._cond:
+                        self._failed_call(actuator)
+                        self._done(actuator)
+                    continue
+                with self._cond:
+                    self._state[actuator] = value
+                    self._done(actuator)
+        finally:
+            self.clock.unregister(self._sender)
+
+    def _lane_loop(self, lane: str):
+        submitted = self._lanes[lane]
+        try:
+            while True:
+                with self._cond:
+                    while self._running and not submitted:
+                        self._cond.wait()
+                    if not submitted:
+                        return  # Closed and drained
+                    future, call, args, kwargs = submitted[0]
+                try:
+                    future._set(call(*args, **kwargs))
+                except Exception as e:
+                    future._set(error=e)
+                finally:
+                    with self._cond:
+                        submitted.popleft()
+                        self._cond.notify_all()
+        finally:
+            self.clock.unregister(self._workers[lane])
@@ -7,6 +7,9 @@ SPEED_FAST = 14
 # TIMING (in seconds)
 SPEECH_WAIT_TIME = 2
 LOOP_DELAY = 0.1  # Delay for behavior/executor loops to reduce CPU and message rate
+STATE_WAIT_TIMEOUT = 1.0  # Upper bound for blocking waits on StateManager changes
+ARBITER_HANDOFF_BUDGET = 0.5  # Seconds for a chosen behavior to get control
+COMMAND_RATE_LIMIT = 20  # Commands per second sent to the robot
 REVERSE_DURATION = 3.5
 STRAIGHTEN_DURATION = 2
 TURNING_TIME = 6.4
@@ -14,6 +17,19 @@ TURNING_TIME = 6.4
 # PARKING
 FAST_WHEEL_SPEED = 22
 SLOW_WHEEL_SPEED = 4
+STRAIGHT_SPEED = 10  # Wheel speed of the straight middle phase of the timed entries
+STRAIGHT_DURATION = 0.8  # Seconds of the straight middle phase
+STALL_LENGTH_CM = 95  # Length of a parking stall along the lane (map.json: half a bay)
+STALL_DEPTH_CM = 60  # Depth of a stall beyond the QR line
+PARKING_ENTRY = "closed_loop"  # Follows an entry path on the wheel odometry; "timed" replays the fixed wheel timings
+PARKING_SPEED = SPEED_FAST  # Cruise speed of the closed-loop entry
+PARKING_MAX_WHEEL_SPEED = FAST_WHEEL_SPEED  # Neither wheel goes faster while steering
+PARKING_LOOKAHEAD_CM = 5  # Pure pursuit lookahead along the entry path
+PARKING_SLOWDOWN_CM = 10  # The entry ends at SPEED_SLOW over the last centimetres
+PARKING_POSITION_TOLERANCE_CM = 1
+PARKING_HEADING_TOLERANCE_DEG = 2
+SWEEP_SIM_TOLERANCE_CM = 1.0  # Largest gap between the maneuver model and SimRobobo
+PARKING_IR_STOP = 80  # IR value (in the direction of travel) that stops the entry
 # CAMERA POSITIONS (Pan/Tilt in degrees)
 PAN_CENTER = 0
 PAN_LEFT = -90
@@ -24,9 +40,80 @@ PAN_MOVEMENT_SPEED = 100  # Speed for pan/tilt movements
 # DISTANCE THRESHOLDS
 TARGET_DISTANCE_TO_PILLAR = 900
 QR_CENTER_TOLERANCE = 40
+QR_DISTANCE_SCALE = 49500  # readQR().distance x range in cm (bigger distance is closer)
+
+# OCCUPANCY DETECTION (during the scan)
+OCCUPANCY_LOOK_ANGLE = 120  # Pan angle (toward the spot's side) used to look at a stall
+OCCUPANCY_LOOK_TIME = 1.0  # Seconds of object recognition frames per stall
+OCCUPANCY_PAN_TOLERANCE = 10  # Degrees from the look angle at which frames count
+OCCUPANCY_CHECK_ATTEMPTS = 2  # Looks at a stall before its occupancy is left unknown
+OCCUPIED_LABELS = ("robobo", "person")  # Detected labels that mean the spot is taken
+
+# PAN SCHEDULING (which side the camera faces during the scan)
+PAN_VISIBLE_CM = 20  # Driving distance over which a QR beside the path is reliably read
+PAN_SWITCH_TIME = 2.0  # Seconds to pan to the other side and read a frame there
+
+# MAP-PRIOR SCAN (scan mode "map": expected spots come from the map file)
+SCAN_MODE = "blind"  # "blind" scans until max_spots QRs are seen, "map" follows the map
+CAMERA_HALF_FOV_DEG = 30  # Half of the camera's horizontal field of view
+QR_DETECTION_RANGE_CM = 120  # Farthest lateral distance at which a QR is read
+SCAN_WINDOW_MARGIN_CM = 20  # Slack around the stretch where a QR should be visible
+
+# GRID ROUTE PLANNER (route mode "grid": A* route over the map walls to the spot)
+ROUTE_MODE = "search"  # "search" drives until the target QR is seen, "grid" plans a route
+GRID_RESOLUTION_CM = 5  # Side of one occupancy grid cell
+GRID_CACHE_DIR = "grid_cache"  # Precomputed grids, one file per map version
+ROBOT_RADIUS_CM = 12  # Obstacles are inflated by this much (robot half width + margin)
+ROUTE_QR_STANDOFF_CM = 40  # Goal distance from the target QR along its normal (FindQR wants < 55)
+ROUTE_APPROACH_CM = 20  # The route ends this far before the goal; FindQR does the rest
+NAV_DRIVE_SPEED = SPEED_FAST  # Wheel speed of planned drive steps
+NAV_TURN_SPEED = SPEED_MEDIUM  # Wheel speed of planned turn steps
+NAV_SLOWDOWN_CM = 8  # Drive steps finish at SPEED_SLOW over the last centimetres
+NAV_SLOWDOWN_DEG = 20  # Turn steps finish at SPEED_SLOW over the last degrees
+
+# SPOT CACHE
+SPOT_CACHE_FILE = "spot_cache.sqlite"  # Spots of previous missions, per lot
+SPOT_CACHE_MAX_AGE = 600  # Seconds after which a cached occupancy is rechecked
+
+# FLEET
+FLEET_START_INTERVAL = 20  # Seconds between robot starts, so they do not enter the lane together
+
+# SPOT ALLOCATION
+SPOT_ALLOCATION = "interactive"  # "interactive" asks, "auto" picks the spot with the least travel (needs the lot map)
+ALLOCATION_BATCH_WINDOW = 1.0  # Seconds fleet spot requests wait to be assigned together
+
+# MONTE CARLO
+MC_RUNS = 1000  # Simulated missions per Monte Carlo study
+MC_QR_DISTANCE_NOISE = 0.05  # Relative standard deviation of the QR distance reading
+MC_WHEEL_SLIP = 0.03  # Standard deviation of the speed share each wheel loses to slip
+MC_START_POSITION_NOISE = 2.0  # cm, standard deviation of the start position per axis
+MC_START_HEADING_NOISE = 3.0  # Degrees, standard deviation of the start heading
+MC_MISSION_TIME_LIMIT = 1200  # Simulated seconds after which a mission is stopped as failed
+MC_CHUNK_SIZE = 4  # Missions handed to a worker process at a time
+
+# SENSORS
+SENSOR_SAMPLE_RATE = 10  # Hz, rate of the shared sensor sampling thread
+SENSOR_HISTORY_SIZE = 50  # Number of snapshots kept in the ring buffer
+
+# TELEMETRY / LOGGING
+LOG_LEVEL = "INFO"  # DEBUG prints per-iteration traces of the behavior loops
+TELEMETRY_ENABLED = True
+TELEMETRY_FILE = "telemetry/mission.jsonl"
+TELEMETRY_QUEUE_SIZE = 20000  # Records buffered before the oldest are dropped
+TELEMETRY_FLUSH_INTERVAL = 0.5  # Wall-clock seconds between writer flushes
+TELEMETRY_BACKUPS = 3  # Previous missions kept (mission.jsonl.1, .2, ...)
+METRICS_ENABLED = True  # Time every robot call and dump the metrics at mission end
 
 # TIMEOUTS
-ACTION_TIMEOUT = 180
+ACTION_TIMEOUT = 300  # Covers find_spot_qr crawling back the whole lane after the rotonda
+STEP_RETRIES = 1  # Retries of a failed non-critical step before the plan is given up
 
 # DEFAULT VALUES
 DEFAULT_SIDE = "left"
+
+# MAP / SIMULATION
+MAP_FILE = "map.json"
+MAP_CELL_SIZE_CM = 10  # Size of one RoboboSIM grid cell
+WHEEL_BASE_CM = 10  # Distance between the two wheels
+WHEEL_RADIUS_CM = 3.3  # Wheel encoders count degrees of wheel rotation
+WHEEL_CM_PER_SPEED = 0.8  # Linear wheel speed (cm/s) per unit of wheel speed factor
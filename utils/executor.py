@@ -1,18 +1,31 @@
+import time
+
+from utils import telemetry
+from utils.clock import Clock
+from utils.metrics import metrics
 from utils.planner import Plan
 from utils.state import StateManager
-from utils.config import ACTION_TIMEOUT, LOOP_DELAY
+from utils.config import ACTION_TIMEOUT, STATE_WAIT_TIMEOUT, STEP_RETRIES
 from robobopy.Robobo import Robobo
-import time
+
+# State keys that can end the wait on a running action
+ACTION_WATCHED_KEYS = ("current_action_status", "stop", "replan_needed")
 
 
 class Executor:
-    def __init__(self, robot: Robobo, state_manager: StateManager):
+    def __init__(
+        self, robot: Robobo, state_manager: StateManager, clock: Clock | None = None
+    ):
         self.robot = robot
         self.state_manager = state_manager
+        self.clock = clock or state_manager.clock
+        self.failure_reason = ""  # Why the last step returned False
 
     def execute_plan(self, plan: Plan):
         if not plan or plan.is_complete():
-            print("[Executor] No plan to execute or plan is already complete.")
+            telemetry.info(
+                "[Executor] No plan to execute or plan is already complete."
+            )
             return
 
         self.state_manager.set("current_plan", plan)
@@ -21,6 +34,9 @@ class Executor:
         while not plan.is_complete():
             if self.should_replan(plan):
                 return False
+            if self.state_manager.get("stop", False):
+                # A failed step is retried, but not once the mission is stopped
+                return False
 
             current_step = plan.get_next_step()
             if current_step is None:
@@ -30,69 +46,109 @@ class Executor:
             current_step["status"] = "in_progress"
             self.state_manager.set("current_step_index", step_index)
 
-            print(f"[Executor] Executing step {step_index}: {current_step['action']}")
+            telemetry.info(
+                f"[Executor] Executing step {step_index}: {current_step['action']}"
+            )
 
             success = self.execute_step(current_step, plan, step_index)
 
             if success == "waiting_for_input":
-                print("[Executor] Waiting for user input to proceed.")
+                telemetry.info("[Executor] Waiting for user input to proceed.")
                 return True  # Pause execution until user input is received
             if success:
                 plan.mark_step_completed(step_index)
-                print(f"[Executor] Step {step_index} completed successfully.")
+                telemetry.info(
+                    f"[Executor] Step {step_index} completed successfully."
+                )
             else:
-                plan.mark_step_failed(step_index, reason="Step execution failed.")
-                print(f"[Executor] Step {step_index} failed.")
+                plan.mark_step_failed(
+                    step_index, reason=self.failure_reason or "Step execution failed."
+                )
+                telemetry.info(f"[Executor] Step {step_index} failed.")
                 if self.should_replan_on_failure(current_step):
-                    print("[Executor] Replanning due to step failure.")
+                    telemetry.info("[Executor] Replanning due to step failure.")
+                    return False
+                if current_step["failures"] > STEP_RETRIES:
+                    telemetry.warning(
+                        "[Executor] Step %d (%s) failed %d times, giving up the plan.",
+                        step_index,
+                        current_step["action"],
+                        current_step["failures"],
+                    )
                     return False
 
-            time.sleep(LOOP_DELAY)
-
-        print("[Executor] Plan execution complete.")
+        telemetry.info("[Executor] Plan execution complete.")
         return True
 
     def execute_step(self, step: dict, plan: Plan, step_index: int) -> bool:
         action = step.get("action")
         params = step.get("params", {})
 
-        self.state_manager.set("current_action", action)
-        self.state_manager.set("current_action_params", params)
-        self.state_manager.set("current_action_status", "executing")
+        # Publish the action atomically so behaviors never see a half-set step
+        self.state_manager.update(
+            {
+                "current_action": action,
+                "current_action_params": params,
+                "current_action_status": "executing",
+            }
+        )
 
         timeout = ACTION_TIMEOUT
 
-        start_time = time.time()
+        start_time = self.clock.now()
 
         # Needed to handle 'wait_user_input' action to pause execution
         if action == "wait_user_input":
-            print(
+            telemetry.info(
                 "[Executor] Entering wait_user_input step; returning to main for user input."
             )
             self.state_manager.set("current_action_status", "waiting_for_input")
             self.state_manager.set("parking_state", "waiting_for_input")
             return "waiting_for_input"
 
-        while True:
-            if time.time() - start_time > timeout:
-                print(f"[Executor] Action '{action}' timed out.")
-                return False
-
-            status = self.state_manager.get("current_action_status")
+        step_time = metrics.histogram(f"executor.step.{action}")
+        reaction = metrics.histogram("executor.reaction")
+        last_status = "executing"
+        self.failure_reason = ""
+        try:
+            while True:
+                # Take the version before reading so no change can be missed
+                version = self.state_manager.version(ACTION_WATCHED_KEYS)
+                remaining = timeout - (self.clock.now() - start_time)
+                if remaining <= 0:
+                    telemetry.info(f"[Executor] Action '{action}' timed out.")
+                    self.failure_reason = "timed out"
+                    return False
 
-            if status == "completed":
-                print(f"[Executor] Action '{action}' completed successfully.")
-                return True
-            elif status == "failed":
-                return False
-            elif self.state_manager.get("stop", False):
-                print(f"[Executor] Action '{action}' was stopped.")
-                return False
-            elif self.should_replan(plan):
-                print(f"[Executor] Replanning triggered during action '{action}'.")
-                return False
+                status = self.state_manager.get("current_action_status")
+                if status != last_status:
+                    # Wall time between the behavior's update and this wake-up
+                    changed_at = self.state_manager.changed_at("current_action_status")
+                    if changed_at is not None:
+                        reaction.observe(time.perf_counter() - changed_at)
+                    last_status = status
+
+                if status == "completed":
+                    telemetry.info(f"[Executor] Action '{action}' completed successfully.")
+                    return True
+                elif status == "failed":
+                    self.failure_reason = "behavior failed"
+                    return False
+                elif self.state_manager.get("stop", False):
+                    telemetry.info(f"[Executor] Action '{action}' was stopped.")
+                    self.failure_reason = "stopped"
+                    return False
+                elif self.should_replan(plan):
+                    telemetry.info(f"[Executor] Replanning triggered during action '{action}'.")
+                    self.failure_reason = "replan requested"
+                    return False
 
-            time.sleep(0.5)
+                # Block until the status, stop or replan flags change
+                self.state_manager.wait_for_change(
+                    ACTION_WATCHED_KEYS, version, min(remaining, STATE_WAIT_TIMEOUT)
+                )
+        finally:
+            step_time.observe(self.clock.now() - start_time)
 
     def should_replan(self, plan: Plan) -> bool:
         return self.state_manager.get("replan_needed", False)
@@ -1,3 +1,4 @@
+from utils import telemetry
 from utils.planner import Plan
 from utils.state import Spot
 from robobopy.Robobo import Robobo
@@ -66,14 +67,13 @@ def prompt_for_parking_spot(robot: Robobo, spots: list[Spot]) -> str:
 
 
 def display_plan_progress(plan: Plan, current_step_index: int = 0):
-    """Display the current progress of the parking plan."""
-    print("\n" + "=" * 60)
-    print("  PARKING PLAN PROGRESS:")
-    print("=" * 60 + "\n")
-
+    """Log the current progress of the parking plan (INFO)."""
+    if not telemetry.is_enabled(telemetry.INFO):
+        return
+    lines = ["", "=" * 60, "  PARKING PLAN PROGRESS:", "=" * 60, ""]
     for i, step in enumerate(plan.steps):
         status = step.get("status", "pending")
         marker = ">>" if i == current_step_index else "  "
-        print(f"{marker} Step {i + 1}: {step['action']} - Status: {status}")
-
-    print("\n" + "=" * 60 + "\n")
+        lines.append(f"{marker} Step {i + 1}: {step['action']} - Status: {status}")
+    lines += ["", "=" * 60, ""]
+    telemetry.info("\n".join(lines))
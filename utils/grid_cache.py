@@ -0,0 +1,165 @@
+#
+# On-disk cache of the occupancy grid and its distance field.
+# Rasterizing the map and running the distance transform is done once per
+# map version: the arrays are stored in a binary file named after a hash of
+# the map file and the grid parameters, and memory-mapped on later starts.
+# Editing map.json changes the hash, so a stale grid is never loaded.
+#
+# Precompute with:  python -m utils.grid_cache --map map.json
+#
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from utils import telemetry
+from utils.config import GRID_CACHE_DIR, GRID_RESOLUTION_CM, MAP_FILE, ROBOT_RADIUS_CM
+from utils.grid_planner import OccupancyGrid
+from utils.map_layout import MapLayout
+
+FORMAT_VERSION = 1  # Bump when the file layout or the grid computation changes
+_MAGIC = b"RBGRID"
+_PREAMBLE = struct.Struct("<6sHI")  # magic, format version, JSON header length
+_ALIGN = 64  # Arrays start on 64-byte boundaries
+
+
+def map_key(
+    map_path: str,
+    resolution: float = GRID_RESOLUTION_CM,
+    inflation: float = ROBOT_RADIUS_CM,
+) -> str:
+    """Hash of the map file contents and of everything the grid depends on."""
+    digest = hashlib.sha256()
+    with open(map_path, "rb") as f:
+        digest.update(f.read())
+    params = {"version": FORMAT_VERSION, "resolution": resolution, "inflation": inflation}
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def cache_path(map_path: str, key: str, cache_dir: str = GRID_CACHE_DIR) -> str:
+    stem = os.path.splitext(os.path.basename(map_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{key[:16]}.grid")
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def save_grid(grid: OccupancyGrid, path: str, key: str):
+    """Write ``grid`` to ``path`` atomically (readers never see a partial file)."""
+    arrays = {
+        "blocked": np.ascontiguousarray(grid.blocked, dtype=np.uint8),
+        "clearance": np.ascontiguousarray(grid.clearance, dtype=np.float32),
+    }
+    header = {
+        "key": key,
+        "origin": list(grid.origin),
+        "resolution": grid.resolution,
+        "shape": [grid.height, grid.width],
+        "arrays": {},
+    }
+    # The header holds the array offsets, which depend on the header size:
+    # grow the space reserved for it until everything fits
+    data_start = 0
+    while True:
+        offset = data_start
+        for name, array in arrays.items():
+            header["arrays"][name] = {"offset": offset, "dtype": array.dtype.str}
+            offset = _aligned(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode()
+        needed = _aligned(_PREAMBLE.size + len(header_bytes))
+        if needed <= data_start:
+            break
+        data_start = needed
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = f"{path}.tmp{os.getpid()}"
+    with open(temporary, "wb") as f:
+        f.write(_PREAMBLE.pack(_MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(array.tobytes())
+    os.replace(temporary, path)
+
+
+def open_grid(path: str, key: str | None = None) -> OccupancyGrid | None:
+    """
+    Memory-map a cached grid. Returns None when the file is missing,
+    corrupt, from another format version or (with ``key``) another map.
+    """
+    try:
+        with open(path, "rb") as f:
+            magic, version, header_size = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != _MAGIC or version != FORMAT_VERSION:
+                return None
+            header = json.loads(f.read(header_size))
+        if key is not None and header["key"] != key:
+            return None
+        shape = tuple(header["shape"])
+        arrays = {
+            name: np.memmap(
+                path,
+                dtype=np.dtype(spec["dtype"]),
+                mode="r",
+                offset=spec["offset"],
+                shape=shape,
+            )
+            for name, spec in header["arrays"].items()
+        }
+        return OccupancyGrid(
+            tuple(header["origin"]),
+            header["resolution"],
+            arrays["blocked"],
+            arrays["clearance"],
+        )
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+def load_grid(
+    map_path: str = MAP_FILE,
+    resolution: float = GRID_RESOLUTION_CM,
+    inflation: float = ROBOT_RADIUS_CM,
+    cache_dir: str = GRID_CACHE_DIR,
+) -> OccupancyGrid:
+    """
+    Occupancy grid of ``map_path``, memory-mapped from the cache when it
+    is up to date, otherwise computed and cached (replacing the files of
+    older versions of the same map).
+    """
+    started = time.perf_counter()
+    key = map_key(map_path, resolution, inflation)
+    path = cache_path(map_path, key, cache_dir)
+    grid = open_grid(path, key)
+    if grid is not None:
+        telemetry.info(
+            f"[GridCache] Loaded {path} in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        return grid
+
+    grid = OccupancyGrid.from_layout(MapLayout.load(map_path), resolution, inflation)
+    stem = os.path.splitext(os.path.basename(map_path))[0]
+    for stale in glob.glob(os.path.join(cache_dir, f"{stem}-*.grid")):
+        if stale != path:
+            os.remove(stale)
+    save_grid(grid, path, key)
+    telemetry.info(
+        f"[GridCache] Built {path} in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return grid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the occupancy grid cache")
+    parser.add_argument("--map", default=MAP_FILE, help="map file")
+    parser.add_argument("--cache-dir", default=GRID_CACHE_DIR, help="cache directory")
+    args = parser.parse_args()
+    load_grid(args.map, cache_dir=args.cache_dir)
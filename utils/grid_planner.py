@@ -0,0 +1,324 @@
+#
+# Grid route planner (route mode "grid").
+# Rasterizes the walls of map.json into an occupancy grid inflated by the
+# robot radius (utils/grid_cache.py keeps it on disk), finds the shortest
+# collision-free route with A* to the pose in front of the target QR, and
+# turns it into drive/turn Plan steps.
+#
+
+import heapq
+import math
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils.config import (
+    GRID_RESOLUTION_CM,
+    NAV_DRIVE_SPEED,
+    NAV_TURN_SPEED,
+    ROBOT_RADIUS_CM,
+    ROUTE_APPROACH_CM,
+    ROUTE_QR_STANDOFF_CM,
+)
+from utils.map_layout import MapLayout
+from utils.odometry import wrap_angle
+
+# 8-connected moves (d_col, d_row, cost in cells)
+_MOVES = [
+    (1, 0, 1.0),
+    (-1, 0, 1.0),
+    (0, 1, 1.0),
+    (0, -1, 1.0),
+    (1, 1, math.sqrt(2)),
+    (1, -1, math.sqrt(2)),
+    (-1, 1, math.sqrt(2)),
+    (-1, -1, math.sqrt(2)),
+]
+MIN_TURN_DEG = 2  # Heading changes below this are not worth a turn step
+MIN_DRIVE_CM = 1  # Nor are shorter drives
+
+
+def rasterize_walls(
+    layout: MapLayout, origin: tuple, resolution: float, shape: tuple
+) -> np.ndarray:
+    """Boolean (rows, cols) mask of the cells overlapping a wall."""
+    mask = np.zeros(shape, dtype=bool)
+    for wall in layout.walls:
+        col_0 = max(math.floor((wall.x_min - origin[0]) / resolution), 0)
+        col_1 = math.ceil((wall.x_max - origin[0]) / resolution)
+        row_0 = max(math.floor((wall.y_min - origin[1]) / resolution), 0)
+        row_1 = math.ceil((wall.y_max - origin[1]) / resolution)
+        mask[row_0:row_1, col_0:col_1] = True
+    return mask
+
+
+def distance_transform(mask: np.ndarray) -> np.ndarray:
+    """
+    Exact Euclidean distance, in cells, from every cell to the nearest True
+    cell of ``mask``. Squared distances are separable, so it takes one
+    lower-envelope pass per axis (brute force over the axis, vectorized).
+    """
+    squared = np.where(mask, 0.0, float(mask.size) ** 2)
+    for axis in (0, 1):
+        values = np.moveaxis(squared, axis, 0)
+        offsets = np.arange(values.shape[0], dtype=float)
+        result = np.empty_like(values)
+        for i in range(values.shape[0]):
+            result[i] = np.min(values + ((offsets - i) ** 2)[:, None], axis=0)
+        squared = np.moveaxis(result, 0, axis)
+    return np.sqrt(squared)
+
+
+class OccupancyGrid:
+    """
+    Grid of ``resolution`` cm cells over the map bounds. ``clearance`` holds
+    the distance in cm from each cell centre to the nearest wall; a cell is
+    blocked when it is smaller than the inflation radius, so the robot can
+    be planned as a point. Cells are addressed as (col, row).
+    """
+
+    def __init__(
+        self,
+        origin: tuple,
+        resolution: float,
+        blocked: np.ndarray,
+        clearance: np.ndarray,
+    ):
+        self.origin = origin  # (x, y) of the corner of cell (0, 0)
+        self.resolution = resolution
+        self.height, self.width = blocked.shape
+        self.blocked = blocked  # (rows, cols) uint8, 1 = blocked
+        self.clearance = clearance  # (rows, cols) float32, cm
+        # Flat view for the per-cell lookups of A* (much faster than numpy indexing)
+        self._blocked_flat = memoryview(np.ascontiguousarray(blocked).reshape(-1))
+
+    @classmethod
+    def from_layout(
+        cls,
+        layout: MapLayout,
+        resolution: float = GRID_RESOLUTION_CM,
+        inflation: float = ROBOT_RADIUS_CM,
+    ) -> "OccupancyGrid":
+        x_min, y_min, x_max, y_max = layout.bounds()
+        shape = (
+            math.ceil((y_max - y_min) / resolution),
+            math.ceil((x_max - x_min) / resolution),
+        )
+        walls = rasterize_walls(layout, (x_min, y_min), resolution, shape)
+        # Centre-to-centre distance, minus half a cell to reach the wall's edge
+        distance = distance_transform(walls) * resolution - resolution / 2
+        clearance = np.maximum(distance, 0.0).astype(np.float32)
+        blocked = (clearance < inflation).astype(np.uint8)
+        return cls((x_min, y_min), resolution, blocked, clearance)
+
+    def cell_of(self, x: float, y: float) -> tuple:
+        return (
+            math.floor((x - self.origin[0]) / self.resolution),
+            math.floor((y - self.origin[1]) / self.resolution),
+        )
+
+    def center_of(self, cell: tuple) -> tuple:
+        return (
+            self.origin[0] + (cell[0] + 0.5) * self.resolution,
+            self.origin[1] + (cell[1] + 0.5) * self.resolution,
+        )
+
+    def in_bounds(self, cell: tuple) -> bool:
+        return 0 <= cell[0] < self.width and 0 <= cell[1] < self.height
+
+    def is_free(self, cell: tuple) -> bool:
+        return (
+            self.in_bounds(cell)
+            and not self._blocked_flat[cell[1] * self.width + cell[0]]
+        )
+
+    def clearance_at(self, x: float, y: float) -> float:
+        """Distance in cm from (x, y) to the nearest wall (0 outside the grid)."""
+        cell = self.cell_of(x, y)
+        if not self.in_bounds(cell):
+            return 0.0
+        return float(self.clearance[cell[1], cell[0]])
+
+    def nearest_free(self, cell: tuple, max_cells: int = 10) -> tuple | None:
+        """Closest free cell (breadth-first, at most ``max_cells`` away)."""
+        if self.is_free(cell):
+            return cell
+        seen = {cell}
+        queue = deque([(cell, 0)])
+        while queue:
+            (col, row), depth = queue.popleft()
+            if depth >= max_cells:
+                continue
+            for d_col, d_row, _ in _MOVES:
+                neighbour = (col + d_col, row + d_row)
+                if neighbour in seen or not self.in_bounds(neighbour):
+                    continue
+                if self.is_free(neighbour):
+                    return neighbour
+                seen.add(neighbour)
+                queue.append((neighbour, depth + 1))
+        return None
+
+    def line_is_free(self, start: tuple, end: tuple) -> bool:
+        """True when the straight segment between two points crosses no blocked cell."""
+        length = math.hypot(end[0] - start[0], end[1] - start[1])
+        samples = max(int(length / (self.resolution / 2)), 1)
+        for i in range(samples + 1):
+            t = i / samples
+            x = start[0] + (end[0] - start[0]) * t
+            y = start[1] + (end[1] - start[1]) * t
+            if not self.is_free(self.cell_of(x, y)):
+                return False
+        return True
+
+
+def astar(grid: OccupancyGrid, start: tuple, goal: tuple) -> list[tuple] | None:
+    """
+    Shortest 8-connected path of cells from ``start`` to ``goal``, or None.
+    Diagonal moves may not cut the corner of a blocked cell.
+    """
+    if not grid.is_free(start) or not grid.is_free(goal):
+        return None
+
+    def heuristic(cell):
+        # Octile distance: exact on an empty 8-connected grid
+        d_col, d_row = abs(cell[0] - goal[0]), abs(cell[1] - goal[1])
+        return max(d_col, d_row) + (math.sqrt(2) - 1) * min(d_col, d_row)
+
+    g_score = {start: 0.0}
+    came_from = {}
+    open_heap = [(heuristic(start), 0.0, start)]
+    while open_heap:
+        _, g, cell = heapq.heappop(open_heap)
+        if cell == goal:
+            path = [cell]
+            while cell in came_from:
+                cell = came_from[cell]
+                path.append(cell)
+            return path[::-1]
+        if g > g_score[cell]:
+            continue  # Stale heap entry
+        col, row = cell
+        for d_col, d_row, cost in _MOVES:
+            neighbour = (col + d_col, row + d_row)
+            if not grid.is_free(neighbour):
+                continue
+            if d_col and d_row and not (
+                grid.is_free((col + d_col, row)) and grid.is_free((col, row + d_row))
+            ):
+                continue
+            new_g = g + cost
+            if new_g < g_score.get(neighbour, math.inf):
+                g_score[neighbour] = new_g
+                came_from[neighbour] = cell
+                heapq.heappush(open_heap, (new_g + heuristic(neighbour), new_g, neighbour))
+    return None
+
+
+def simplify(grid: OccupancyGrid, points: list[tuple]) -> list[tuple]:
+    """Drop the waypoints that can be skipped by driving in a straight line."""
+    if len(points) <= 2:
+        return list(points)
+    waypoints = [points[0]]
+    anchor = 0
+    while anchor < len(points) - 1:
+        # Farthest point still in line of sight of the anchor
+        reach = anchor + 1
+        for candidate in range(len(points) - 1, anchor + 1, -1):
+            if grid.line_is_free(points[anchor], points[candidate]):
+                reach = candidate
+                break
+        waypoints.append(points[reach])
+        anchor = reach
+    return waypoints
+
+
+def _step(action: str, **params) -> dict:
+    return {"action": action, "params": params}
+
+
+def route_steps(waypoints: list[tuple], heading: float, final_heading: float) -> list[dict]:
+    """
+    Turn/drive steps that follow ``waypoints`` from the first one, starting
+    at ``heading`` and ending at ``final_heading`` (radians). Turn angles
+    are in degrees, positive counter-clockwise (to the left).
+    """
+    steps = []
+    for (x0, y0), (x1, y1) in zip(waypoints, waypoints[1:]):
+        distance = math.hypot(x1 - x0, y1 - y0)
+        if distance < MIN_DRIVE_CM:
+            continue
+        target = math.atan2(y1 - y0, x1 - x0)
+        turn = math.degrees(wrap_angle(target - heading))
+        if abs(turn) >= MIN_TURN_DEG:
+            steps.append(_step("turn", angle=round(turn, 1), speed=NAV_TURN_SPEED))
+            heading = target
+        steps.append(_step("drive", distance=round(distance, 1), speed=NAV_DRIVE_SPEED))
+    turn = math.degrees(wrap_angle(final_heading - heading))
+    if abs(turn) >= MIN_TURN_DEG:
+        steps.append(_step("turn", angle=round(turn, 1), speed=NAV_TURN_SPEED))
+    return steps
+
+
+@dataclass
+class Route:
+    spot_id: str
+    steps: list[dict]  # drive/turn steps, without Plan bookkeeping
+    length: float  # cm driven
+    end: tuple  # (x, y, heading) reached at the end of the route
+
+
+def plan_route_to_spot(
+    grid: OccupancyGrid,
+    layout: MapLayout,
+    pose: tuple,
+    spot_id: str,
+    lane_heading: float,
+    standoff: float = ROUTE_QR_STANDOFF_CM,
+    approach: float = ROUTE_APPROACH_CM,
+) -> Route | None:
+    """
+    Route from ``pose`` (x, y, heading) to just before the spot's QR.
+
+    The goal lies ``standoff`` cm in front of the QR, facing along the lane
+    in the direction of ``lane_heading`` (the heading the scan drove in, so
+    the spot stays on the side the scan recorded and the parking maneuver
+    is unchanged). The route stops ``approach`` cm short of it so FindQR
+    can center on the QR. Returns None when the spot has no QR on the map
+    or no collision-free route exists.
+    """
+    lane_x, lane_y = math.cos(lane_heading), math.sin(lane_heading)
+    start = grid.nearest_free(grid.cell_of(pose[0], pose[1]))
+    if start is None:
+        return None
+
+    best = None
+    for marker in layout.qr_markers:
+        if marker.id != spot_id:
+            continue
+        nx, ny = marker.normal
+        # Along the lane (perpendicular to the QR normal), in the scan direction
+        hx, hy = (ny, -nx) if ny * lane_x - nx * lane_y >= 0 else (-ny, nx)
+        goal_x = marker.x + nx * standoff - hx * approach
+        goal_y = marker.y + ny * standoff - hy * approach
+        goal = grid.nearest_free(grid.cell_of(goal_x, goal_y), max_cells=2)
+        if goal is None:
+            continue
+        cells = astar(grid, start, goal)
+        if cells is None:
+            continue
+        points = [(pose[0], pose[1])]
+        points += [grid.center_of(cell) for cell in cells[1:-1]]
+        points.append((goal_x, goal_y))
+        waypoints = simplify(grid, points)
+        length = sum(math.dist(a, b) for a, b in zip(waypoints, waypoints[1:]))
+        if best is None or length < best.length:
+            end_heading = math.atan2(hy, hx)
+            best = Route(
+                spot_id=spot_id,
+                steps=route_steps(waypoints, pose[2], end_heading),
+                length=length,
+                end=(goal_x, goal_y, end_heading),
+            )
+    return best
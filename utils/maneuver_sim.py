@@ -0,0 +1,253 @@
+#
+# Vectorized kinematics of the three-phase parking entries.
+# Parking._reverse_entry and _forward_entry drive three timed wheel-speed
+# phases; this module integrates thousands of such sequences at once with
+# NumPy (exact differential-drive arcs) and scores them against the spot
+# geometry of the map, so parameters can be screened before robot time is
+# spent (see ``python parking_tester.py sweep``).
+#
+# The model is calibrated to SimRobobo, not to the robot: both use
+# WHEEL_CM_PER_SPEED and WHEEL_BASE_CM from utils/config.py, which have not
+# been measured on the hardware. ``sim_gap`` drives a candidate in SimRobobo
+# to check that the two still agree.
+#
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils.clock import VirtualClock
+from utils.config import (
+    DEFAULT_SIDE,
+    FAST_WHEEL_SPEED,
+    MAP_FILE,
+    REVERSE_DURATION,
+    ROBOT_RADIUS_CM,
+    ROUTE_QR_STANDOFF_CM,
+    SLOW_WHEEL_SPEED,
+    STALL_DEPTH_CM,
+    STALL_LENGTH_CM,
+    STRAIGHT_DURATION,
+    STRAIGHT_SPEED,
+    WHEEL_BASE_CM,
+    WHEEL_CM_PER_SPEED,
+)
+from utils.grid_planner import OccupancyGrid
+from utils.map_layout import Marker
+from utils.sim_robot import SimRobobo
+
+HEADING_WEIGHT = 0.5  # Score cm per degree of final heading error
+SAMPLES_PER_PHASE = 16  # Trajectory points checked for clearance per phase
+
+
+@dataclass
+class Candidates:
+    """One entry per candidate sequence (arrays of equal length)."""
+
+    fast: np.ndarray
+    slow: np.ndarray
+    duration: np.ndarray  # Seconds of each curved phase
+    straight: np.ndarray  # Seconds of the straight middle phase
+
+    def __len__(self):
+        return len(self.fast)
+
+    @classmethod
+    def grid(cls, fast, slow, duration, straight) -> "Candidates":
+        """Every combination of the given values."""
+        mesh = np.meshgrid(
+            np.asarray(fast, dtype=float),
+            np.asarray(slow, dtype=float),
+            np.asarray(duration, dtype=float),
+            np.asarray(straight, dtype=float),
+            indexing="ij",
+        )
+        return cls(*(values.ravel() for values in mesh))
+
+    @classmethod
+    def current(cls) -> "Candidates":
+        """The parameters in utils/config.py."""
+        return cls(
+            np.array([float(FAST_WHEEL_SPEED)]),
+            np.array([float(SLOW_WHEEL_SPEED)]),
+            np.array([float(REVERSE_DURATION)]),
+            np.array([STRAIGHT_DURATION]),
+        )
+
+
+def entry_phases(candidates: Candidates, side: str, maneuver: str) -> list[tuple]:
+    """
+    (right speed, left speed, duration) arrays of the three phases, exactly
+    as Parking drives them for ``side`` and ``maneuver`` ("reverse" or
+    "forward").
+    """
+    sign = -1.0 if maneuver == "reverse" else 1.0
+    fast, slow = sign * candidates.fast, sign * candidates.slow
+    straight = np.full(len(candidates), sign * STRAIGHT_SPEED)
+    if side == DEFAULT_SIDE:
+        first, last = (fast, slow), (slow, fast)
+    else:
+        first, last = (slow, fast), (fast, slow)
+    return [
+        (*first, candidates.duration),
+        (straight, straight, candidates.straight),
+        (*last, candidates.duration),
+    ]
+
+
+def simulate(
+    phases: list[tuple], start: tuple, samples: int = SAMPLES_PER_PHASE
+) -> tuple:
+    """
+    Integrate every candidate from ``start`` (x, y, heading). Returns the
+    (N, points) arrays x, y, heading, sampled ``samples`` times per phase;
+    the last column is the final pose.
+    """
+    count = len(phases[0][0])
+    x = np.full(count, float(start[0]))
+    y = np.full(count, float(start[1]))
+    heading = np.full(count, float(start[2]))
+    xs, ys, headings = [x[:, None]], [y[:, None]], [heading[:, None]]
+    fractions = np.arange(1, samples + 1) / samples
+    for right, left, duration in phases:
+        v_r, v_l = right * WHEEL_CM_PER_SPEED, left * WHEEL_CM_PER_SPEED
+        v = ((v_r + v_l) / 2)[:, None]
+        omega = ((v_r - v_l) / WHEEL_BASE_CM)[:, None]
+        t = duration[:, None] * fractions[None, :]
+        h0 = heading[:, None]
+        turning = np.abs(omega) > 1e-9
+        safe_omega = np.where(turning, omega, 1.0)
+        h1 = h0 + omega * t
+        # Exact arc when turning, straight line otherwise
+        px = np.where(
+            turning,
+            v / safe_omega * (np.sin(h1) - np.sin(h0)),
+            v * t * np.cos(h0),
+        )
+        py = np.where(
+            turning,
+            -v / safe_omega * (np.cos(h1) - np.cos(h0)),
+            v * t * np.sin(h0),
+        )
+        phase_x, phase_y = x[:, None] + px, y[:, None] + py
+        xs.append(phase_x)
+        ys.append(phase_y)
+        headings.append(h1)
+        x, y, heading = phase_x[:, -1], phase_y[:, -1], h1[:, -1]
+    return np.hstack(xs), np.hstack(ys), np.hstack(headings)
+
+
+def spot_poses(
+    marker: Marker,
+    lane_heading: float,
+    maneuver: str,
+    standoff: float = ROUTE_QR_STANDOFF_CM,
+) -> tuple:
+    """
+    (start, target) poses for parking in the spot of ``marker``. The robot
+    starts abeam the QR, ``standoff`` cm in front of it, facing along the
+    lane (in the scan direction for "reverse", after the rotonda turn for
+    "forward"). The target is the middle of the stall beside the QR,
+    behind the start for a reverse entry and ahead of it for a forward one,
+    facing along the lane.
+    """
+    nx, ny = marker.normal
+    lane_x, lane_y = math.cos(lane_heading), math.sin(lane_heading)
+    hx, hy = (ny, -nx) if ny * lane_x - nx * lane_y >= 0 else (-ny, nx)
+    if maneuver == "forward":
+        hx, hy = -hx, -hy
+    heading = math.atan2(hy, hx)
+    start = (marker.x + nx * standoff, marker.y + ny * standoff, heading)
+    along = STALL_LENGTH_CM / 2 * (-1 if maneuver == "reverse" else 1)
+    depth = STALL_DEPTH_CM / 2
+    target = (
+        marker.x + hx * along - nx * depth,
+        marker.y + hy * along - ny * depth,
+        heading,
+    )
+    return start, target
+
+
+def side_of(start: tuple, marker: Marker) -> str:
+    """Side of the robot at ``start`` on which ``marker`` lies."""
+    dx, dy = marker.x - start[0], marker.y - start[1]
+    left = math.cos(start[2]) * dy - math.sin(start[2]) * dx
+    return "left" if left > 0 else "right"
+
+
+def clearance(grid: OccupancyGrid, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """Smallest distance to a wall along each trajectory (0 off the map)."""
+    cols = np.floor((xs - grid.origin[0]) / grid.resolution).astype(int)
+    rows = np.floor((ys - grid.origin[1]) / grid.resolution).astype(int)
+    inside = (cols >= 0) & (cols < grid.width) & (rows >= 0) & (rows < grid.height)
+    values = np.zeros(xs.shape, dtype=np.float32)
+    values[inside] = grid.clearance[rows[inside], cols[inside]]
+    return values.min(axis=1)
+
+
+def evaluate(
+    candidates: Candidates,
+    grid: OccupancyGrid,
+    start: tuple,
+    target: tuple,
+    side: str,
+    maneuver: str,
+) -> dict:
+    """Final pose errors, clearance and score of every candidate (arrays)."""
+    xs, ys, headings = simulate(entry_phases(candidates, side, maneuver), start)
+    position_error = np.hypot(xs[:, -1] - target[0], ys[:, -1] - target[1])
+    heading_error = np.degrees(
+        np.abs((headings[:, -1] - target[2] + np.pi) % (2 * np.pi) - np.pi)
+    )
+    margin = clearance(grid, xs, ys)
+    return {
+        "position_error": position_error,
+        "heading_error": heading_error,
+        "clearance": margin,
+        "collides": margin < ROBOT_RADIUS_CM,
+        "score": position_error + HEADING_WEIGHT * heading_error,
+    }
+
+
+def sim_gap(
+    candidates: Candidates,
+    index: int,
+    start: tuple,
+    side: str,
+    maneuver: str,
+    map_path: str = MAP_FILE,
+) -> float:
+    """
+    Distance (cm) between the model's final position for candidate
+    ``index`` and SimRobobo's after driving the same phases from ``start``.
+    """
+    one = Candidates(
+        *(
+            values[index : index + 1]
+            for values in (
+                candidates.fast,
+                candidates.slow,
+                candidates.duration,
+                candidates.straight,
+            )
+        )
+    )
+    phases = entry_phases(one, side, maneuver)
+    robot = SimRobobo(map_path, clock=VirtualClock(start=0.0))
+    robot.x, robot.y, robot.heading = start
+    for right, left, duration in phases:
+        robot.moveWheelsByTime(float(right[0]), float(left[0]), float(duration[0]), True)
+    robot.stopMotors()  # Integrates the last phase
+    xs, ys, _ = simulate(phases, start)
+    return math.hypot(robot.x - xs[0, -1], robot.y - ys[0, -1])
+
+
+def rank(results: dict) -> np.ndarray:
+    """Candidate indices, collision-free first, then by score."""
+    return np.lexsort((results["score"], results["collides"]))
+
+
+def turning_time(speed: float, angle: float = math.pi) -> float:
+    """Seconds of moveWheelsByTime(-speed, speed) that turn the robot by ``angle``."""
+    return angle * WHEEL_BASE_CM / (2 * speed * WHEEL_CM_PER_SPEED)
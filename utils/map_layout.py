@@ -0,0 +1,170 @@
+#
+# Loader for RoboboSIM map files (map.json).
+# Converts the grid-based description of walls, QR codes, signs and
+# spawners into plain geometry in centimetres, shared by the simulator
+# and any map-aware feature.
+#
+
+import json
+import math
+from dataclasses import dataclass
+
+from utils.config import MAP_CELL_SIZE_CM, MAP_FILE
+
+# Map PropertyValue of SIGNINFO elements to the QR id they carry
+SIGN_QR_IDS = {"ROTONDA_QR": "rotonda"}
+
+
+@dataclass
+class Wall:
+    # Axis-aligned rectangle in cm (x_min, y_min, x_max, y_max)
+    x_min: float
+    y_min: float
+    x_max: float
+    y_max: float
+    height: int
+
+
+@dataclass
+class Marker:
+    id: str  # QR id as returned by readQR()
+    x: float  # cm
+    y: float  # cm
+    rotation: int  # degrees, map convention (0 faces +y, 90 faces +x)
+    tier: int
+
+    @property
+    def normal(self) -> tuple:
+        """Unit vector the marker faces."""
+        return rotation_to_vector(self.rotation)
+
+
+@dataclass
+class Spawner:
+    x: float  # cm
+    y: float  # cm
+    rotation: int  # degrees, map convention
+    robot: str | None  # Robot model placed there, None for an empty spawner
+
+
+def rotation_to_vector(rotation: float) -> tuple:
+    """Map rotations are clockwise from +y: 0 -> +y, 90 -> +x, 270 -> -x."""
+    rad = math.radians(rotation)
+    return (math.sin(rad), math.cos(rad))
+
+
+def rotation_to_heading(rotation: float) -> float:
+    """Convert a map rotation to a heading in radians (counter-clockwise from +x)."""
+    dx, dy = rotation_to_vector(rotation)
+    return math.atan2(dy, dx)
+
+
+class MapLayout:
+    """
+    Geometry of a parking lot loaded from a RoboboSIM map file.
+
+    Wall Coords are [x1, y1, x2, y2] in grid cells: the wall starts at
+    (x1, y1) and runs along its Rotation for max(|x2 - x1|, |y2 - y1|)
+    cells, one cell thick.
+    """
+
+    def __init__(
+        self,
+        walls: list[Wall],
+        qr_markers: list[Marker],
+        signs: list[Marker],
+        spawners: list[Spawner],
+        floor_size: tuple,
+        cell_size: float = MAP_CELL_SIZE_CM,
+    ):
+        self.walls = walls
+        self.qr_markers = qr_markers
+        self.signs = signs
+        self.spawners = spawners
+        self.floor_size = floor_size  # (width, height) in cm
+        self.cell_size = cell_size
+
+    @classmethod
+    def load(cls, path: str = MAP_FILE, cell_size: float = MAP_CELL_SIZE_CM):
+        with open(path) as f:
+            data = json.load(f)
+        return cls.from_dict(data, cell_size)
+
+    @classmethod
+    def from_dict(cls, data: dict, cell_size: float = MAP_CELL_SIZE_CM):
+        walls = []
+        for element in data.get("TerrainElements", []):
+            if element.get("Id") != "WALL":
+                continue
+            x1, y1, x2, y2 = element["Coords"]
+            length = max(abs(x2 - x1), abs(y2 - y1))
+            dx, dy = rotation_to_vector(element.get("Rotation", 0))
+            end_x, end_y = x1 + round(dx) * length, y1 + round(dy) * length
+            walls.append(
+                Wall(
+                    x_min=(min(x1, end_x) - 0.5) * cell_size,
+                    y_min=(min(y1, end_y) - 0.5) * cell_size,
+                    x_max=(max(x1, end_x) + 0.5) * cell_size,
+                    y_max=(max(y1, end_y) + 0.5) * cell_size,
+                    height=element.get("Height", 0),
+                )
+            )
+
+        qr_markers = []
+        signs = []
+        for element in data.get("WorldObjectElements", []):
+            x, y = element["Coords"]
+            value = element.get("PropertyValue")
+            if element.get("Id") == "QR":
+                target = qr_markers
+                marker_id = str(value)
+            elif element.get("Id") == "SIGNINFO" and value in SIGN_QR_IDS:
+                target = signs
+                marker_id = SIGN_QR_IDS[value]
+            else:
+                continue
+            target.append(
+                Marker(
+                    id=marker_id,
+                    x=x * cell_size,
+                    y=y * cell_size,
+                    rotation=element.get("Rotation", 0),
+                    tier=element.get("Tier", 0),
+                )
+            )
+
+        spawners = [
+            Spawner(
+                x=element["Coords"][0] * cell_size,
+                y=element["Coords"][1] * cell_size,
+                rotation=element.get("Rotation", 0),
+                robot=element.get("Robot"),
+            )
+            for element in data.get("SpawnerElements", [])
+        ]
+
+        width, height = data.get("FloorSize", [0, 0])
+        return cls(
+            walls,
+            qr_markers,
+            signs,
+            spawners,
+            (width * cell_size, height * cell_size),
+            cell_size,
+        )
+
+    def bounds(self) -> tuple:
+        """Bounding box (x_min, y_min, x_max, y_max) of all walls in cm."""
+        return (
+            min(wall.x_min for wall in self.walls),
+            min(wall.y_min for wall in self.walls),
+            max(wall.x_max for wall in self.walls),
+            max(wall.y_max for wall in self.walls),
+        )
+
+    def find_qr(self, qr_id: str) -> Marker | None:
+        """Return the first QR marker with the given id."""
+        for marker in self.qr_markers:
+            if marker.id == qr_id:
+                return marker
+        return None
@@ -0,0 +1,128 @@
+#
+# Map prior for the scan: which spots the robot should pass, on which side
+# and after how many centimetres, computed from the QR layout in map.json.
+# ScanSpots follows a ScanSchedule instead of driving until it has seen
+# max_spots QRs.
+#
+
+import math
+from dataclasses import dataclass
+
+from utils.config import (
+    CAMERA_HALF_FOV_DEG,
+    QR_DETECTION_RANGE_CM,
+    SCAN_WINDOW_MARGIN_CM,
+)
+from utils.map_layout import MapLayout, rotation_to_vector
+
+
+@dataclass
+class ExpectedSpot:
+    id: str
+    side: str  # 'left' or 'right' of the scan path
+    along: float  # cm travelled from the start when the QR is abeam
+    lateral: float  # cm between the path and the QR
+
+    def window(self, margin: float = SCAN_WINDOW_MARGIN_CM) -> tuple:
+        """Travelled distances (start, end) during which the QR should be in view."""
+        reach = self.lateral * math.tan(math.radians(CAMERA_HALF_FOV_DEG)) + margin
+        return (self.along - reach, self.along + reach)
+
+
+def expected_spots(
+    layout: MapLayout,
+    spawner_index: int = 0,
+    max_lateral: float = QR_DETECTION_RANGE_CM,
+) -> list[ExpectedSpot]:
+    """
+    Spots whose QR lies ahead of the robot's spawner, within camera range of
+    its straight path, in the order the robot passes them.
+    """
+    spawner = layout.spawners[spawner_index]
+    hx, hy = rotation_to_vector(spawner.rotation)
+    by_id: dict[str, ExpectedSpot] = {}
+    for marker in layout.qr_markers:
+        dx, dy = marker.x - spawner.x, marker.y - spawner.y
+        along = dx * hx + dy * hy
+        left = hx * dy - hy * dx  # Positive when the QR is to the left
+        if along <= 0 or abs(left) > max_lateral:
+            continue
+        spot = ExpectedSpot(
+            id=marker.id,
+            side="left" if left > 0 else "right",
+            along=round(along, 6),
+            lateral=round(abs(left), 6),
+        )
+        # Markers repeated for the same spot: keep the one nearest the path
+        current = by_id.get(marker.id)
+        if current is None or spot.lateral < current.lateral:
+            by_id[marker.id] = spot
+    return sorted(by_id.values(), key=lambda spot: (spot.along, spot.id))
+
+
+class ScanSchedule:
+    """
+    Tracks which expected spots have been seen against the distance
+    travelled, to choose the camera side and speed and to end the scan.
+    """
+
+    def __init__(
+        self, spots: list[ExpectedSpot], margin: float = SCAN_WINDOW_MARGIN_CM
+    ):
+        self.spots = spots
+        self.margin = margin
+        self._by_id = {spot.id: spot for spot in spots}
+        self._windows = {spot.id: spot.window(margin) for spot in spots}
+        self.seen: set[str] = set()
+
+    def side_of(self, spot_id: str) -> str | None:
+        spot = self._by_id.get(spot_id)
+        return spot.side if spot else None
+
+    def mark_seen(self, spot_id: str):
+        if spot_id in self._by_id:
+            self.seen.add(spot_id)
+
+    def active(self, travelled: float) -> list[ExpectedSpot]:
+        """Unseen spots whose QR should be in view now, nearest first."""
+        return [
+            spot
+            for spot in self.spots
+            if spot.id not in self.seen
+            and self._windows[spot.id][0] <= travelled <= self._windows[spot.id][1]
+        ]
+
+    def expected_sides(self, travelled: float) -> list[str]:
+        """
+        Sides of the unseen spots in view now or, when there are none, the
+        side of the next one ahead (empty once nothing is left to see).
+        """
+        sides = []
+        for spot in self.active(travelled):
+            if spot.side not in sides:
+                sides.append(spot.side)
+        if sides:
+            return sides
+        for spot in self.spots:
+            if spot.id not in self.seen and self._windows[spot.id][0] > travelled:
+                return [spot.side]
+        return []
+
+    def in_gap(self, travelled: float) -> bool:
+        """True when no unseen QR can be in view, so the robot may drive faster."""
+        return not self.active(travelled)
+
+    def missed(self, travelled: float) -> list[str]:
+        """Unseen spots whose window has already been passed."""
+        return [
+            spot.id
+            for spot in self.spots
+            if spot.id not in self.seen and self._windows[spot.id][1] < travelled
+        ]
+
+    def done(self, travelled: float) -> bool:
+        """Every expected spot was seen, or the last window is behind us."""
+        return all(
+            spot.id in self.seen or self._windows[spot.id][1] < travelled
+            for spot in self.spots
+        )
@@ -0,0 +1,195 @@
+#
+# In-process counters and latency histograms for the hot paths: behavior
+# arbitration, executor reaction times and every robot call.
+# Query them with stats(); main.py dumps them at the end of each mission.
+#
+
+import math
+import threading
+import time
+
+from utils.clock import Clock, RealClock
+
+# Histogram buckets grow by 2^(1/4) (~19%) from 1 microsecond upwards
+_BUCKET_BASE = 2 ** 0.25
+_BUCKET_MIN = 1e-6
+_LOG_BASE = math.log(_BUCKET_BASE)
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.count += amount
+
+
+class Histogram:
+    """
+    Log-bucketed histogram of durations in seconds. Memory stays constant
+    whatever the number of samples; percentiles are accurate to one
+    bucket (~19%).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float):
+        index = 0
+        if value > _BUCKET_MIN:
+            index = int(math.log(value / _BUCKET_MIN) / _LOG_BASE) + 1
+        with self._lock:
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile (p in 0..100)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(math.ceil(p / 100 * self.count), 1)
+            seen = 0
+            for index in sorted(self._buckets):
+                seen += self._buckets[index]
+                if seen >= rank:
+                    upper = _BUCKET_MIN * _BUCKET_BASE**index
+                    return min(upper, self.max)
+            return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """Registry of named counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, Counter] = {}
+        self._histograms: dict[str, Histogram] = {}
+        self.clock: Clock = RealClock()
+        self._started = self.clock.now()
+
+    def reset(self, clock: Clock | None = None):
+        """Drop every metric and start measuring rates on ``clock``."""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self.clock = clock or self.clock
+            self._started = self.clock.now()
+
+    def counter(self, name: str) -> Counter:
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def stats(self) -> dict:
+        """
+        Snapshot of every metric: counters with their rate per clock second,
+        histograms with count, mean, min, p50, p95, p99 and max.
+        """
+        elapsed = max(self.clock.now() - self._started, 1e-9)
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        return {
+            "elapsed": elapsed,
+            "counters": {
+                name: {"count": c.count, "rate": c.count / elapsed}
+                for name, c in sorted(counters.items())
+            },
+            "histograms": {
+                name: h.summary() for name, h in sorted(histograms.items())
+            },
+        }
+
+    def dump(self):
+        """Print every metric as a table."""
+        stats = self.stats()
+        print("\n" + "=" * 78)
+        print(f"  METRICS ({stats['elapsed']:.1f}s of mission time)")
+        print("=" * 78)
+        for name, counter in stats["counters"].items():
+            print(f"{name:<40} {counter['count']:>10} {counter['rate']:>10.1f}/s")
+        if stats["histograms"]:
+            print("-" * 78)
+            print(
+                f"{'Histogram':<34} {'n':>7} {'mean':>8} {'p50':>8} {'p95':>8}"
+                f" {'max':>8}"
+            )
+        for name, h in stats["histograms"].items():
+            print(
+                f"{name:<34} {h['count']:>7} {_duration(h['mean'])}"
+                f" {_duration(h['p50'])} {_duration(h['p95'])} {_duration(h['max'])}"
+            )
+        print("=" * 78 + "\n")
+
+
+def _duration(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:>7.2f}s"
+    return f"{seconds * 1000:>6.1f}ms"
+
+
+class InstrumentedRobot:
+    """
+    Robot proxy that measures the wall-clock latency of every call into a
+    ``robot.<method>`` histogram.
+    """
+
+    def __init__(self, robot, registry: Metrics | None = None):
+        self._robot = robot
+        self._registry = registry or metrics
+
+    def __getattr__(self, name):
+        attribute = getattr(self._robot, name)
+        if not callable(attribute):
+            return attribute
+        histogram = self._registry.histogram(f"robot.{name}")
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+
+# Process-wide registry used by the behaviors, the executor and main
+metrics = Metrics()
+
+
+def stats() -> dict:
+    """Snapshot of the process-wide metrics."""
+    return metrics.stats()
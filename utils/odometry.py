@@ -0,0 +1,60 @@
+#
+# Wheel odometry: dead-reckoned robot pose in map coordinates, integrated
+# from the wheel encoder readings of the sensor snapshots. The grid route
+# planner starts its routes from this pose.
+#
+
+import math
+import threading
+
+from utils.config import WHEEL_BASE_CM, WHEEL_RADIUS_CM
+from utils.map_layout import Spawner, rotation_to_heading
+
+
+def wheel_travel_cm(degrees: float) -> float:
+    """Distance rolled by a wheel that turned ``degrees``."""
+    return math.radians(degrees) * WHEEL_RADIUS_CM
+
+
+def wrap_angle(angle: float) -> float:
+    """Wrap an angle in radians to [-pi, pi)."""
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+class Odometry:
+    """
+    Pose (x, y in cm, heading in radians counter-clockwise from +x) updated
+    from successive (right, left) wheel positions in degrees. The first
+    reading only sets the reference, so the pose starts where it was placed.
+    """
+
+    def __init__(self, x: float = 0.0, y: float = 0.0, heading: float = 0.0):
+        self._lock = threading.Lock()
+        self.x = x
+        self.y = y
+        self.heading = heading
+        self._last_wheels: tuple | None = None
+
+    @classmethod
+    def from_spawner(cls, spawner: Spawner) -> "Odometry":
+        return cls(spawner.x, spawner.y, rotation_to_heading(spawner.rotation))
+
+    def update(self, wheels: tuple):
+        with self._lock:
+            last, self._last_wheels = self._last_wheels, wheels
+            if last is None:
+                return
+            d_r = wheel_travel_cm(wheels[0] - last[0])
+            d_l = wheel_travel_cm(wheels[1] - last[1])
+            distance = (d_r + d_l) / 2
+            turn = (d_r - d_l) / WHEEL_BASE_CM
+            # Midpoint integration: move along the average heading of the step
+            mid = self.heading + turn / 2
+            self.x += distance * math.cos(mid)
+            self.y += distance * math.sin(mid)
+            self.heading = wrap_angle(self.heading + turn)
+
+    def pose(self) -> tuple:
+        """Current (x, y, heading)."""
+        with self._lock:
+            return (self.x, self.y, self.heading)
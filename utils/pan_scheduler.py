@@ -0,0 +1,136 @@
+#
+# Camera pan scheduling for the scan.
+# A QR beside the path stays in view for about PAN_VISIBLE_CM of driving,
+# so each side has to be looked at at least once per that stretch. The
+# scheduler keeps the camera where it is until the other side is about to
+# run out of that slack (few pan moves, few frames lost while panning),
+# and looks where the map expects a spot when there is a map prior.
+#
+
+import math
+
+from utils import telemetry
+from utils.clock import Clock
+from utils.config import (
+    OCCUPANCY_PAN_TOLERANCE,
+    PAN_CENTER,
+    PAN_LEFT,
+    PAN_RIGHT,
+    PAN_SWITCH_TIME,
+    PAN_VISIBLE_CM,
+)
+from utils.metrics import metrics
+
+SIDE_ANGLES = {"left": PAN_LEFT, "right": PAN_RIGHT}
+
+
+def side_of_pan(pan: float) -> str:
+    """Side the camera faces at ``pan`` (positive pans look right)."""
+    return "left" if pan < 0 else "right"
+
+
+def faces_side(pan: float, tolerance: float = OCCUPANCY_PAN_TOLERANCE) -> bool:
+    """False while the camera still looks ahead, so its side is unknown."""
+    return abs(pan - PAN_CENTER) > tolerance
+
+
+class PanScheduler:
+    """
+    Decides which side the scan camera should face from the robot speed,
+    the time since each side was last in view and, when given, the sides
+    where spots are expected. Also counts the new QRs found per side and
+    per second of driving.
+    """
+
+    def __init__(
+        self,
+        clock: Clock,
+        visible_cm: float = PAN_VISIBLE_CM,
+        switch_time: float = PAN_SWITCH_TIME,
+        tolerance: float = OCCUPANCY_PAN_TOLERANCE,
+    ):
+        self.clock = clock
+        self.visible_cm = visible_cm
+        self.switch_time = switch_time
+        self.tolerance = tolerance
+        now = clock.now()
+        self.last_observed = {"left": now, "right": now}
+        self.side: str | None = None  # Side the camera was last sent to
+        self.switches = 0
+        self.detections = {"left": 0, "right": 0}
+        self.driving_time = 0.0  # Seconds spent moving
+        self._last_update = now
+        self._last_detection = 0.0  # driving_time of the previous detection
+
+    def observe(self, pan: float, speed: float):
+        """
+        Account for one camera frame taken at ``pan`` while driving at
+        ``speed`` cm/s.
+        """
+        now = self.clock.now()
+        if speed > 0:
+            self.driving_time += now - self._last_update
+        self._last_update = now
+        for side, angle in SIDE_ANGLES.items():
+            if abs(pan - angle) <= self.tolerance:
+                self.last_observed[side] = now
+
+    def slack(self, side: str, speed: float) -> float:
+        """Seconds until a QR on ``side`` could pass without being in view."""
+        if speed <= 0:
+            return math.inf
+        unobserved = self.clock.now() - self.last_observed[side]
+        return self.visible_cm / speed - unobserved
+
+    def choose(self, speed: float, expected: list[str] | None = None) -> str:
+        """
+        Side to look at now. ``expected`` restricts the choice to the sides
+        where the map expects a spot to be in view.
+        """
+        candidates = expected or ["left", "right"]
+        if self.side not in candidates:
+            side = min(candidates, key=lambda s: self.slack(s, speed))
+        else:
+            side = self.side
+            others = [s for s in candidates if s != side]
+            # Go to the other side only when it cannot wait any longer
+            if others and self.slack(others[0], speed) <= self.switch_time:
+                side = others[0]
+        if side != self.side:
+            if self.side is not None:
+                self.switches += 1
+                metrics.counter("scan.pan_switches").inc()
+            self.side = side
+        return side
+
+    def record_detection(self, side: str):
+        """A new spot QR was read while looking at ``side``."""
+        self.detections[side] += 1
+        metrics.counter(f"scan.detections.{side}").inc()
+        # Driving time between consecutive new QRs
+        metrics.histogram("scan.detection_gap").observe(
+            self.driving_time - self._last_detection
+        )
+        self._last_detection = self.driving_time
+
+    def stats(self) -> dict:
+        found = sum(self.detections.values())
+        return {
+            "detections": dict(self.detections),
+            "driving_time": self.driving_time,
+            "detections_per_minute": (
+                60 * found / self.driving_time if self.driving_time else 0.0
+            ),
+            "pan_switches": self.switches,
+        }
+
+    def report(self):
+        stats = self.stats()
+        telemetry.info(
+            f"[PanScheduler] {sum(stats['detections'].values())} new QRs"
+            f" ({stats['detections']['left']} left, {stats['detections']['right']} right)"
+            f" in {stats['driving_time']:.1f}s of driving"
+            f" ({stats['detections_per_minute']:.1f}/min),"
+            f" {stats['pan_switches']} pan switches"
+        )
+        telemetry.record("scan_stats", **stats)
@@ -0,0 +1,93 @@
+#
+# Closed-loop parking entry.
+# The entry is a smooth S-shaped path from the pose abeam the QR to the
+# middle of the stall, followed with pure pursuit on the wheel odometry,
+# then an in-place turn back to the lane heading. Parking runs one step
+# per sensor hub frame, with the IR sensors as a stop on the way in.
+#
+
+import math
+from dataclasses import dataclass
+
+from utils.config import (
+    PARKING_LOOKAHEAD_CM,
+    PARKING_MAX_WHEEL_SPEED,
+    STALL_DEPTH_CM,
+    STALL_LENGTH_CM,
+    WHEEL_BASE_CM,
+    WHEEL_CM_PER_SPEED,
+)
+
+ALIGN_GAIN = 0.5  # Wheel speed per degree of heading error when aligning
+
+
+@dataclass
+class EntryPath:
+    """
+    Path in the robot frame at the start of the entry (x ahead, y to the
+    left): from (0, 0) to (along, lateral) with zero slope at both ends.
+    """
+
+    along: float  # cm, negative behind the robot (reverse entry)
+    lateral: float  # cm, positive to the left
+
+    def y_at(self, x: float) -> float:
+        u = min(max(x / self.along, 0.0), 1.0)
+        return self.lateral * (3 * u**2 - 2 * u**3)  # Smoothstep
+
+    def remaining(self, x: float) -> float:
+        """Distance along the lane axis still to go."""
+        return abs(self.along) - x * math.copysign(1.0, self.along)
+
+
+def entry_path(side: str, maneuver: str, standoff: float) -> EntryPath:
+    """
+    Path into the stall beside the QR the robot is abeam of, ``standoff``
+    cm away: behind it for "reverse", ahead of it for "forward".
+    """
+    along = STALL_LENGTH_CM / 2 * (-1 if maneuver == "reverse" else 1)
+    lateral = (standoff + STALL_DEPTH_CM / 2) * (1 if side == "left" else -1)
+    return EntryPath(along, lateral)
+
+
+def _limit(right: float, left: float, max_speed: float) -> tuple:
+    # Scale both wheels together so the curvature is kept
+    largest = max(abs(right), abs(left))
+    if largest > max_speed:
+        right, left = right * max_speed / largest, left * max_speed / largest
+    return right, left
+
+
+def pursuit_speeds(
+    pose: tuple,
+    path: EntryPath,
+    speed: float,
+    lookahead: float = PARKING_LOOKAHEAD_CM,
+    max_speed: float = PARKING_MAX_WHEEL_SPEED,
+) -> tuple:
+    """
+    (right, left) wheel speeds that steer the robot at ``pose`` (x, y,
+    heading in the path frame) toward the point ``lookahead`` cm further
+    along the path, driving backwards when the path goes behind.
+    """
+    x, y, heading = pose
+    direction = math.copysign(1.0, path.along)
+    target_x = x + direction * lookahead
+    target_y = path.y_at(target_x)
+    # Target in the robot frame
+    dx, dy = target_x - x, target_y - y
+    ahead = math.cos(heading) * dx + math.sin(heading) * dy
+    left = -math.sin(heading) * dx + math.cos(heading) * dy
+    curvature = 2 * left / max(ahead**2 + left**2, 1e-6)
+    v = direction * speed * WHEEL_CM_PER_SPEED  # cm/s
+    omega = direction * abs(v) * curvature  # Reversing mirrors the steering
+    v_r = (v + omega * WHEEL_BASE_CM / 2) / WHEEL_CM_PER_SPEED
+    v_l = (v - omega * WHEEL_BASE_CM / 2) / WHEEL_CM_PER_SPEED
+    return _limit(v_r, v_l, max_speed)
+
+
+def align_speeds(heading_error: float, max_speed: float) -> tuple:
+    """(right, left) wheel speeds that turn in place to cancel ``heading_error`` (rad)."""
+    turn = ALIGN_GAIN * math.degrees(heading_error)
+    turn = math.copysign(min(max(abs(turn), 1.0), max_speed), turn)
+    return turn, -turn
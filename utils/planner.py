@@ -1,5 +1,6 @@
 from typing import Any, Optional
 
+from utils.grid_planner import Route
 from utils.state import StateManager
 
 
@@ -33,7 +34,11 @@ class Plan:
         if 0 <= self.current_step_index < len(self.steps):
             self.steps[self.current_step_index]["status"] = "failed"
             self.steps[self.current_step_index]["completed"] = True
-            if reason:
+            self.steps[self.current_step_index]["failures"] = (
+                self.steps[self.current_step_index].get("failures", 0) + 1
+            )
+            # A retried step keeps the reason it first failed for
+            if reason and "failure_reason" not in self.steps[self.current_step_index]:
                 self.steps[self.current_step_index]["failure_reason"] = reason
 
     def is_complete(self) -> bool:
@@ -46,7 +51,8 @@ class Plan:
 class ParkingPlanner:
 
     @staticmethod
-    def create_scan_plan() -> Plan:
+    def create_scan_plan(scan: bool = True) -> Plan:
+        """``scan`` False skips straight to the spot choice (spots already known)."""
         steps = [
             {
                 "action": "scan_spots",
@@ -61,15 +67,34 @@ class ParkingPlanner:
                 "completed": False,
             },
         ]
+        if not scan:
+            steps = steps[1:]
 
         return Plan(steps)
 
     @staticmethod
-    def create_parking_plan(target_spot_id: str) -> Plan:
-        steps = [
+    def create_parking_plan(target_spot_id: str, route: Route | None = None) -> Plan:
+        """
+        With a ``route`` (grid route mode) the robot first drives it, then
+        finds the QR from close by without the periodic rotonda check.
+        """
+        find_params = {"target_spot_id": target_spot_id}
+        route_steps = []
+        if route is not None:
+            find_params["rotonda_check"] = False
+            route_steps = [
+                {
+                    "action": step["action"],
+                    "params": step["params"],
+                    "status": "pending",  # "pending", "in_progress", "completed", "failed"
+                    "completed": False,
+                }
+                for step in route.steps
+            ]
+        steps = route_steps + [
             {
                 "action": "find_spot_qr",
-                "params": {"target_spot_id": target_spot_id},
+                "params": find_params,
                 "status": "pending",  # "pending", "in_progress", "completed", "failed"
                 "completed": False,
             },
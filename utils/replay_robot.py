@@ -0,0 +1,187 @@
+#
+# Replay backend: a Robobo stand-in that serves the sensor streams of a
+# recorded mission (telemetry JSONL) and checks that the behaviors issue the
+# same commands, on a VirtualClock so a replay runs as fast as the CPU allows.
+#
+
+import json
+from bisect import bisect_right
+from collections import deque
+
+from robobopy.utils.DetectedObject import DetectedObject
+from robobopy.utils.Orientation import Orientation
+from robobopy.utils.QRCode import QRCode
+
+from utils.clock import Clock, VirtualClock
+from utils.config import TELEMETRY_FILE
+from utils.state import Spot
+from utils.telemetry import plain_value
+
+
+class ReplayDivergence(Exception):
+    """Raised by verify() when the replayed commands differ from the recording."""
+
+
+def _decode_qr(value: dict) -> QRCode:
+    return QRCode(
+        value["x"],
+        value["y"],
+        value["distance"],
+        value["p1"]["x"],
+        value["p1"]["y"],
+        value["p2"]["x"],
+        value["p2"]["y"],
+        value["p3"]["x"],
+        value["p3"]["y"],
+        value["id"],
+        value["timestamp"],
+    )
+
+
+def _decode_object(value: dict) -> DetectedObject:
+    return DetectedObject(
+        value["x"],
+        value["y"],
+        value["width"],
+        value["height"],
+        value["confidence"],
+        value["label"],
+        value["timeStamp"],
+    )
+
+
+def _decode_orientation(value: dict) -> Orientation:
+    return Orientation(value["yaw"], value["pitch"], value["roll"])
+
+
+# Rebuild the robobopy objects returned by these reads
+_DECODERS = {
+    "readQR": _decode_qr,
+    "readDetectedObject": _decode_object,
+    "readOrientationSensor": _decode_orientation,
+}
+
+
+def _decode_spot(value: dict) -> Spot:
+    return Spot(**{**value, "position": tuple(value["position"])})
+
+
+def _call_key(method: str, args) -> tuple:
+    return (method, json.dumps(plain_value(list(args))))
+
+
+class ReplayRobobo:
+    """
+    Serves every ``read*`` call with the value recorded for the same method
+    and arguments at the current clock time (the latest sample not newer
+    than now), so timed loops see the stream they saw on the robot.
+
+    Commands are matched in order per method against the recording. Each
+    command returns at the clock time the recorded one completed, which
+    reproduces blocking moves and speech; mismatches are collected in
+    ``divergences`` rather than raised, so the mission runs to the end.
+
+    ``cached_spots`` and ``skip_scan`` give the spots the recorded mission
+    loaded from its spot cache and whether they let it skip the scan, so
+    the replay starts from the same state (None for recordings without
+    them).
+    """
+
+    def __init__(self, path: str = TELEMETRY_FILE, clock: Clock | None = None):
+        self.path = path
+        self._reads: dict[tuple, tuple[list, list]] = {}
+        self._commands: dict[str, deque] = {}
+        self.spot_choice = None  # Spot selected during the recorded mission
+        self.cached_spots: list[Spot] | None = None
+        self.skip_scan: bool | None = None
+        start = None
+        choice_recorded = False
+
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                kind = entry["kind"]
+                if start is None:
+                    start = entry["t"]
+                if kind == "read":
+                    times, values = self._reads.setdefault(
+                        (entry["method"], json.dumps(entry["args"])), ([], [])
+                    )
+                    times.append(entry["t"])
+                    values.append(entry["result"])
+                elif kind == "command":
+                    self._commands.setdefault(entry["method"], deque()).append(entry)
+                elif kind == "mission":
+                    self.cached_spots = [_decode_spot(s) for s in entry["cached_spots"]]
+                    self.skip_scan = entry["skip_scan"]
+                elif kind == "spot_choice" and not choice_recorded:
+                    # The first answer, even one the mission rejected
+                    self.spot_choice = entry["choice"]
+                    choice_recorded = True
+                elif kind == "state" and entry["key"] == "target_spot":
+                    # Recordings without the answers: the spot parked in
+                    if entry["value"] is not None and not choice_recorded:
+                        self.spot_choice = entry["value"]
+
+        self.clock = clock or VirtualClock(start=start)
+        self.commands_matched = 0
+        self.divergences: list[str] = []
+
+    def __getattr__(self, name):
+        # Any robot method not defined here is either a read or a command
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name.startswith("read"):
+            return lambda *args: self._read(name, args)
+        return lambda *args, **kwargs: self._command(name, args, kwargs)
+
+    def _read(self, method: str, args):
+        stream = self._reads.get(_call_key(method, args))
+        if stream is None:
+            self.divergences.append(f"read {method}{args} was never recorded")
+            return None
+        times, values = stream
+        index = max(bisect_right(times, self.clock.now()) - 1, 0)
+        value = values[index]
+        decoder = _DECODERS.get(method)
+        return decoder(value) if decoder and value is not None else value
+
+    def _command(self, method: str, args, kwargs):
+        now = self.clock.now()
+        expected = self._commands.get(method)
+        if not expected:
+            self.divergences.append(f"{now:.2f}: unexpected {method}{args}")
+            return None
+        entry = expected.popleft()
+        actual_args = plain_value(list(args))
+        actual_kwargs = plain_value(kwargs)
+        if actual_args != entry["args"] or actual_kwargs != entry.get("kwargs", {}):
+            self.divergences.append(
+                f"{now:.2f}: {method} called with {actual_args} {actual_kwargs},"
+                f" recorded {entry['args']} {entry.get('kwargs', {})}"
+            )
+        else:
+            self.commands_matched += 1
+        # Finish when the recorded call did (blocking moves, speech)
+        self.clock.sleep(entry["t"] - now)
+        return None
+
+    def remaining_commands(self) -> list[str]:
+        """Recorded commands the replay never issued."""
+        return [
+            f"{entry['t']:.2f}: {method}{tuple(entry['args'])}"
+            for method, entries in self._commands.items()
+            for entry in entries
+        ]
+
+    def verify(self):
+        """Raise ReplayDivergence unless the replay issued the recorded commands."""
+        problems = self.divergences + [
+            f"missing {command}" for command in self.remaining_commands()
+        ]
+        print(
+            f"[Replay] {self.commands_matched} commands matched,"
+            f" {len(problems)} divergences"
+        )
+        if problems:
+            raise ReplayDivergence("\n".join(problems[:20]))
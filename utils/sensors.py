@@ -0,0 +1,183 @@
+#
+# Central sensor sampling hub.
+# A single thread reads QR, IR, pan/tilt, detected object and wheel
+# encoders at a fixed rate into a timestamped ring buffer, so every behavior
+# consumes the same frame instead of polling the robot on its own.
+# Only the sensors a behavior in control has asked for are read, and
+# nothing is read while no behavior is in control.
+#
+
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Thread
+
+from robobopy.Robobo import Robobo
+from robobopy.utils.DetectedObject import DetectedObject
+from robobopy.utils.IR import IR
+from robobopy.utils.QRCode import QRCode
+from robobopy.utils.Wheels import Wheels
+
+from utils.clock import Clock
+from utils.config import SENSOR_HISTORY_SIZE, SENSOR_SAMPLE_RATE
+from utils.odometry import Odometry
+
+# Snapshot fields a consumer can ask the hub to sample
+CHANNELS = ("qr", "irs", "pan", "tilt", "detected_object", "wheels")
+
+
+@dataclass
+class SensorSnapshot:
+    seq: int  # Increasing frame number
+    timestamp: float  # Clock time of the sample
+    qr: QRCode | None = None
+    irs: dict | None = None  # IR -> value
+    pan: int | None = None
+    tilt: int | None = None
+    detected_object: DetectedObject | None = None
+    wheels: tuple | None = None  # (right, left) wheel positions in degrees
+    channels: frozenset = frozenset(CHANNELS)  # Fields read in this frame
+
+    def covers(self, channels) -> bool:
+        """True when every field in ``channels`` was read in this frame."""
+        return self.channels.issuperset(channels)
+
+
+def read_snapshot(
+    robot: Robobo, clock: Clock, seq: int = 0, channels=CHANNELS
+) -> SensorSnapshot:
+    """Read the sensors in ``channels`` once; the other fields stay None."""
+    channels = frozenset(channels)
+    snapshot = SensorSnapshot(seq=seq, timestamp=clock.now(), channels=channels)
+    if "qr" in channels:
+        snapshot.qr = robot.readQR()
+    if "irs" in channels:
+        raw_irs = robot.readAllIRSensor() or {}
+        snapshot.irs = {sensor: int(raw_irs.get(sensor.value, 0)) for sensor in IR}
+    if "pan" in channels:
+        snapshot.pan = robot.readPanPosition()
+    if "tilt" in channels:
+        snapshot.tilt = robot.readTiltPosition()
+    if "detected_object" in channels:
+        snapshot.detected_object = robot.readDetectedObject()
+    if "wheels" in channels:
+        snapshot.wheels = (
+            robot.readWheelPosition(Wheels.R) or 0,
+            robot.readWheelPosition(Wheels.L) or 0,
+        )
+    return snapshot
+
+
+class SensorHub(Thread):
+    """
+    Samples the robot sensors every 1 / ``rate`` seconds and keeps the last
+    ``history`` snapshots. Consumers use ``latest()`` or block on
+    ``wait_next()`` for a frame newer than the one they already have.
+    Every frame also updates ``odometry`` when one is given, then calls
+    the listeners added with ``add_listener()``.
+
+    Only the channels requested through ``sampling()`` are read; while
+    nobody has requested any, the hub waits without reading. The wheel
+    encoders are always read when there is ``odometry`` to keep up to date.
+    """
+
+    def __init__(
+        self,
+        robot: Robobo,
+        clock: Clock,
+        rate: float = SENSOR_SAMPLE_RATE,
+        history: int = SENSOR_HISTORY_SIZE,
+        odometry: Odometry | None = None,
+    ):
+        super().__init__(name="SensorHub", daemon=True)
+        self.robot = robot
+        self.clock = clock
+        self.period = 1.0 / rate
+        self.odometry = odometry
+        self._buffer: deque[SensorSnapshot] = deque(maxlen=history)
+        self._new_frame = clock.condition()
+        self._demand_changed = clock.condition()
+        self._demand: Counter = Counter()  # Channel -> consumers sampling it
+        self._running = True
+        self._seq = 0
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call ``callback(snapshot)`` from the sampling thread after every frame."""
+        self._listeners.append(callback)
+
+    def start(self):
+        # Join the clock before running so virtual time waits for sampling
+        self.clock.register(self)
+        super().start()
+
+    def stop(self):
+        with self._demand_changed:
+            self._running = False
+            self._demand_changed.notify_all()
+
+    @contextmanager
+    def sampling(self, channels):
+        """Sample ``channels`` while the ``with`` block runs."""
+        channels = Counter(channels)
+        with self._demand_changed:
+            self._demand += channels
+            self._demand_changed.notify_all()
+        try:
+            yield self
+        finally:
+            with self._demand_changed:
+                self._demand -= channels
+
+    def run(self):
+        try:
+            while True:
+                with self._demand_changed:
+                    self._demand_changed.wait_for(
+                        lambda: self._demand or not self._running
+                    )
+                    if not self._running:
+                        break
+                    channels = set(self._demand)
+                if self.odometry is not None:
+                    channels.add("wheels")
+                self._seq += 1
+                snapshot = read_snapshot(self.robot, self.clock, self._seq, channels)
+                if self.odometry is not None:
+                    self.odometry.update(snapshot.wheels)
+                with self._new_frame:
+                    self._buffer.append(snapshot)
+                    self._new_frame.notify_all()
+                for callback in self._listeners:
+                    callback(snapshot)
+                self.clock.sleep(self.period)
+        finally:
+            self.clock.unregister(self)
+
+    def latest(self) -> SensorSnapshot | None:
+        """Most recent snapshot, or None before the first sample."""
+        with self._new_frame:
+            return self._buffer[-1] if self._buffer else None
+
+    def history(self, count: int | None = None) -> list[SensorSnapshot]:
+        """The last ``count`` snapshots (all buffered ones by default), oldest first."""
+        with self._new_frame:
+            frames = list(self._buffer)
+        return frames if count is None else frames[-count:]
+
+    def wait_next(
+        self, after_seq: int, timeout: float | None = None, channels=()
+    ) -> SensorSnapshot | None:
+        """
+        Block until a snapshot with ``seq > after_seq`` that covers
+        ``channels`` exists and return the newest one. On timeout the latest
+        (possibly older) snapshot is returned.
+        """
+        with self._new_frame:
+            self._new_frame.wait_for(
+                lambda: self._buffer
+                and self._buffer[-1].seq > after_seq
+                and self._buffer[-1].covers(channels),
+                timeout,
+            )
+            return self._buffer[-1] if self._buffer else None
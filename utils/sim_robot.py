@@ -0,0 +1,465 @@
+#
+# Headless stand-in for robobopy's Robobo, driven by the map.json geometry.
+# Integrates differential-drive kinematics from the wheel commands and
+# answers the QR, IR and object recognition sensors by ray casting against
+# the map, so the whole mission can run in-process without RoboboSIM.
+# Optional noise (QR distance error, wheel slip, start pose) is drawn from
+# a seeded generator, so a noisy run can be repeated with the same errors.
+#
+
+import math
+import random
+from dataclasses import dataclass
+from threading import RLock
+
+from robobopy.utils.DetectedObject import DetectedObject
+from robobopy.utils.IR import IR
+from robobopy.utils.Orientation import Orientation
+from robobopy.utils.QRCode import QRCode
+from robobopy.utils.Wheels import Wheels
+
+from utils.clock import Clock, VirtualClock
+from utils.config import (
+    MAP_FILE,
+    QR_DISTANCE_SCALE,
+    WHEEL_BASE_CM,
+    WHEEL_CM_PER_SPEED,
+    WHEEL_RADIUS_CM,
+)
+from utils.map_layout import MapLayout, rotation_to_heading
+
+# Camera model
+CAMERA_HALF_FOV = math.radians(30)
+IMAGE_WIDTH = 400  # px, FindQR treats x=200 as the image centre
+IMAGE_HEIGHT = 300  # px
+QR_MAX_RANGE_CM = 250
+QR_MAX_VIEW_ANGLE = math.radians(75)  # Beyond this the QR is seen too obliquely
+OBJECT_MAX_RANGE_CM = 150
+PARKED_ROBOT_RADIUS_CM = 8
+
+# Pan/tilt and speech model
+PAN_DEG_PER_SPEED = 1.6  # deg/s per unit of pan speed factor
+SPEECH_SECONDS_PER_CHAR = 0.06
+
+# IR model: value = IR_MAX * exp(-distance / IR_DECAY_CM), 0 beyond range
+IR_MAX = 1000
+IR_DECAY_CM = 4.0
+IR_MAX_RANGE_CM = 40
+# Sensor mount points relative to the robot centre: (forward cm, left cm, angle rad)
+IR_SENSORS = {
+    IR.FrontC: (8.0, 0.0, 0.0),
+    IR.FrontL: (7.5, 3.0, math.radians(20)),
+    IR.FrontLL: (6.5, 5.5, math.radians(60)),
+    IR.FrontR: (7.5, -3.0, math.radians(-20)),
+    IR.FrontRR: (6.5, -5.5, math.radians(-60)),
+    IR.BackC: (-8.0, 0.0, math.pi),
+    IR.BackL: (-7.5, 4.0, math.radians(150)),
+    IR.BackR: (-7.5, -4.0, math.radians(-150)),
+}
+
+
+@dataclass(frozen=True)
+class SimNoise:
+    """Standard deviations of the simulated errors; all zero is a perfect robot."""
+
+    qr_distance: float = 0.0  # Relative error of each QR distance reading
+    wheel_slip: float = 0.0  # Relative speed lost by each wheel, drawn per command
+    start_position: float = 0.0  # cm, around the spawner on each axis
+    start_heading: float = 0.0  # degrees
+
+
+def _wrap_angle(angle: float) -> float:
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+def _segment_hits_box(x0, y0, x1, y1, box) -> bool:
+    """
+    True if the segment (x0, y0) -> (x1, y1) enters the box from outside.
+    Boxes that contain the start point are ignored.
+    """
+    x_min, y_min, x_max, y_max = box
+    t_enter, t_exit = 0.0, 1.0
+    for start, delta, low, high in ((x0, x1 - x0, x_min, x_max), (y0, y1 - y0, y_min, y_max)):
+        if abs(delta) < 1e-12:
+            if start < low or start > high:
+                return False
+            continue
+        t_a, t_b = (low - start) / delta, (high - start) / delta
+        if t_a > t_b:
+            t_a, t_b = t_b, t_a
+        t_enter, t_exit = max(t_enter, t_a), min(t_exit, t_b)
+        if t_enter > t_exit:
+            return False
+    inside = x_min <= x0 <= x_max and y_min <= y0 <= y_max
+    return not inside
+
+
+def _ray_box_distance(x0, y0, angle, box, max_range) -> float:
+    """Distance along a ray to the box, or max_range if it is not hit."""
+    dx, dy = math.cos(angle), math.sin(angle)
+    x_min, y_min, x_max, y_max = box
+    t_enter, t_exit = 0.0, max_range
+    for start, delta, low, high in ((x0, dx, x_min, x_max), (y0, dy, y_min, y_max)):
+        if abs(delta) < 1e-12:
+            if start < low or start > high:
+                return max_range
+            continue
+        t_a, t_b = (low - start) / delta, (high - start) / delta
+        if t_a > t_b:
+            t_a, t_b = t_b, t_a
+        t_enter, t_exit = max(t_enter, t_a), min(t_exit, t_b)
+        if t_enter > t_exit:
+            return max_range
+    return t_enter
+
+
+def _ray_circle_distance(x0, y0, angle, cx, cy, radius, max_range) -> float:
+    dx, dy = math.cos(angle), math.sin(angle)
+    fx, fy = x0 - cx, y0 - cy
+    b = fx * dx + fy * dy
+    c = fx * fx + fy * fy - radius * radius
+    disc = b * b - c
+    if disc < 0:
+        return max_range
+    t = -b - math.sqrt(disc)
+    if t < 0:
+        return max_range
+    return min(t, max_range)
+
+
+class SimRobobo:
+    """
+    Headless simulator exposing the subset of the Robobo API used by the
+    behaviors. Time comes from ``clock`` (a VirtualClock by default, which
+    must be shared with the mission) and the robot pose is integrated
+    lazily on every call.
+
+    Map convention: x/y in cm, heading in radians counter-clockwise from +x.
+    Pan is positive to the right, as in utils/config.py (PAN_RIGHT = 90).
+    """
+
+    def __init__(
+        self,
+        map_path: str = MAP_FILE,
+        clock: Clock | None = None,
+        spawner_index: int = 0,
+        layout: MapLayout | None = None,
+        noise: SimNoise | None = None,
+        seed: int | None = None,
+    ):
+        self.layout = layout or MapLayout.load(map_path)
+        self.clock = clock or VirtualClock()
+        self._lock = RLock()
+        self.noise = noise or SimNoise()
+        self._rng = random.Random(seed)
+
+        spawner = self.layout.spawners[spawner_index]
+        self.x = spawner.x + self._gauss(self.noise.start_position)
+        self.y = spawner.y + self._gauss(self.noise.start_position)
+        self.heading = _wrap_angle(
+            rotation_to_heading(spawner.rotation)
+            + math.radians(self._gauss(self.noise.start_heading))
+        )
+        # Every other spawner with a robot model is a parked car
+        self.parked_robots = [
+            (s.x, s.y)
+            for i, s in enumerate(self.layout.spawners)
+            if i != spawner_index and s.robot is not None
+        ]
+        self._wall_boxes = [
+            (w.x_min, w.y_min, w.x_max, w.y_max) for w in self.layout.walls
+        ]
+
+        self._start = self.clock.now()
+        self._sim_time = 0.0
+        self._speed_r = 0.0
+        self._speed_l = 0.0
+        self._slip_r = self._slip_l = 1.0  # Share of each wheel's speed reaching the ground
+        self._wheels_until = math.inf  # Sim time at which the wheels stop
+        self.wheel_pos_r = 0.0  # deg
+        self.wheel_pos_l = 0.0  # deg
+
+        self.pan = 0.0
+        self._pan_target = 0.0
+        self._pan_speed = 0.0
+        self._pan_time = 0.0  # Sim time of the last pan update
+        self.tilt = 90.0
+
+        self.qr_tracking = False
+        self.object_recognition = False
+        self.spoken: list[str] = []
+
+    # ------------------------------------------------------------------
+    # Time and kinematics
+    # ------------------------------------------------------------------
+
+    def now(self) -> float:
+        """Seconds of simulated time since the robot was created."""
+        return self.clock.now() - self._start
+
+    def _sleep(self, seconds: float):
+        self.clock.sleep(seconds)
+
+    def _advance(self):
+        # Must be called with the lock held
+        now = self.now()
+        while self._sim_time < now:
+            end = min(now, self._wheels_until)
+            if end > self._sim_time:
+                self._integrate(end - self._sim_time)
+                self._sim_time = end
+            if self._sim_time >= self._wheels_until:
+                self._speed_r = self._speed_l = 0.0
+                self._wheels_until = math.inf
+        self._advance_pan(now)
+
+    def _gauss(self, sigma: float) -> float:
+        return self._rng.gauss(0.0, sigma) if sigma else 0.0
+
+    def _slip(self) -> float:
+        return 1.0 - min(abs(self._gauss(self.noise.wheel_slip)), 1.0)
+
+    def _integrate(self, dt: float):
+        v_r = self._speed_r * WHEEL_CM_PER_SPEED
+        v_l = self._speed_l * WHEEL_CM_PER_SPEED
+        # The pose moves at the ground speed; the encoders count the wheel turns
+        ground_r, ground_l = v_r * self._slip_r, v_l * self._slip_l
+        v = (ground_r + ground_l) / 2
+        omega = (ground_r - ground_l) / WHEEL_BASE_CM
+        if abs(omega) < 1e-9:
+            self.x += v * dt * math.cos(self.heading)
+            self.y += v * dt * math.sin(self.heading)
+        else:
+            new_heading = self.heading + omega * dt
+            radius = v / omega
+            self.x += radius * (math.sin(new_heading) - math.sin(self.heading))
+            self.y -= radius * (math.cos(new_heading) - math.cos(self.heading))
+            self.heading = _wrap_angle(new_heading)
+        self.wheel_pos_r += math.degrees(v_r * dt / WHEEL_RADIUS_CM)
+        self.wheel_pos_l += math.degrees(v_l * dt / WHEEL_RADIUS_CM)
+
+    def _advance_pan(self, now: float):
+        elapsed = now - self._pan_time
+        self._pan_time = now
+        step = self._pan_speed * PAN_DEG_PER_SPEED * elapsed
+        delta = self._pan_target - self.pan
+        self.pan = self._pan_target if abs(delta) <= step else self.pan + math.copysign(step, delta)
+
+    def _set_wheels(self, r_speed, l_speed, duration=math.inf):
+        with self._lock:
+            self._advance()
+            self._speed_r, self._speed_l = float(r_speed), float(l_speed)
+            self._slip_r, self._slip_l = self._slip(), self._slip()
+            self._wheels_until = self._sim_time + duration
+
+    # ------------------------------------------------------------------
+    # Connection and actuators
+    # ------------------------------------------------------------------
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def wait(self, seconds):
+        self._sleep(seconds)
+
+    def moveWheels(self, rSpeed, lSpeed):
+        self._set_wheels(rSpeed, lSpeed)
+
+    def moveWheelsByTime(self, rSpeed, lSpeed, duration, wait=True):
+        self._set_wheels(rSpeed, lSpeed, duration)
+        if wait:
+            self._sleep(duration)
+
+    def stopMotors(self):
+        self._set_wheels(0, 0)
+
+    def movePanTo(self, degrees, speed, wait=True):
+        with self._lock:
+            self._advance()
+            self._pan_target = max(-160.0, min(160.0, float(degrees)))
+            self._pan_speed = float(speed)
+            remaining = abs(self._pan_target - self.pan)
+        if wait and speed > 0:
+            self._sleep(remaining / (speed * PAN_DEG_PER_SPEED))
+
+    def moveTiltTo(self, degrees, speed, wait=True):
+        with self._lock:
+            self.tilt = max(5.0, min(105.0, float(degrees)))
+
+    def sayText(self, speech, wait=True):
+        with self._lock:
+            self.spoken.append(speech)
+        if wait:
+            self._sleep(len(speech) * SPEECH_SECONDS_PER_CHAR)
+
+    def startQrTracking(self):
+        self.qr_tracking = True
+
+    def stopQrTracking(self):
+        self.qr_tracking = False
+
+    def startObjectRecognition(self):
+        self.object_recognition = True
+
+    def stopObjectRecognition(self):
+        self.object_recognition = False
+
+    # ------------------------------------------------------------------
+    # Sensors
+    # ------------------------------------------------------------------
+
+    def readPanPosition(self):
+        with self._lock:
+            self._advance()
+            return round(self.pan)
+
+    def readTiltPosition(self):
+        return round(self.tilt)
+
+    def readOrientationSensor(self):
+        with self._lock:
+            self._advance()
+            return Orientation(math.degrees(self.heading), 0.0, 0.0)
+
+    def readWheelPosition(self, wheel):
+        with self._lock:
+            self._advance()
+            if wheel == Wheels.R:
+                return round(self.wheel_pos_r)
+            if wheel == Wheels.L:
+                return round(self.wheel_pos_l)
+            return 0
+
+    def readWheelSpeed(self, wheel):
+        with self._lock:
+            self._advance()
+            if wheel == Wheels.R:
+                return round(self._speed_r)
+            if wheel == Wheels.L:
+                return round(self._speed_l)
+            return 0
+
+    def readQR(self):
+        """Return the most centred visible QR, or an empty QR like robobopy after QRCODELOST."""
+        with self._lock:
+            self._advance()
+            if not self.qr_tracking:
+                return self._no_qr()
+            camera = self._camera_angle()
+            best = None
+            for marker in self.layout.qr_markers + self.layout.signs:
+                seen = self._see_point(marker.x, marker.y, camera, QR_MAX_RANGE_CM, 1.0)
+                if seen is None:
+                    continue
+                bearing, rng = seen
+                # The QR must face the camera
+                nx, ny = marker.normal
+                to_cam_x, to_cam_y = (self.x - marker.x) / rng, (self.y - marker.y) / rng
+                if nx * to_cam_x + ny * to_cam_y < math.cos(QR_MAX_VIEW_ANGLE):
+                    continue
+                if best is None or abs(bearing) < abs(best[1]):
+                    best = (marker, bearing, rng)
+            if best is None:
+                return self._no_qr()
+            marker, bearing, rng = best
+            x_px = IMAGE_WIDTH / 2 - bearing / CAMERA_HALF_FOV * IMAGE_WIDTH / 2
+            y_px = IMAGE_HEIGHT / 2
+            error = 1.0 + self._gauss(self.noise.qr_distance)
+            distance = int(max(QR_DISTANCE_SCALE / max(rng, 1.0) * error, 0.0))
+            half = max(2.0, distance * 0.03)
+            return QRCode(
+                x_px,
+                y_px,
+                distance,
+                x_px - half,
+                y_px + half,
+                x_px - half,
+                y_px - half,
+                x_px + half,
+                y_px - half,
+                marker.id,
+                int(self._sim_time * 1000),
+            )
+
+    def readIRSensor(self, id):
+        with self._lock:
+            self._advance()
+            return self._ir_value(id)
+
+    def readAllIRSensor(self):
+        with self._lock:
+            self._advance()
+            return {sensor.value: self._ir_value(sensor) for sensor in IR_SENSORS}
+
+    def readDetectedObject(self):
+        """Return the nearest parked robot in view, or an empty detection."""
+        with self._lock:
+            self._advance()
+            if not self.object_recognition:
+                return self._no_object()
+            camera = self._camera_angle()
+            best = None
+            for px, py in self.parked_robots:
+                seen = self._see_point(px, py, camera, OBJECT_MAX_RANGE_CM, PARKED_ROBOT_RADIUS_CM)
+                if seen is not None and (best is None or seen[1] < best[1]):
+                    best = seen
+            if best is None:
+                return self._no_object()
+            bearing, rng = best
+            x_px = IMAGE_WIDTH / 2 - bearing / CAMERA_HALF_FOV * IMAGE_WIDTH / 2
+            size = int(4000 / max(rng, 1.0))
+            return DetectedObject(
+                int(x_px), IMAGE_HEIGHT // 2, size, size, 0.9, "robobo",
+                int(self._sim_time * 1000),
+            )
+
+    # ------------------------------------------------------------------
+    # Geometry helpers (lock held)
+    # ------------------------------------------------------------------
+
+    def _camera_angle(self) -> float:
+        return self.heading - math.radians(self.pan)
+
+    def _see_point(self, px, py, camera, max_range, clearance):
+        """Return (bearing, range) if the point is in view and not behind a wall."""
+        dx, dy = px - self.x, py - self.y
+        rng = math.hypot(dx, dy)
+        if rng < 1e-6 or rng > max_range:
+            return None
+        bearing = _wrap_angle(math.atan2(dy, dx) - camera)
+        if abs(bearing) > CAMERA_HALF_FOV:
+            return None
+        # Stop the ray short of the target so its own mount does not occlude it
+        t = max(0.0, (rng - clearance - self.layout.cell_size * 0.6) / rng)
+        end_x, end_y = self.x + dx * t, self.y + dy * t
+        for box in self._wall_boxes:
+            if _segment_hits_box(self.x, self.y, end_x, end_y, box):
+                return None
+        return bearing, rng
+
+    def _ir_value(self, sensor) -> int:
+        forward, left, angle = IR_SENSORS[sensor]
+        cos_h, sin_h = math.cos(self.heading), math.sin(self.heading)
+        sx = self.x + forward * cos_h - left * sin_h
+        sy = self.y + forward * sin_h + left * cos_h
+        ray = self.heading + angle
+        distance = IR_MAX_RANGE_CM
+        for box in self._wall_boxes:
+            distance = min(distance, _ray_box_distance(sx, sy, ray, box, distance))
+        for px, py in self.parked_robots:
+            distance = min(
+                distance,
+                _ray_circle_distance(sx, sy, ray, px, py, PARKED_ROBOT_RADIUS_CM, distance),
+            )
+        if distance >= IR_MAX_RANGE_CM:
+            return 0
+        return int(IR_MAX * math.exp(-distance / IR_DECAY_CM))
+
+    def _no_qr(self) -> QRCode:
+        return QRCode(0, 0, 0, 0, 0, 0, 0, 0, 0, "None", int(self._sim_time * 1000))
+
+    def _no_object(self) -> DetectedObject:
+        return DetectedObject(0, 0, 0, 0, 0.0, "", int(self._sim_time * 1000))
@@ -0,0 +1,193 @@
+#
+# Automatic spot allocation.
+# Instead of asking for a spot on the console, the robot picks the free
+# spot it can reach soonest: the estimated travel time along the lane from
+# where the scan left it (through the rotonda when the spot is behind it),
+# or along the A* route in grid mode, plus the entry across the lane to the
+# spot's side. Several robots asking at once are assigned in one batch with
+# the minimum total travel time.
+#
+
+import math
+
+from utils.config import (
+    PARKING_SPEED,
+    SPEED_SLOW,
+    TURNING_TIME,
+    WHEEL_BASE_CM,
+    WHEEL_CM_PER_SPEED,
+)
+from utils.grid_planner import OccupancyGrid, Route, plan_route_to_spot
+from utils.map_layout import MapLayout, rotation_to_heading, rotation_to_vector
+from utils.map_prior import expected_spots
+from utils.state import Spot
+
+UNREACHABLE = 1e9  # Cost of a spot the robot has no way to reach
+
+
+def route_time(route: Route) -> float:
+    """Seconds to drive the turn/drive steps of a grid route."""
+    seconds = 0.0
+    for step in route.steps:
+        params = step["params"]
+        speed = params["speed"] * WHEEL_CM_PER_SPEED  # cm/s per wheel
+        if step["action"] == "drive":
+            seconds += abs(params["distance"]) / speed
+        else:
+            # Wheels turn in opposite directions around the robot's centre
+            seconds += math.radians(abs(params["angle"])) * WHEEL_BASE_CM / (2 * speed)
+    return seconds
+
+
+class SpotAllocator:
+    """
+    Estimates the travel time (seconds) from the robot to each spot, from
+    the lane geometry of ``layout`` (spots in the order the scan passes
+    them, starting at ``spawner_index``) and, in grid mode, from A* routes
+    over ``grid``.
+    """
+
+    def __init__(
+        self,
+        layout: MapLayout,
+        grid: OccupancyGrid | None = None,
+        spawner_index: int = 0,
+    ):
+        self.layout = layout
+        self.grid = grid
+        spawner = layout.spawners[spawner_index]
+        self.lane_heading = rotation_to_heading(spawner.rotation)
+        self.prior = {spot.id: spot for spot in expected_spots(layout, spawner_index)}
+        # Distance along the lane at which the robot turns around
+        hx, hy = rotation_to_vector(spawner.rotation)
+        self.rotonda = None
+        for sign in layout.signs:
+            if sign.id == "rotonda":
+                self.rotonda = (sign.x - spawner.x) * hx + (sign.y - spawner.y) * hy
+
+    def costs(
+        self,
+        spots: list[Spot],
+        lane_position: float = 0.0,
+        pose: tuple | None = None,
+        now: float | None = None,
+    ) -> dict[str, float]:
+        """
+        Travel time to each free spot. ``lane_position`` is the distance
+        driven along the lane (where the scan stopped); ``pose`` is the
+        odometry pose in grid mode. Spots missing from the map are costed
+        by the time since they were seen at ``now``.
+        """
+        costs = {}
+        for spot in spots:
+            if spot.occupied:
+                continue
+            expected = self.prior.get(spot.id)
+            if expected is None:
+                seen = now - spot.timestamp if now is not None else 0.0
+                costs[spot.id] = UNREACHABLE / 2 + max(seen, 0.0)
+                continue
+            # Across the lane into the stall on the spot's side
+            entry = expected.lateral / (PARKING_SPEED * WHEEL_CM_PER_SPEED)
+            costs[spot.id] = self._drive_time(spot.id, lane_position, pose) + entry
+        return costs
+
+    def _drive_time(self, spot_id: str, lane_position: float, pose) -> float:
+        if self.grid is not None and pose is not None:
+            route = plan_route_to_spot(
+                self.grid, self.layout, pose, spot_id, self.lane_heading
+            )
+            if route is not None:
+                return route_time(route)
+        # FindQR crawls along the lane at SPEED_SLOW looking for the QR
+        speed = SPEED_SLOW * WHEEL_CM_PER_SPEED
+        along = self.prior[spot_id].along
+        if along >= lane_position:
+            return (along - lane_position) / speed
+        if self.rotonda is None:
+            return UNREACHABLE
+        # Behind the robot: on to the rotonda, turn around and come back
+        distance = (self.rotonda - lane_position) + (self.rotonda - along)
+        return distance / speed + TURNING_TIME
+
+
+def choose_spot(costs: dict[str, float]) -> str | None:
+    """The cheapest spot in ``costs``, None when there is none."""
+    reachable = {spot_id: cost for spot_id, cost in costs.items() if cost < UNREACHABLE}
+    if not reachable:
+        return None
+    return min(reachable, key=lambda spot_id: (reachable[spot_id], spot_id))
+
+
+def assign(requests: dict[str, dict[str, float]]) -> dict[str, str | None]:
+    """
+    Give each requester (robot name -> spot costs) a different spot with
+    the minimum total cost. Requesters left without a reachable spot get
+    None.
+    """
+    names = sorted(requests)
+    spot_ids = sorted({spot_id for costs in requests.values() for spot_id in costs})
+    if not names or not spot_ids:
+        return {name: None for name in names}
+    # One dummy spot per requester, so there are always enough columns
+    columns = spot_ids + [None] * len(names)
+    matrix = [
+        [
+            requests[name].get(spot_id, UNREACHABLE) if spot_id else UNREACHABLE
+            for spot_id in columns
+        ]
+        for name in names
+    ]
+    result = {}
+    for name, column in zip(names, _hungarian(matrix)):
+        spot_id = columns[column]
+        reachable = spot_id is not None and requests[name].get(spot_id, UNREACHABLE) < UNREACHABLE
+        result[name] = spot_id if reachable else None
+    return result
+
+
+def _hungarian(matrix: list[list[float]]) -> list[int]:
+    """
+    Minimum-cost assignment of each row to a different column (rows <=
+    columns), by the Hungarian method with potentials, O(rows^2 * columns).
+    """
+    rows, cols = len(matrix), len(matrix[0])
+    u = [0.0] * (rows + 1)  # Row potentials
+    v = [0.0] * (cols + 1)  # Column potentials
+    owner = [0] * (cols + 1)  # Row (1-based) assigned to each column, 0 for none
+    way = [0] * (cols + 1)
+    for row in range(1, rows + 1):
+        owner[0] = row
+        j0 = 0
+        min_slack = [math.inf] * (cols + 1)
+        used = [False] * (cols + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = owner[j0], math.inf, 0
+            for j in range(1, cols + 1):
+                if used[j]:
+                    continue
+                slack = matrix[i0 - 1][j - 1] - u[i0] - v[j]
+                if slack < min_slack[j]:
+                    min_slack[j], way[j] = slack, j0
+                if min_slack[j] < delta:
+                    delta, j1 = min_slack[j], j
+            for j in range(cols + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+    assignment = [0] * rows
+    for j in range(1, cols + 1):
+        if owner[j]:
+            assignment[owner[j] - 1] = j - 1
+    return assignment
@@ -0,0 +1,175 @@
+#
+# Spot registry shared by the robots of a fleet.
+# Every robot keeps its own StateManager, but the spots one robot finds,
+# the occupancy it observes and the spot it is parking in are mirrored into
+# the others' state as soon as they change, so no robot rescans what another
+# has just seen or heads for a spot another has taken. Robots that ask for
+# a spot at about the same time are given spots in one batch.
+#
+
+import threading
+from dataclasses import replace
+
+from utils.clock import Clock
+from utils.config import ALLOCATION_BATCH_WINDOW
+from utils.spot_allocator import assign
+from utils.state import Spot, StateManager, flip_side
+
+
+class SpotRegistry:
+    """
+    Spots of the lot by id, with the robot (if any) parking in each. Sides
+    are kept in the lot frame (the direction the scan starts in) and
+    converted for robots that have turned around at the rotonda. A spot
+    claimed by one robot shows as occupied to the others.
+    """
+
+    def __init__(self, clock: Clock, batch_window: float = ALLOCATION_BATCH_WINDOW):
+        self.clock = clock
+        self.batch_window = batch_window
+        self._lock = threading.RLock()
+        # Spot requests waiting for the batch, by robot; taken only with
+        # _batch held, never together with _lock
+        self._batch = clock.condition()
+        self._requests: dict[str, dict[str, float]] = {}
+        self._assigned: dict[str, str | None] = {}
+        self._spots: dict[str, Spot] = {}
+        self._members: dict[str, StateManager] = {}
+        self._claims: dict[str, str] = {}  # Spot id -> robot parking there
+        self.parked: list[tuple[str, str, float]] = []  # (robot, spot, clock time)
+
+    def join(self, name: str, params: StateManager):
+        """Mirror the registry into ``params`` and publish its spot changes."""
+        with self._lock:
+            self._members[name] = params
+            self._push(name, list(self._spots))
+        params.subscribe(
+            "parking_spots", lambda key, old, spots: self._on_spots(name, spots)
+        )
+
+    def claim(self, name: str, spot_id: str) -> bool:
+        """Reserve ``spot_id`` for robot ``name``; False if another robot has it."""
+        with self._lock:
+            holder = self._claims.get(spot_id)
+            if holder not in (None, name):
+                return False
+            self.release(name)
+            self._claims[spot_id] = name
+            self._push_all([spot_id])
+            return True
+
+    def allocate(self, name: str, costs: dict[str, float]) -> str | None:
+        """
+        Claim a spot for robot ``name`` given its travel cost to each free
+        spot. Requests made within ``batch_window`` seconds of each other
+        are assigned together, with the minimum total cost. Returns None
+        when no spot is left for this robot.
+        """
+        with self._batch:
+            self._requests[name] = costs
+            # The earliest request of a batch waits for the others, then solves it
+            self._batch.wait_for(lambda: name in self._assigned, self.batch_window)
+            batch = None
+            if name in self._requests:  # Not taken by another robot's batch
+                batch, self._requests = self._requests, {}
+        if batch is not None:
+            assigned = self._assign(batch)
+            with self._batch:
+                self._assigned.update(assigned)
+                self._batch.notify_all()
+        with self._batch:
+            self._batch.wait_for(lambda: name in self._assigned)
+            return self._assigned.pop(name)
+
+    def _assign(self, requests: dict[str, dict[str, float]]) -> dict[str, str | None]:
+        with self._lock:
+            # Only spots nobody else holds; a robot may keep its own claim
+            free = {
+                name: {
+                    spot_id: cost
+                    for spot_id, cost in costs.items()
+                    if self._claims.get(spot_id) in (None, name)
+                }
+                for name, costs in requests.items()
+            }
+            assigned = assign(free)
+            for name, spot_id in assigned.items():
+                if spot_id is not None:
+                    self.claim(name, spot_id)
+            return assigned
+
+    def release(self, name: str):
+        """Drop the claim of robot ``name``, if any."""
+        with self._lock:
+            released = [s for s, holder in self._claims.items() if holder == name]
+            for spot_id in released:
+                del self._claims[spot_id]
+            self._push_all(released)
+
+    def mark_parked(self, name: str, spot_id: str, timestamp: float):
+        """Robot ``name`` parked in ``spot_id``: the spot is occupied from now on."""
+        with self._lock:
+            self.parked.append((name, spot_id, timestamp))
+            spot = self._spots.get(spot_id)
+            if spot is not None:
+                self._spots[spot_id] = replace(spot, occupied=True, timestamp=timestamp)
+            self._claims.pop(spot_id, None)
+            self._push_all([spot_id])
+
+    def spots(self) -> list[Spot]:
+        """Every known spot, sides in the lot frame."""
+        with self._lock:
+            return list(self._spots.values())
+
+    def _on_spots(self, name: str, spots: list[Spot]):
+        # Called in the writer's thread after ``name``'s spots changed
+        turned = self._turned(name)
+        with self._lock:
+            changed = []
+            for spot in spots:
+                known = self._spots.get(spot.id)
+                if known is None:
+                    side = flip_side(spot.side) if turned else spot.side
+                    self._spots[spot.id] = replace(spot, side=side)
+                elif spot.timestamp > known.timestamp:
+                    # Newer observation; the layout (side, position) is kept
+                    self._spots[spot.id] = replace(
+                        known, occupied=spot.occupied, timestamp=spot.timestamp
+                    )
+                else:
+                    continue
+                changed.append(spot.id)
+            self._push_all(changed)
+
+    def _turned(self, name: str) -> bool:
+        return bool(self._members[name].get("rotonda_detected", False))
+
+    def _view(self, name: str, spot: Spot, current: Spot | None) -> Spot:
+        # The registry's spot as robot ``name`` should see it
+        if current is not None:
+            side = current.side
+        else:
+            side = flip_side(spot.side) if self._turned(name) else spot.side
+        occupied = spot.occupied or self._claims.get(spot.id) not in (None, name)
+        return replace(spot, side=side, occupied=occupied)
+
+    def _push_all(self, spot_ids: list[str]):
+        # Must be called with the lock held
+        for name in self._members:
+            self._push(name, spot_ids)
+
+    def _push(self, name: str, spot_ids: list[str]):
+        # Must be called with the lock held. Only writes what differs, so
+        # the echo through the member's subscription ends here.
+        params = self._members[name]
+        for spot_id in spot_ids:
+            spot = self._spots.get(spot_id)
+            if spot is None:
+                continue
+            current = params.get_spot(spot_id)
+            view = self._view(name, spot, current)
+            if current is None or (current.occupied, current.timestamp) != (
+                view.occupied,
+                view.timestamp,
+            ):
+                params.add_detected_spot(view)
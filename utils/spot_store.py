@@ -0,0 +1,129 @@
+#
+# Persistent spot cache (sqlite).
+# The lot layout (spot ids, sides, positions) never changes between
+# missions, so it is kept on disk with the last observed occupancy. A new
+# mission only rescans the spots whose occupancy is older than a maximum age.
+# Sides are stored in the scan frame (the direction the scan starts in).
+#
+
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import replace
+
+from utils.config import SPOT_CACHE_FILE, SPOT_CACHE_MAX_AGE
+from utils.state import Spot, StateManager, flip_side
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spots (
+    lot TEXT NOT NULL,
+    id TEXT NOT NULL,
+    side TEXT NOT NULL,
+    x REAL,
+    y REAL,
+    occupied INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    PRIMARY KEY (lot, id)
+)
+"""
+
+
+class SpotStore:
+    """
+    Spots of each lot, keyed by (lot, spot id). Every call opens its own
+    connection, so the store can be used from any thread.
+    """
+
+    def __init__(self, path: str = SPOT_CACHE_FILE):
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Commit (or roll back) the transaction, then close the connection
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def load(self, lot: str) -> list[Spot]:
+        """Every cached spot of ``lot``."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, side, x, y, occupied, timestamp FROM spots WHERE lot = ?",
+                (lot,),
+            ).fetchall()
+        return [
+            Spot(
+                id=spot_id,
+                position=(x, y),
+                timestamp=timestamp,
+                occupied=bool(occupied),
+                side=side,
+            )
+            for spot_id, side, x, y, occupied, timestamp in rows
+        ]
+
+    def load_fresh(
+        self, lot: str, now: float, max_age: float = SPOT_CACHE_MAX_AGE
+    ) -> tuple[list[Spot], list[Spot]]:
+        """Split the cached spots of ``lot`` into (fresh, stale) by occupancy age."""
+        fresh, stale = [], []
+        for spot in self.load(lot):
+            (fresh if now - spot.timestamp <= max_age else stale).append(spot)
+        return fresh, stale
+
+    def save(self, lot: str, spots: list[Spot]):
+        """Insert or update ``spots``; spots not listed are left untouched."""
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO spots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        lot,
+                        spot.id,
+                        spot.side,
+                        spot.position[0] if spot.position else None,
+                        spot.position[1] if spot.position else None,
+                        int(bool(spot.occupied)),
+                        spot.timestamp,
+                    )
+                    for spot in spots
+                ],
+            )
+
+    def follow(self, lot: str, params: StateManager):
+        """
+        Save every spot the scan of ``params`` observes. Only the scan's own
+        observations are saved: neither the sides flipped at the rotonda nor
+        the spots mirrored from other robots (shown as occupied when they
+        hold them) reach ``observed_spot``. Spots seen after the rotonda are
+        flipped back to the scan frame.
+        """
+
+        def save(key, old, spot):
+            if spot is None:
+                return
+            if params.get("rotonda_detected", False):
+                spot = replace(spot, side=flip_side(spot.side))
+            self.save(lot, [spot])
+
+        return params.subscribe("observed_spot", save)
+
+    def mark_occupied(self, lot: str, spot_id: str, timestamp: float):
+        """Record that ``spot_id`` is taken (e.g. we just parked in it)."""
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE spots SET occupied = 1, timestamp = ? WHERE lot = ? AND id = ?",
+                (timestamp, lot, spot_id),
+            )
+
+    def clear(self, lot: str | None = None):
+        """Forget the spots of ``lot`` (every lot by default)."""
+        with self._connect() as connection:
+            if lot is None:
+                connection.execute("DELETE FROM spots")
+            else:
+                connection.execute("DELETE FROM spots WHERE lot = ?", (lot,))
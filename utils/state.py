@@ -1,6 +1,10 @@
+import re
+import time
+from bisect import bisect_left
 from dataclasses import dataclass
-from threading import Lock
-from typing import Optional
+from typing import Any, Callable, Iterable, Optional
+
+from utils.clock import Clock, RealClock
 
 
 @dataclass
@@ -12,16 +16,60 @@ class Spot:
     side: str  # 'left' or 'right'
 
 
+# Callback signature for state subscriptions: (key, old_value, new_value)
+StateCallback = Callable[[str, Any, Any], None]
+
+_MISSING = object()
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def flip_side(side: str) -> str:
+    """The other side of the lane ('left' <-> 'right')."""
+    return "right" if side == "left" else "left"
+
+
+def spot_sort_key(spot_id: str | None) -> tuple:
+    """
+    Natural ordering key for spot ids: numeric runs compare as numbers
+    ("2" < "10"), anything else compares as text, so ids like "A3" or
+    "rotonda" never break the ordering.
+    """
+    text = spot_id or ""
+    parts = tuple(
+        (0, int(part), "") if part.isdigit() else (1, 0, part)
+        for part in _DIGITS.split(text)
+        if part
+    )
+    return (parts, text)
+
+
 class StateManager:
     """
     Manages shared state between behaviors in a thread-safe manner.
+
+    Every key carries a version counter that is bumped when its value changes,
+    so threads can block on ``wait_for``/``wait_for_change`` instead of polling,
+    and callbacks can be attached to individual keys with ``subscribe``.
+    Wait timeouts are measured on ``clock``, which is shared with the
+    behaviors and the executor.
     """
 
-    def __init__(self):
-        self._lock = Lock()
+    def __init__(self, clock: Clock | None = None):
+        self.clock = clock or RealClock()
+        self._changed = self.clock.condition()
+        self._lock = self._changed  # Entering the condition takes its lock
+        self._version = 0  # Bumped on every change, whatever the key
+        self._versions: dict[str, int] = {}
+        self._changed_at: dict[str, float] = {}  # perf_counter() of the last change
+        self._subscribers: dict[Optional[str], list[StateCallback]] = {}
+        # Index over state["parking_spots"], which is kept sorted by spot_sort_key
+        self._spot_index: dict[str, Spot] = {}
+        self._spot_keys: list[tuple] = []  # Sort keys, parallel to parking_spots
         self._state = {
             "stop": False,
             "parking_spots": [],  # List of {id, qr_code, position, timestamp, occupied}
+            "observed_spot": None,  # Last Spot seen by this robot's own scan
             "target_spot": None,  # Selected spot to park in {id, qr_code, position}
             "parking_state": "scanning",  # searching, scanning, waiting_for_input, approaching, parking, aligned, done
             "obstacle_detected": False,
@@ -46,37 +94,161 @@ class StateManager:
 
     def set(self, key, value):
         """Set a state value in a thread-safe manner."""
-        with self._lock:
-            self._state[key] = value
+        self.update({key: value})
 
     def update(self, updates):
         """Update multiple state values at once in a thread-safe manner."""
         with self._lock:
-            self._state.update(updates)
+            changes = []
+            for key, value in updates.items():
+                old = self._state.get(key, _MISSING)
+                if key == "parking_spots":
+                    value = self._reindex_spots(value)
+                self._state[key] = value
+                if old is not value and (old is _MISSING or old != value):
+                    changes.append((key, None if old is _MISSING else old, value))
+            self._mark_changed(key for key, _, _ in changes)
+        self._notify_subscribers(changes)
 
     def get_all(self):
         """Get all state in a thread-safe manner (returns a copy)."""
         with self._lock:
             return self._state.copy()
 
+    # ------------------------------------------------------------------
+    # Change notification
+    # ------------------------------------------------------------------
+
+    def version(self, keys: Optional[Iterable[str]] = None) -> int:
+        """
+        Return a counter that changes whenever any of ``keys`` changes
+        (any key at all when ``keys`` is None).
+        """
+        with self._lock:
+            return self._version_of(keys)
+
+    def wait_for_change(
+        self,
+        keys: Optional[Iterable[str]],
+        since: int,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """
+        Block until the version of ``keys`` differs from ``since`` or the
+        timeout expires. Returns the version observed on wake-up.
+        """
+        keys = tuple(keys) if keys is not None else None
+        with self._changed:
+            self._changed.wait_for(lambda: self._version_of(keys) != since, timeout)
+            return self._version_of(keys)
+
+    def wait_for(
+        self,
+        key: str,
+        predicate: Callable[[Any], bool],
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        Block until ``predicate(state[key])`` holds or the timeout expires.
+        Returns the last result of the predicate.
+        """
+        with self._changed:
+            return bool(
+                self._changed.wait_for(
+                    lambda: predicate(self._state.get(key)), timeout
+                )
+            )
+
+    def changed_at(self, key: str) -> float | None:
+        """Wall-clock ``time.perf_counter()`` of the last change of ``key``."""
+        with self._lock:
+            return self._changed_at.get(key)
+
+    def subscribe(self, key: Optional[str], callback: StateCallback) -> StateCallback:
+        """
+        Call ``callback(key, old, new)`` whenever ``key`` changes (every key
+        when ``key`` is None). Callbacks run in the writer's thread, outside
+        the state lock, so they may read or write the state themselves.
+        """
+        with self._lock:
+            self._subscribers.setdefault(key, []).append(callback)
+        return callback
+
+    def unsubscribe(self, key: Optional[str], callback: StateCallback):
+        """Remove a callback previously registered with ``subscribe``."""
+        with self._lock:
+            callbacks = self._subscribers.get(key, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def _version_of(self, keys) -> int:
+        # Must be called with the lock held
+        if keys is None:
+            return self._version
+        return sum(self._versions.get(key, 0) for key in keys)
+
+    def _mark_changed(self, keys):
+        # Must be called with the lock held
+        bumped = False
+        for key in keys:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._changed_at[key] = time.perf_counter()
+            bumped = True
+        if bumped:
+            self._version += 1
+            self._changed.notify_all()
+
+    def _notify_subscribers(self, changes):
+        if not changes:
+            return
+        with self._lock:
+            wildcard = list(self._subscribers.get(None, ()))
+            per_key = {
+                key: list(self._subscribers.get(key, ())) for key, _, _ in changes
+            }
+        for key, old, new in changes:
+            for callback in per_key[key] + wildcard:
+                callback(key, old, new)
+
+    # ------------------------------------------------------------------
+    # Parking spots
+    # ------------------------------------------------------------------
+
     def add_detected_spot(self, spot_data: Spot):
         """Add a detected parking spot to the list."""
         with self._lock:
-            # Check if spot already exists (by id)
-            for i, spot in enumerate(self._state["parking_spots"]):
-                if spot.id == spot_data.id:
-                    # Update existing spot
-                    self._state["parking_spots"][i] = spot_data
-                    return
-            # Add new spot
-            self._state["parking_spots"].append(spot_data)
-            # Sort by id
-            self._state["parking_spots"].sort(key=lambda x: int(x.id or "0"))
+            self._insert_spot(spot_data)
+            self._mark_changed(("parking_spots",))
+            spots = self._state["parking_spots"].copy()
+        self._notify_subscribers([("parking_spots", None, spots)])
+
+    def _insert_spot(self, spot_data: Spot):
+        # Must be called with the lock held. Finding the slot is O(log n) but
+        # list.insert shifts the tail, so a new spot costs O(n); the copy
+        # handed to the parking_spots subscribers is O(n) anyway, and a lot
+        # has tens of spots, so no tree is kept for it.
+        key = spot_sort_key(spot_data.id)
+        i = bisect_left(self._spot_keys, key)
+        if spot_data.id in self._spot_index:
+            # Update existing spot in place
+            self._state["parking_spots"][i] = spot_data
+        else:
+            self._spot_keys.insert(i, key)
+            self._state["parking_spots"].insert(i, spot_data)
+        self._spot_index[spot_data.id] = spot_data
+
+    def _reindex_spots(self, spots) -> list[Spot]:
+        # Must be called with the lock held. Rebuilds the index from a list
+        # assigned through set()/update() and returns it in sorted order.
+        by_id = {spot.id: spot for spot in spots or []}
+        ordered = sorted(by_id.values(), key=lambda spot: spot_sort_key(spot.id))
+        self._spot_index = by_id
+        self._spot_keys = [spot_sort_key(spot.id) for spot in ordered]
+        return ordered
 
     def clear_detected_spots(self):
         """Clear all detected spots."""
-        with self._lock:
-            self._state["parking_spots"] = []
+        self.set("parking_spots", [])
 
     def get_detected_spots(self):
         """Get list of detected spots."""
@@ -88,23 +260,38 @@ class StateManager:
         with self._lock:
             return [spot.id for spot in self._state["parking_spots"]]
 
+    def has_spot(self, spot_id: str) -> bool:
+        """True if a spot with this id has been detected."""
+        with self._lock:
+            return spot_id in self._spot_index
+
+    def get_spot(self, spot_id: str) -> Optional[Spot]:
+        """Get a detected spot by id."""
+        with self._lock:
+            return self._spot_index.get(spot_id)
+
+    def spot_count(self) -> int:
+        """Number of detected spots."""
+        with self._lock:
+            return len(self._spot_index)
+
     def get_target_spot_info(self) -> Optional[Spot]:
         """Get the currently selected target spot."""
         with self._lock:
-            for i in self._state["parking_spots"]:
-                if i.id == self._state["target_spot"]:
-                    return i
-            return None
+            return self._spot_index.get(self._state["target_spot"])
 
     def invert_sides(self):
         """Invert the side ('left' <-> 'right') of all detected spots."""
         with self._lock:
             for i, spot in enumerate(self._state["parking_spots"]):
-                new_side = "right" if spot.side == "left" else "left"
                 self._state["parking_spots"][i] = Spot(
                     id=spot.id,
                     position=spot.position,
                     timestamp=spot.timestamp,
                     occupied=spot.occupied,
-                    side=new_side,
+                    side=flip_side(spot.side),
                 )
+                self._spot_index[spot.id] = self._state["parking_spots"][i]
+            self._mark_changed(("parking_spots",))
+            spots = self._state["parking_spots"].copy()
+        self._notify_subscribers([("parking_spots", None, spots)])
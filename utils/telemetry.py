@@ -0,0 +1,258 @@
+#
+# Mission telemetry and log levels.
+# Behaviors, the robot proxy and the StateManager push small records into a
+# bounded in-memory queue; a background thread serializes them to JSONL, one
+# file per mission, so the control loops never wait on disk or stdout.
+# Files are rotated only between missions, never inside one, so a replay
+# always finds the whole mission in a single file.
+#
+
+import dataclasses
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from enum import Enum
+from typing import Any
+
+from utils.clock import Clock
+from utils.config import (
+    LOG_LEVEL,
+    TELEMETRY_BACKUPS,
+    TELEMETRY_FILE,
+    TELEMETRY_FLUSH_INTERVAL,
+    TELEMETRY_QUEUE_SIZE,
+)
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+_LEVEL_NAMES = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+
+
+def plain_value(value: Any) -> Any:
+    """Convert robot objects, enums and dataclasses to JSON-friendly values."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, dict):
+        return {str(plain_value(key)): plain_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, deque)):
+        return [plain_value(item) for item in value]
+    if dataclasses.is_dataclass(value):
+        return {
+            field.name: plain_value(getattr(value, field.name))
+            for field in dataclasses.fields(value)
+        }
+    if hasattr(value, "__dict__"):
+        return {
+            key: plain_value(item)
+            for key, item in vars(value).items()
+            if not key.startswith("_")
+        }
+    return repr(value)
+
+
+class TelemetryRecorder(threading.Thread):
+    """
+    Background JSONL writer. ``record()`` only appends a tuple to a bounded
+    deque (atomic in CPython, no lock taken); when the queue is full the
+    oldest records are dropped and counted instead of blocking the caller.
+
+    The writer runs on wall-clock time and is not registered with the
+    mission clock, so it never holds back a VirtualClock.
+    """
+
+    def __init__(
+        self,
+        clock: Clock,
+        path: str = TELEMETRY_FILE,
+        queue_size: int = TELEMETRY_QUEUE_SIZE,
+        backups: int = TELEMETRY_BACKUPS,
+        flush_interval: float = TELEMETRY_FLUSH_INTERVAL,
+    ):
+        super().__init__(name="TelemetryWriter", daemon=True)
+        self.clock = clock
+        self.path = path
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self._queue: deque = deque(maxlen=queue_size)
+        self._seq = itertools.count(1)
+        self._wake = threading.Event()
+        self._running = True
+        self._file = None
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, kind: str, **fields):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append((next(self._seq), self.clock.now(), kind, fields))
+
+    def stop(self):
+        """Flush every pending record and close the file."""
+        self._running = False
+        self._wake.set()
+        self.join()
+
+    def run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Every mission starts a fresh file; the previous one is rotated out
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            self._rotate()
+        self._file = open(self.path, "a")
+        try:
+            while self._running:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self._drain()
+            self._drain()
+        finally:
+            self._file.close()
+
+    def _drain(self):
+        lines = []
+        while self._queue:
+            seq, timestamp, kind, fields = self._queue.popleft()
+            entry = {"seq": seq, "t": timestamp, "kind": kind}
+            entry.update(plain_value(fields))
+            lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+        if not lines:
+            return
+        self._file.writelines(lines)
+        self._file.flush()
+        self.written += len(lines)
+
+    def _rotate(self):
+        # mission.jsonl -> mission.jsonl.1 -> ... -> mission.jsonl.<backups>
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class RecordingRobot:
+    """
+    Transparent proxy around a Robobo that records every method call:
+    ``read*`` calls as "read" records with their result, everything else
+    as "command" records.
+    """
+
+    def __init__(self, robot):
+        self._robot = robot
+
+    def __getattr__(self, name):
+        attribute = getattr(self._robot, name)
+        if not callable(attribute):
+            return attribute
+        kind = "read" if name.startswith("read") else "command"
+
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            fields = {"method": name, "args": args}
+            if kwargs:
+                fields["kwargs"] = kwargs
+            if kind == "read":
+                fields["result"] = result
+            record(kind, **fields)
+            return result
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+
+_recorder: TelemetryRecorder | None = None
+_level = _LEVEL_NAMES.get(LOG_LEVEL.upper(), INFO)
+
+
+def start_recording(clock: Clock, path: str = TELEMETRY_FILE) -> TelemetryRecorder:
+    """Start the process-wide recorder."""
+    global _recorder
+    stop_recording()
+    _recorder = TelemetryRecorder(clock, path)
+    _recorder.start()
+    return _recorder
+
+
+def stop_recording():
+    """Flush and stop the process-wide recorder, if any."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.stop()
+        print(
+            f"[Telemetry] Wrote {recorder.written} records to {recorder.path}"
+            f" ({recorder.dropped} dropped)"
+        )
+
+
+def record(kind: str, **fields):
+    """Queue a telemetry record; a no-op when no recorder is running."""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record(kind, **fields)
+
+
+def watch_state(state_manager):
+    """Record every StateManager transition."""
+
+    def on_change(key, old, new):
+        # Converted now: plans and spot lists keep changing after the event
+        if _recorder is not None:
+            record("state", key=key, value=plain_value(new))
+
+    return state_manager.subscribe(None, on_change)
+
+
+# ----------------------------------------------------------------------
+# Log levels
+# ----------------------------------------------------------------------
+
+
+def set_log_level(level: str | int):
+    global _level
+    _level = _LEVEL_NAMES[level.upper()] if isinstance(level, str) else level
+
+
+def is_enabled(level: int) -> bool:
+    return level >= _level
+
+
+def log(level: int, message: str, *args):
+    """
+    Print ``message`` if ``level`` passes the switch, and record it.
+    ``message % args`` is only formatted then, as with stdlib logging, so
+    per-iteration traces cost nothing while their level is off.
+    """
+    if level < _level:
+        return
+    if args:
+        message = message % args
+    print(message)
+    record("log", level=level, message=message)
+
+
+def debug(message: str, *args):
+    log(DEBUG, message, *args)
+
+
+def info(message: str, *args):
+    log(INFO, message, *args)
+
+
+def warning(message: str, *args):
+    log(WARNING, message, *args)
+
+
+def error(message: str, *args):
+    log(ERROR, message, *args)